@@ -0,0 +1,107 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Adaptive invocation concurrency against a local throttling backend.
+
+ThrottlingBackend stands in for a FaaS API that serves `capacity` concurrent
+invocations, slows down beyond it and rejects requests with 429 above
+`burst`. The map operator submits through it with invoke_pool_threads='auto'
+and with fixed thread counts, and the submit time and settled concurrency
+are reported.
+
+    python benchmarks/adaptive_invoker.py --calls 20000 --capacity 64 --burst 128
+"""
+
+import os
+import json
+import math
+import time
+import argparse
+import tempfile
+from types import SimpleNamespace
+
+from lithops_airflow_plugin.operators.lithops_operator import LithopsMapOperator
+
+from run_operators import BenchTaskInstance
+from bench_functions import noop
+
+
+class TooManyRequestsException(Exception):
+
+    def __init__(self):
+        super().__init__('Rate exceeded')
+        self.response = {'Error': {'Code': 'TooManyRequestsException'},
+                         'ResponseMetadata': {'HTTPStatusCode': 429}}
+
+
+class ThrottlingBackend:
+
+    def __init__(self, capacity, burst, invoke_time):
+        self.capacity = capacity
+        self.burst = burst
+        self.invoke_time = invoke_time
+        self.rejected = 0
+
+    def map(self, map_iterdata, invoke_pool_threads, **kwargs):
+        if invoke_pool_threads > self.burst:
+            self.rejected += 1
+            raise TooManyRequestsException()
+        served = min(invoke_pool_threads, self.capacity)
+        overload = max(0, invoke_pool_threads - self.capacity) / self.capacity
+        rounds = math.ceil(len(map_iterdata) / served)
+        time.sleep(rounds * self.invoke_time * (1 + 4 * overload))
+        return [SimpleNamespace(error=False, _exception=None) for _ in map_iterdata]
+
+    def wait(self, fs, **kwargs):
+        return fs, []
+
+
+def run(threads, args):
+    backend = ThrottlingBackend(args.capacity, args.burst, args.invoke_time)
+    operator = LithopsMapOperator(task_id='adaptive_{}'.format(threads), map_function=noop,
+                                  map_iterdata=list(range(args.calls)),
+                                  invoke_pool_threads=threads)
+    operator._executor = backend
+    operator._hook = SimpleNamespace(lithops_config={})
+    ti = BenchTaskInstance()
+
+    start = time.time()
+    operator.execute_callable({'task_instance': ti, 'run_id': 'bench'})
+    elapsed = time.time() - start
+
+    settled = ti.xcoms.get('invoke_concurrency', {}).get('settled', threads)
+    return {'threads': threads, 'submit_time': round(elapsed, 3),
+            'settled': settled, 'rejected_jobs': backend.rejected}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--capacity', type=int, default=64)
+    parser.add_argument('--burst', type=int, default=128)
+    parser.add_argument('--invoke-time', type=float, default=0.005)
+    parser.add_argument('--fixed', type=int, nargs='+', default=[16, 64, 100])
+    args = parser.parse_args()
+
+    os.environ['LITHOPS_AIRFLOW_STATE_DIR'] = tempfile.mkdtemp()
+    report = [run('auto', args), run('auto', args)]
+    report += [run(threads, args) for threads in args.fixed]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
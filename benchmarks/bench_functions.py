@@ -0,0 +1,52 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Callables must live in an importable module, as with DAG callables
+
+
+def noop(x):
+    return x
+
+
+def echo_payload(payload, result_size):
+    return b'x' * result_size
+
+
+def count_results(results):
+    return sum(len(r) for r in results)
+
+
+def make_part(size):
+    return {'count': 1, 'payload': b'x' * size, 'peak_rss': 0}
+
+
+def merge_parts(results):
+    # Associative, so the same function serves a single reducer and a tree
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {'count': sum(r['count'] for r in results),
+            'payload': b'',
+            'peak_rss': max([peak] + [r['peak_rss'] for r in results])}
+
+
+def parse_records(obj, cost):
+    # Busy work proportional to the bytes of every record
+    records = 0
+    for line in obj.data_stream.read().splitlines():
+        for _ in range(cost):
+            hash(line + b'.')
+        records += 1
+    return records
@@ -0,0 +1,67 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Submit latency of LithopsMapOperator with and without the function bundle cache.
+
+Every run is a new task on the localhost backend. The first run with the
+cache uploads the bundle and later ones reuse it; the 'submit' phase of the
+lithops_metrics XCom is reported for each.
+
+    python benchmarks/bundle_cache.py --items 100 --repeat 10
+"""
+
+import os
+import json
+import argparse
+import statistics
+
+from lithops_airflow_plugin.operators.lithops_operator import LithopsMapOperator
+
+from run_operators import LOCAL_CONFIG, BenchTaskInstance
+from bench_functions import echo_payload
+
+
+def run(bundle_cache, args):
+    submit_times = []
+    for i in range(args.repeat):
+        operator = LithopsMapOperator(task_id='bundle_cache_{}'.format(bundle_cache),
+                                      map_function=echo_payload,
+                                      map_iterdata=[{'payload': 'p'} for _ in range(args.items)],
+                                      extra_args={'result_size': 10},
+                                      bundle_cache=bundle_cache)
+        ti = BenchTaskInstance()
+        operator.execute({'task_instance': ti, 'ti': ti, 'run_id': 'bench_{}'.format(i)})
+        submit_times.append(ti.xcoms['lithops_metrics']['phases']['submit'])
+    return {'bundle_cache': bundle_cache,
+            'submit_first': submit_times[0],
+            'submit_median': statistics.median(submit_times[1:] or submit_times),
+            'bundle_stats': ti.xcoms.get('bundle_cache')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ.setdefault('AIRFLOW_CONN_LITHOPS_CONFIG',
+                          json.dumps({'conn_type': 'lithops', 'extra': LOCAL_CONFIG}))
+    print(json.dumps([run(False, args), run(True, args)], indent=2))
+
+
+if __name__ == '__main__':
+    main()
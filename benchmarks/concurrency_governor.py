@@ -0,0 +1,112 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Token allocation of the concurrency governor among tasks started together.
+
+Each task is a process that takes a lease from a governor on a temporary
+Airflow metadata database, holds it for a random time and releases it, as
+the 15 map reduce tasks of the meteo DAG would. The tokens in use are tracked over time to
+check that they never exceed the capacity, and the grants and waits of every
+task are reported. No functions are invoked.
+
+    python benchmarks/concurrency_governor.py --tasks 15 --capacity 1000 --priority-tasks 3
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+
+
+def use_metadata_db(tmp):
+    # Set before Airflow is imported, the task processes inherit it
+    os.environ['AIRFLOW__DATABASE__SQL_ALCHEMY_CONN'] = 'sqlite:///' + os.path.join(tmp, 'airflow.db')
+    from airflow import settings
+    from airflow.models import Variable
+    Variable.__table__.create(settings.engine)
+
+
+def run_task(capacity, index, weight, duration, ready, start, events):
+    from lithops_airflow_plugin.governor import ConcurrencyGovernor
+
+    governor = ConcurrencyGovernor(capacity, settle_time=1, poll_interval=0.2)
+    # Tasks started together ask for their lease together, whatever their import time
+    ready.put(index)
+    start.wait()
+    lease = governor.acquire('task-{}'.format(index), weight=weight)
+    events.put((time.time(), lease.tokens, index, weight, lease.waited))
+    time.sleep(duration)
+    events.put((time.time(), -lease.tokens, index, weight, None))
+    lease.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=15)
+    parser.add_argument('--capacity', type=int, default=1000)
+    parser.add_argument('--priority-tasks', type=int, default=0, help='Tasks with weight 2 instead of 1')
+    parser.add_argument('--max-duration', type=float, default=5.0, help='Seconds each task holds its lease')
+    parser.add_argument('--late-tasks', type=int, default=3, help='Tasks started after the first ones')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    # Fresh processes, so that none shares the parent's database connections
+    context = multiprocessing.get_context('spawn')
+    events, ready, start = context.Queue(), context.Queue(), context.Event()
+    with tempfile.TemporaryDirectory() as tmp:
+        use_metadata_db(tmp)
+        processes = []
+        for index in range(args.tasks + args.late_tasks):
+            if index == args.tasks:
+                for _ in range(args.tasks):
+                    ready.get()
+                start.set()
+                time.sleep(args.max_duration / 2)
+            weight = 2 if index < args.priority_tasks else 1
+            duration = random.uniform(args.max_duration / 4, args.max_duration)
+            process = context.Process(target=run_task,
+                                      args=(args.capacity, index, weight, duration, ready, start, events))
+            process.start()
+            processes.append(process)
+        if not start.is_set():
+            start.set()
+        records = [events.get() for _ in range(2 * len(processes))]
+        for process in processes:
+            process.join()
+
+    in_use = peak = 0
+    grants = []
+    for _, tokens, index, weight, waited in sorted(records, key=lambda r: (r[0], r[1])):
+        in_use += tokens
+        peak = max(peak, in_use)
+        if tokens > 0:
+            grants.append({'task': index, 'weight': weight, 'tokens': tokens, 'waited': round(waited, 3)})
+    for grant in sorted(grants, key=lambda g: g['task']):
+        print('task {:>3}  weight {}  {:>5} tokens  waited {:.2f}s'.format(
+            grant['task'], grant['weight'], grant['tokens'], grant['waited']))
+    print('Peak tokens in use: {} of {}'.format(peak, args.capacity))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'capacity': args.capacity, 'peak': peak, 'grants': grants}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Time to record a task run in the execution history.
+
+The batched mode records the run as tasks do, with all its calls in one
+transaction. The per-call mode commits every call on its own, as a store
+written while the calls complete would. Each case uses a fresh database in a
+temporary directory, and no functions are invoked.
+
+    python benchmarks/execution_history.py --calls 100 1000 10000 --repeat 5
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+from lithops_airflow_plugin.history import ExecutionHistory
+
+
+def make_calls(calls):
+    return [('M000/{:05d}'.format(i), random.uniform(1, 10), random.uniform(0.1, 1), int(i < 10),
+             1024 ** 2, 4096, 300 * 1024 ** 2, 0)
+            for i in range(calls)]
+
+
+def run_batched(history, calls, run):
+    history.record('bench', 'task', 'run-{}'.format(run), 1, 1024, {'wait': 1.0}, calls)
+
+
+def run_per_call(history, calls, run):
+    history.record('bench', 'task', 'run-{}'.format(run), 1, 1024, {'wait': 1.0})
+    connection = history.connect()
+    try:
+        run_id = connection.execute('SELECT max(id) FROM runs').fetchone()[0]
+        for call in calls:
+            with connection:
+                connection.execute('INSERT INTO calls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', (run_id,) + call)
+    finally:
+        connection.close()
+
+
+MODES = {'batched': run_batched, 'per_call': run_per_call}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = []
+    for calls in args.calls:
+        rows = make_calls(calls)
+        for mode, run in MODES.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                history = ExecutionHistory(os.path.join(tmp, 'history.db'))
+                times = []
+                for i in range(args.repeat):
+                    start = time.time()
+                    run(history, rows, i)
+                    times.append(time.time() - start)
+                db_bytes = os.path.getsize(history.path)
+            result = {'calls': calls, 'mode': mode, 'record_time': round(statistics.median(times), 4),
+                      'db_bytes_per_call': round(db_bytes / (calls * args.repeat), 1)}
+            results.append(result)
+            print('{:>7} calls {:>9}  {:.4f}s  {:.1f} bytes per call'.format(
+                calls, mode, result['record_time'], result['db_bytes_per_call']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
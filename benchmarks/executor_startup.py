@@ -0,0 +1,79 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Per-task startup latency with and without the executor service.
+
+Every iteration mimics one task instance: get an executor, submit a single
+call_async and collect its result. Runs on the localhost backend.
+
+    python benchmarks/executor_startup.py --tasks 20
+"""
+
+import os
+import time
+import json
+import argparse
+import tempfile
+import statistics
+
+from lithops import FunctionExecutor
+
+from lithops_airflow_plugin.executor_service import ExecutorServiceClient
+
+from bench_functions import noop
+
+LOCAL_CONFIG = {'lithops': {'backend': 'localhost', 'storage': 'localhost'}}
+
+
+def run_task(get_executor):
+    t0 = time.time()
+    executor = get_executor()
+    t1 = time.time()
+    fut = executor.call_async(func=noop, data={'x': 1})
+    executor.get_result(fs=fut)
+    t2 = time.time()
+    return t1 - t0, t2 - t0
+
+
+def summarize(samples):
+    startup = [s[0] for s in samples]
+    total = [s[1] for s in samples]
+    return {'startup_mean': statistics.mean(startup),
+            'startup_median': statistics.median(startup),
+            'task_mean': statistics.mean(total),
+            'task_median': statistics.median(total)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=20)
+    parser.add_argument('--socket', default=os.path.join(tempfile.gettempdir(), 'lithops-bench.sock'))
+    args = parser.parse_args()
+
+    executor_config = {'config': LOCAL_CONFIG, 'log_level': 'WARNING'}
+
+    direct = [run_task(lambda: FunctionExecutor(**executor_config)) for _ in range(args.tasks)]
+    service = [run_task(lambda: ExecutorServiceClient(executor_config, socket_path=args.socket))
+               for _ in range(args.tasks)]
+
+    print(json.dumps({'tasks': args.tasks,
+                      'direct': summarize(direct),
+                      'service': summarize(service)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
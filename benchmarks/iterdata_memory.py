@@ -0,0 +1,103 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Peak RSS of building map iterdata, eagerly and in streaming batches.
+
+The upstream values are written as a result manifest to the localhost
+storage backend. The eager mode loads them into a list, wraps every value
+and serializes the whole iterdata at once, as a single map submission does.
+The lazy mode reads the manifest part by part and serializes one batch at a
+time, as LithopsMapOperator does with iterdata_batch_size. Each measurement
+runs in its own process and no functions are invoked.
+
+    python benchmarks/iterdata_memory.py --sizes 10000 100000 1000000
+"""
+
+import sys
+import json
+import pickle
+import resource
+import argparse
+import subprocess
+
+from lithops.storage import Storage
+
+from lithops_airflow_plugin.results import StorageResultSink, load_manifest
+from lithops_airflow_plugin.iterdata import iter_batches, iter_upstream, wrap_kwarg
+
+LOCAL_CONFIG = {'lithops': {'backend': 'localhost', 'storage': 'localhost'}}
+
+
+def write_manifest(storage, items):
+    sink = StorageResultSink(storage, 'lithops.airflow/bench/iterdata/{}'.format(items),
+                             batch_size=10000)
+    for i in range(items):
+        sink.add(i, 'object-key-{:012d}'.format(i))
+    return sink.manifest()
+
+
+def run_eager(storage, manifest, batch_size):
+    values = load_manifest(storage, manifest)
+    iterdata = [{'key': value} for value in values]
+    return len(pickle.dumps(iterdata))
+
+
+def run_lazy(storage, manifest, batch_size):
+    total = 0
+    iterdata = wrap_kwarg('key', iter_upstream(manifest, lambda: storage))
+    for batch in iter_batches(iterdata, batch_size):
+        total += len(pickle.dumps(batch))
+    return total
+
+
+def child(mode, manifest, batch_size):
+    storage = Storage(config=LOCAL_CONFIG)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    run = run_eager if mode == 'eager' else run_lazy
+    serialized = run(storage, manifest, batch_size)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'baseline_kb': baseline, 'peak_kb': peak, 'serialized_bytes': serialized}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--child', choices=['eager', 'lazy'], help=argparse.SUPPRESS)
+    parser.add_argument('--manifest', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, json.loads(args.manifest), args.batch_size)
+        return
+
+    storage = Storage(config=LOCAL_CONFIG)
+    report = []
+    for items in args.sizes:
+        manifest = json.dumps(write_manifest(storage, items))
+        row = {'items': items}
+        for mode in ('eager', 'lazy'):
+            out = subprocess.check_output([sys.executable, __file__, '--child', mode,
+                                           '--manifest', manifest,
+                                           '--batch-size', str(args.batch_size)])
+            row[mode] = json.loads(out)
+        report.append(row)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
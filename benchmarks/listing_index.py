@@ -0,0 +1,111 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Time to resolve a prefix with a full listing against an incrementally
+refreshed ListingIndex, while new objects keep arriving.
+
+Runs against an S3 stand-in such as MinIO or a moto server given by
+--endpoint-url, or the Lithops localhost storage backend without it, which
+can not list from a key, so only the S3 run shows the incremental savings.
+Each round adds --new objects and resolves the prefix both ways, checking
+that both see the same objects, then times the check of the new objects
+that the operators do before partitioning them.
+
+    moto_server -p 5000 &
+    python benchmarks/listing_index.py --endpoint-url http://localhost:5000 --objects 20000 --new 50
+"""
+
+import json
+import time
+import argparse
+
+from lithops_airflow_plugin.listing import ListingIndex, list_objects, stale_objects
+
+from run_operators import LOCAL_CONFIG
+
+BUCKET = 'lithops-airflow-bench'
+PREFIX = 'listing/'
+
+
+def make_client(endpoint_url):
+    if endpoint_url is None:
+        from lithops.storage import Storage
+        storage = Storage(config=LOCAL_CONFIG)
+        return storage, storage.bucket
+    import boto3
+    client = boto3.client('s3', endpoint_url=endpoint_url, aws_access_key_id='bench',
+                          aws_secret_access_key='bench', region_name='us-east-1')
+    try:
+        client.create_bucket(Bucket=BUCKET)
+    except Exception:
+        pass
+    return client, BUCKET
+
+
+def put(client, bucket, key):
+    if hasattr(client, 'list_objects_v2'):
+        client.put_object(Bucket=bucket, Key=key, Body=b'x')
+    else:
+        client.put_object(bucket, key, b'x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--endpoint-url', help='S3 stand-in endpoint. Default the localhost backend')
+    parser.add_argument('--objects', type=int, default=20000)
+    parser.add_argument('--new', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    client, bucket = make_client(args.endpoint_url)
+    for i in range(args.objects):
+        put(client, bucket, '{}{:010d}'.format(PREFIX, i))
+    ListingIndex(client, bucket, PREFIX, index_bucket=bucket).refresh(full=True)
+
+    report = []
+    for r in range(args.rounds):
+        first = args.objects + r * args.new
+        for i in range(first, first + args.new):
+            put(client, bucket, '{}{:010d}'.format(PREFIX, i))
+
+        start = time.time()
+        listed = [e['Key'] for e in list_objects(client, bucket, PREFIX)]
+        full_time = time.time() - start
+
+        start = time.time()
+        index = ListingIndex(client, bucket, PREFIX, index_bucket=bucket).refresh()
+        indexed = [e['Key'] for e in index.objects()]
+        index_time = time.time() - start
+
+        new = [{'bucket': bucket, 'key': e['Key'], 'size': e['Size'], 'etag': e['ETag']}
+               for e in index.objects()[-args.new:]]
+        start = time.time()
+        assert stale_objects(client, new, limit=len(new)) == []
+        verify_time = time.time() - start
+
+        assert listed == indexed
+        report.append({'round': r,
+                       'objects': len(indexed),
+                       'full_listing': round(full_time, 4),
+                       'index_refresh': round(index_time, 4),
+                       'verify_new': round(verify_time, 4),
+                       'new_objects': index.stats()['new_objects']})
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
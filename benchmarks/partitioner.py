@@ -0,0 +1,95 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Makespan and call durations of LithopsMapOperator over a newline-delimited
+object with fixed chunk sizes against chunk_size='auto', on the localhost
+backend.
+
+The 'auto' case runs twice: the first run plans with the default throughput
+and records the measured one, which the second run plans with. Every case
+checks that each record was processed exactly once.
+
+    python benchmarks/partitioner.py --mb 64 --chunk-size 65536 4194304 --target-duration 2
+"""
+
+import os
+import json
+import time
+import argparse
+import tempfile
+
+from lithops.storage import Storage
+
+from lithops_airflow_plugin.operators.lithops_operator import LithopsMapOperator
+
+from run_operators import LOCAL_CONFIG, BenchTaskInstance
+from bench_functions import parse_records
+
+OBJECT_KEY = 'lithops.airflow/bench/partitioner/records.txt'
+
+
+def write_object(storage, mb):
+    line = b'x' * 99 + b'\n'
+    records = mb * 1024 ** 2 // len(line)
+    storage.put_object(storage.bucket, OBJECT_KEY, line * records)
+    return records
+
+
+def run(name, chunk_size, records, args, storage):
+    operator = LithopsMapOperator(task_id='partitioner_{}'.format(name),
+                                  map_function=parse_records,
+                                  map_iterdata={'obj': '{}://{}/{}'.format(storage.backend, storage.bucket, OBJECT_KEY)},
+                                  extra_args={'cost': args.cost},
+                                  chunk_size=chunk_size,
+                                  target_call_duration=args.target_duration)
+    ti = BenchTaskInstance()
+    start = time.time()
+    result = operator.execute({'task_instance': ti, 'ti': ti, 'run_id': 'bench'})
+    makespan = time.time() - start
+    metrics = ti.xcoms['lithops_metrics']
+    return {'case': name,
+            'calls': metrics['calls'],
+            'makespan': round(makespan, 3),
+            'exec_time_p50': metrics['exec_time_p50'],
+            'exec_time_max': metrics['exec_time_max'],
+            'records_ok': sum(result) == records,
+            'plan': ti.xcoms.get('partition_plan')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mb', type=int, default=64)
+    parser.add_argument('--cost', type=int, default=20)
+    parser.add_argument('--chunk-size', type=int, nargs='+', default=[64 * 1024, 4 * 1024 ** 2])
+    parser.add_argument('--target-duration', type=float, default=2)
+    args = parser.parse_args()
+
+    os.environ.setdefault('AIRFLOW_CONN_LITHOPS_CONFIG',
+                          json.dumps({'conn_type': 'lithops', 'extra': LOCAL_CONFIG}))
+    # Start without recorded throughput
+    os.environ['LITHOPS_AIRFLOW_STATE_DIR'] = tempfile.mkdtemp()
+    storage = Storage(config=LOCAL_CONFIG)
+    records = write_object(storage, args.mb)
+
+    report = [run('fixed_{}'.format(size), size, records, args, storage) for size in args.chunk_size]
+    report.append(run('auto_first', 'auto', records, args, storage))
+    report.append(run('auto_history', 'auto', records, args, storage))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
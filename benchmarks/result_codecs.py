@@ -0,0 +1,107 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Encoded size and encode/decode time of the result codecs.
+
+Each payload is encoded with every codec, the envelope is pickled as Lithops
+does when it uploads a result, and then decoded. Codecs whose package is not
+installed, and the NumPy payload when NumPy is missing, are skipped. No
+functions are invoked.
+
+    python benchmarks/result_codecs.py --records 100000 --repeat 5
+"""
+
+import time
+import json
+import pickle
+import argparse
+import importlib
+import statistics
+
+from lithops_airflow_plugin.result_codecs import CODECS, make_encoder, decode_value
+
+CODEC_PACKAGES = {'zstd': 'zstandard', 'lz4': 'lz4.frame'}
+
+
+def make_payloads(records):
+    payloads = {
+        'records': [{'id': i, 'lon': i % 360 - 180.0, 'lat': i % 180 - 90.0,
+                     'name': 'tile-{:08d}'.format(i), 'valid': i % 3 == 0}
+                    for i in range(records)],
+        'text': '\n'.join('line {} of a plain text result'.format(i) for i in range(records)),
+    }
+    try:
+        import numpy as np
+        payloads['ndarray'] = np.random.default_rng(0).random((records, 16))
+    except ImportError:
+        pass
+    return payloads
+
+
+def available(codec):
+    package = CODEC_PACKAGES.get(codec)
+    if package is None:
+        return True
+    try:
+        importlib.import_module(package)
+        return True
+    except ImportError:
+        return False
+
+
+def run_case(codec, value, repeat):
+    encode = make_encoder(codec)
+    encode_times, decode_times = [], []
+    for _ in range(repeat):
+        start = time.time()
+        envelope = pickle.loads(pickle.dumps(encode(value), protocol=pickle.HIGHEST_PROTOCOL))
+        encode_times.append(time.time() - start)
+        start = time.time()
+        decode_value(envelope)
+        decode_times.append(time.time() - start)
+    return {'codec': codec,
+            'encoded_bytes': envelope['size'],
+            'encode_time': round(statistics.median(encode_times), 4),
+            'decode_time': round(statistics.median(decode_times), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = []
+    for name, value in make_payloads(args.records).items():
+        for codec in CODECS:
+            if not available(codec):
+                print('{:>8} {:>8}  skipped, package not installed'.format(name, codec))
+                continue
+            result = run_case(codec, value, args.repeat)
+            result['payload'] = name
+            results.append(result)
+            print('{:>8} {:>8} {:>12} bytes  encode {:.4f}s  decode {:.4f}s'.format(
+                name, codec, result['encoded_bytes'], result['encode_time'], result['decode_time']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+End to end benchmark of the Lithops operators on the localhost backend.
+
+Runs LithopsCallAsyncOperator, LithopsMapOperator and LithopsMapReduceOperator
+across a matrix of item counts, payload sizes and result sizes, and writes
+latency and throughput per case to JSON. With --compare, the run is checked
+against a stored baseline and regressions beyond --threshold are reported
+with a non-zero exit code.
+
+    python benchmarks/run_operators.py --output baseline.json
+    python benchmarks/run_operators.py --output current.json --compare baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import itertools
+import statistics
+
+import lithops
+
+from lithops_airflow_plugin.operators.lithops_operator import (
+    LithopsCallAsyncOperator,
+    LithopsMapOperator,
+    LithopsMapReduceOperator,
+)
+
+from bench_functions import echo_payload, count_results
+
+# No limit on the iterdata size, the largest cases upload 100 MB of payloads
+LOCAL_CONFIG = {'lithops': {'mode': 'localhost', 'backend': 'localhost', 'storage': 'localhost',
+                            'data_limit': False}}
+OPERATORS = ('call_async', 'map', 'map_reduce')
+
+
+class BenchTaskInstance:
+    """
+    Minimal stand-in for the TaskInstance in the execution context, keeping
+    XComs in memory so that no Airflow metadata DB is needed.
+    """
+
+    try_number = 1
+
+    def __init__(self):
+        self.xcoms = {}
+
+    def xcom_push(self, key, value):
+        self.xcoms[key] = value
+
+    def xcom_pull(self, task_ids, key='return_value'):
+        return self.xcoms.get(key)
+
+
+def make_operator(kind, items, payload_bytes, result_bytes, case_id):
+    payload = 'p' * payload_bytes
+    if kind == 'call_async':
+        return LithopsCallAsyncOperator(task_id=case_id, func=echo_payload,
+                                        data={'payload': payload, 'result_size': result_bytes})
+    iterdata = [{'payload': payload} for _ in range(items)]
+    if kind == 'map':
+        return LithopsMapOperator(task_id=case_id, map_function=echo_payload,
+                                  map_iterdata=iterdata,
+                                  extra_args={'result_size': result_bytes})
+    return LithopsMapReduceOperator(task_id=case_id, map_function=echo_payload,
+                                    reduce_function=count_results,
+                                    map_iterdata=iterdata,
+                                    extra_args={'result_size': result_bytes})
+
+
+def run_case(kind, items, payload_bytes, result_bytes, repeat):
+    case_id = '{}_{}items_{}p_{}r'.format(kind, items, payload_bytes, result_bytes)
+    latencies, phases = [], []
+    for i in range(repeat):
+        operator = make_operator(kind, items, payload_bytes, result_bytes, case_id)
+        ti = BenchTaskInstance()
+        context = {'task_instance': ti, 'ti': ti, 'run_id': 'bench_{}'.format(i)}
+        start = time.time()
+        operator.execute(context)
+        latencies.append(time.time() - start)
+        phases.append(ti.xcoms.get('lithops_metrics', {}).get('phases', {}))
+
+    latency = statistics.median(latencies)
+    calls = 1 if kind == 'call_async' else items
+    return case_id, {'operator': kind,
+                     'items': calls,
+                     'payload_bytes': payload_bytes,
+                     'result_bytes': result_bytes,
+                     'latency_median': latency,
+                     'latency_min': min(latencies),
+                     'throughput': calls / latency,
+                     'phases_median': {name: statistics.median(p.get(name, 0.0) for p in phases)
+                                       for name in phases[-1]}}
+
+
+def compare(current, baseline, threshold):
+    """
+    Returns the cases whose latency grew or throughput dropped by more than threshold.
+    """
+    regressions = []
+    for case_id, result in current['cases'].items():
+        base = baseline['cases'].get(case_id)
+        if base is None:
+            continue
+        latency_change = result['latency_median'] / base['latency_median'] - 1
+        throughput_change = result['throughput'] / base['throughput'] - 1
+        if latency_change > threshold or throughput_change < -threshold:
+            regressions.append({'case': case_id,
+                                'latency_change': round(latency_change, 3),
+                                'throughput_change': round(throughput_change, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--operators', nargs='+', choices=OPERATORS, default=list(OPERATORS))
+    parser.add_argument('--items', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--payload-bytes', type=int, nargs='+', default=[100, 100000])
+    parser.add_argument('--result-bytes', type=int, nargs='+', default=[100, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help='Baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative change reported as a regression')
+    args = parser.parse_args()
+
+    # Picked up by LithopsHook before the metadata DB is queried
+    os.environ.setdefault('AIRFLOW_CONN_LITHOPS_CONFIG',
+                          json.dumps({'conn_type': 'lithops', 'extra': LOCAL_CONFIG}))
+
+    report = {'lithops_version': lithops.__version__,
+              'python_version': platform.python_version(),
+              'timestamp': time.time(),
+              'cases': {}}
+    for kind in args.operators:
+        items_list = [1] if kind == 'call_async' else args.items
+        for items, payload, result in itertools.product(items_list, args.payload_bytes, args.result_bytes):
+            case_id, result = run_case(kind, items, payload, result, args.repeat)
+            report['cases'][case_id] = result
+            print('{}: {:.3f}s, {:.1f} calls/s'.format(case_id, result['latency_median'],
+                                                      result['throughput']))
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for regression in regressions:
+            print('REGRESSION {case}: latency {latency_change:+.1%}, '
+                  'throughput {throughput_change:+.1%}'.format(**regression))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Makespan and peak reducer memory of LithopsMapReduceOperator with a single
+reducer against tree reduction at several fan-ins, on the localhost backend.
+
+Every map call returns a payload of --part-bytes. Reducers report the
+maximum RSS of their process, so the peak is an upper bound that includes
+the worker itself.
+
+    python benchmarks/tree_reduce.py --calls 1000 --part-bytes 1000000 --fan-in 8 32
+"""
+
+import os
+import json
+import time
+import argparse
+
+from lithops_airflow_plugin.operators.lithops_operator import LithopsMapReduceOperator
+
+from run_operators import LOCAL_CONFIG, BenchTaskInstance
+from bench_functions import make_part, merge_parts
+
+
+def run(fan_in, args):
+    operator = LithopsMapReduceOperator(task_id='tree_reduce_{}'.format(fan_in),
+                                        map_function=make_part,
+                                        reduce_function=merge_parts,
+                                        map_iterdata=[args.part_bytes] * args.calls,
+                                        reduce_fan_in=fan_in)
+    ti = BenchTaskInstance()
+    start = time.time()
+    result = operator.execute({'task_instance': ti, 'ti': ti, 'run_id': 'bench'})
+    makespan = time.time() - start
+    assert result['count'] == args.calls
+    return {'fan_in': fan_in,
+            'makespan': round(makespan, 3),
+            'peak_reducer_rss': result['peak_rss'],
+            'reduce_calls': ti.xcoms['lithops_metrics']['calls'] - args.calls}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=1000)
+    parser.add_argument('--part-bytes', type=int, default=1000000)
+    parser.add_argument('--fan-in', type=int, nargs='+', default=[8, 32])
+    args = parser.parse_args()
+
+    os.environ.setdefault('AIRFLOW_CONN_LITHOPS_CONFIG',
+                          json.dumps({'conn_type': 'lithops', 'extra': LOCAL_CONFIG}))
+    report = [run(None, args)] + [run(fan_in, args) for fan_in in args.fan_in]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+XCom push/pull latency of BaseXCom against LithopsXComBackend.
+
+Measures serialize_value (push), deserialize_value plus resolve (pull) and
+the bytes that end up in the metadata DB row, for growing payloads. Uses
+the Lithops localhost storage backend.
+
+    python benchmarks/xcom_latency.py --sizes 1000 10000 100000
+"""
+
+import json
+import time
+import argparse
+import statistics
+from types import SimpleNamespace
+
+from airflow.models.xcom import BaseXCom
+from lithops.storage import Storage
+
+from lithops_airflow_plugin.xcom_backend import LithopsXComBackend
+
+LOCAL_CONFIG = {'lithops': {'backend': 'localhost', 'storage': 'localhost'}}
+
+
+def make_payload(items):
+    return [{'key': 'object-{}'.format(i), 'size': i, 'etag': '{:032x}'.format(i)}
+            for i in range(items)]
+
+
+def measure(backend, payload, repeat):
+    push, pull = [], []
+    for _ in range(repeat):
+        t0 = time.time()
+        row = backend.serialize_value(payload)
+        t1 = time.time()
+        backend.deserialize_value(SimpleNamespace(value=row))
+        t2 = time.time()
+        push.append(t1 - t0)
+        pull.append(t2 - t1)
+    return {'push_median': statistics.median(push),
+            'pull_median': statistics.median(pull),
+            'db_bytes': len(row)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    LithopsXComBackend.storage = Storage(config=LOCAL_CONFIG)
+
+    report = []
+    for items in args.sizes:
+        payload = make_payload(items)
+        report.append({'items': items,
+                       'base': measure(BaseXCom, payload, args.repeat),
+                       'lithops': measure(LithopsXComBackend, payload, args.repeat)})
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
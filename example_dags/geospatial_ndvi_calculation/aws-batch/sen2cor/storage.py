@@ -6,6 +6,7 @@ from ibm_botocore.credentials import DefaultTokenManager
 from ibm_botocore.client import ClientError
 from geojson import Feature, FeatureCollection, dump
 
+from lithops_airflow_plugin.listing import ListingIndex
 
 
 class COS:
@@ -19,6 +20,10 @@ class COS:
                                     config=client_config,
                                     endpoint_url=endpoint_url)
         self.bucket = bucket
+        # Keys, sizes and ETags of the bucket, kept in the bucket itself
+        self.index = ListingIndex(self.cos, bucket)
+        self._refreshed = False
+        self._full_listed = False
     
     def get_object(self, key):
         res = self.cos.get_object(Bucket=self.bucket, Key=key)
@@ -27,9 +32,30 @@ class COS:
     def put_object(self, key, obj):
         res = self.cos.put_object(Bucket=self.bucket, Key=key, Body=obj)
 
+    def refresh_index(self, full=False):
+        self.index.refresh(full=full)
+        self._refreshed = True
+        self._full_listed = self._full_listed or full or self.index.full_listings > 0
+
     def get_cos_files(self):
-        res = self.cos.list_objects(Bucket=self.bucket)
-        return [obj['Key'] for obj in res['Contents']]
+        if not self._refreshed:
+            self.refresh_index()
+        return [obj['Key'] for obj in self.index.objects()]
+
+    def find_pattern(self, tile, date, extension, band=None):
+        pattern = re.compile(r".*" +
+                             re.escape(date) +
+                             ".*" +
+                             re.escape(tile) +
+                             ("" if band is None else ".*" + re.escape(band)) +
+                             r".*\." +
+                             re.escape(extension))
+        filtered = [file for file in self.get_cos_files() if pattern.search(file)]
+        if not filtered and not self._full_listed:
+            # The index may miss objects that were not added in key order
+            self.refresh_index(full=True)
+            filtered = [file for file in self.get_cos_files() if pattern.search(file)]
+        return filtered
 
 
     def multi_part_upload(self, item_name, file_path, extra_args=None):
@@ -117,16 +143,7 @@ class COS:
 
     def check_pattern(self, tile, date, extension, band=None):
         try:
-            files = self.get_cos_files()
-            pattern = r".*" + \
-                re.escape(date) + \
-                ".*" + \
-                re.escape(tile) + \
-                ("" if band is None else ".*" + re.escape(band)) + \
-                ".*\." + \
-                re.escape(extension)
-            filtered = [file for file in files if re.search(pattern, file)]
-            return len(filtered) > 0
+            return len(self.find_pattern(tile, date, extension, band)) > 0
         except ClientError as be:
             print("CLIENT ERROR: {0}\n".format(be))
         except Exception as e:
@@ -134,15 +151,7 @@ class COS:
 
     def get_pattern(self, tile, date, extension, band=None):
         try:
-            files = self.get_cos_files()
-            pattern = r".*" + \
-                re.escape(date) + \
-                ".*" + \
-                re.escape(tile) + \
-                ("" if band is None else ".*" + re.escape(band)) + \
-                ".*\." + \
-                re.escape(extension)
-            filtered = [file for file in files if re.search(pattern, file)]
+            filtered = self.find_pattern(tile, date, extension, band)
             return filtered[0] if len(filtered) > 0 else None
         except ClientError as be:
             print("CLIENT ERROR: {0}\n".format(be))
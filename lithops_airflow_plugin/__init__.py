@@ -1 +1,7 @@
-from .lithops_plugin import *
+try:
+    from .lithops_plugin import *
+except ModuleNotFoundError as e:
+    # Helpers such as the listing index are also used where only the plugin
+    # is installed, without airflow and lithops
+    if e.name.split('.')[0] not in ('airflow', 'lithops'):
+        raise
@@ -0,0 +1,164 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Micro-batching of map items: several iterdata items run in a loop inside one
+function invocation and their results are unpacked back in call order.
+"""
+
+import math
+import inspect
+
+from lithops_airflow_plugin.utils import proxy_signature
+
+PROBE_ITEMS = 8
+TARGET_OVERHEAD = 0.1
+MAX_BATCH_SIZE = 1000
+BATCH_KEY = '__lithops_batch__'
+
+# Lithops arguments that a batched function can still receive
+SUPPORTED_SPECIAL_ARGS = ('id', 'storage')
+UNSUPPORTED_SPECIAL_ARGS = ('obj', 'url', 'ibm_cos', 'rabbitmq', 'internal_storage')
+# Arguments that Lithops leaves out when it binds an item to the function
+NOT_BOUND_ARGS = ('ibm_cos', 'swift', 'storage', 'id', 'rabbitmq')
+
+
+def make_batch_function(map_function, extra_args=None):
+    """
+    Returns a function that runs map_function over a batch of iterdata
+    items, with the same argument rules Lithops applies to a single item.
+
+    :param map_function: The user's map function.
+    :param extra_args: Lithops extra_args, a dict or a tuple, applied to every item.
+    """
+    params = list(inspect.signature(map_function).parameters)
+    unsupported = [p for p in params if p in UNSUPPORTED_SPECIAL_ARGS]
+    if unsupported:
+        raise ValueError('Batched map functions can not take {}'.format(', '.join(unsupported)))
+    wants_id = 'id' in params
+    wants_storage = 'storage' in params
+    bound_params = len([p for p in params if p not in NOT_BOUND_ARGS])
+    batch_key = BATCH_KEY
+
+    def run_batch(batch, offset, storage):
+        import time
+        start = time.time()
+        results = []
+        for i, item in enumerate(batch):
+            # Tuples, and lists with one value per parameter, are positional
+            # arguments. Lithops turns other items into a tuple with the
+            # extra_args before it checks for such lists.
+            args, kwargs = [], {}
+            if type(item) is dict:
+                kwargs.update(item)
+            elif type(item) is tuple or (type(item) is list and not extra_args and len(item) == bound_params):
+                args.extend(item)
+            else:
+                args.append(item)
+            if isinstance(extra_args, dict):
+                kwargs.update(extra_args)
+            elif extra_args is not None:
+                args.extend(extra_args)
+            if wants_id:
+                kwargs['id'] = offset + i
+            if wants_storage:
+                kwargs['storage'] = storage
+            results.append(map_function(*args, **kwargs))
+        return {batch_key: offset,
+                'results': results,
+                'elapsed': time.time() - start}
+
+    return run_batch
+
+
+def make_combine_function(function, combine_function):
+    """
+    Returns a function with the parameters of function, plain or batched,
+    that returns combine_function applied to the list of the call's
+    results, so that only the combined value leaves the worker.
+    """
+    signature, _ = proxy_signature(function)
+    batch_key = BATCH_KEY
+
+    def combine_call(**kwargs):
+        result = function(**kwargs)
+        if isinstance(result, dict) and batch_key in result:
+            return combine_function(result['results'])
+        return combine_function([result])
+
+    combine_call.__name__ = function.__name__
+    combine_call.__signature__ = signature
+    return combine_call
+
+
+def pack_batches(items, batch_size, offset=0):
+    """
+    Lazily groups iterdata items into the inputs of batched calls.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield {'batch': batch, 'offset': offset}
+            offset += len(batch)
+            batch = []
+    if batch:
+        yield {'batch': batch, 'offset': offset}
+
+
+def is_batch_result(value):
+    return isinstance(value, dict) and BATCH_KEY in value
+
+
+def unpack_results(results):
+    """
+    Flattens the outputs of batched calls into one result per item.
+    """
+    if not results or not is_batch_result(results[0]):
+        return results
+    unpacked = []
+    for batch in sorted(results, key=lambda b: b[BATCH_KEY]):
+        unpacked.extend(batch['results'])
+    return unpacked
+
+
+def iter_batch_result(call_index, value):
+    """
+    Yields (item_index, result) pairs for the output of one call, batched or not.
+    """
+    if is_batch_result(value):
+        for i, result in enumerate(value['results']):
+            yield value[BATCH_KEY] + i, result
+    else:
+        yield call_index, value
+
+
+def choose_batch_size(call_overhead, item_time, total_items=None, min_calls=None,
+                      target_overhead=TARGET_OVERHEAD, max_batch_size=MAX_BATCH_SIZE):
+    """
+    Picks the items per call that keeps the invocation overhead at about
+    target_overhead of each call's duration.
+
+    :param call_overhead: Seconds each invocation costs beyond running the items.
+    :param item_time: Seconds of compute per item.
+    :param total_items: Number of items, if known, to keep at least min_calls calls.
+    :param min_calls: Minimum number of calls to preserve parallelism, e.g. the workers limit.
+    """
+    item_time = max(item_time, 1e-6)
+    size = math.ceil(call_overhead * (1 - target_overhead) / (target_overhead * item_time))
+    if total_items and min_calls:
+        size = min(size, math.ceil(total_items / min_calls))
+    return max(1, min(size, max_batch_size))
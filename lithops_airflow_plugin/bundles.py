@@ -0,0 +1,360 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Content-addressed cache of function bundles. A bundle is the pickled
+function plus the source of the local modules it depends on. It is uploaded
+to object storage once per content hash and every later task submits a
+small loader instead, so Lithops does not analyze, pickle and upload the
+dependencies again.
+"""
+
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import logging
+import sysconfig
+from types import ModuleType
+
+import cloudpickle
+
+from lithops_airflow_plugin.utils import local_state_path, load_json, proxy_signature, updating_json
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_PREFIX = 'lithops.airflow/bundles'
+STATE_FILE = 'bundles.json'
+DEFAULT_TTL = 7 * 24 * 3600
+# Seconds a host trusts that an uploaded bundle still exists without
+# checking. Bundles used more recently than this are never evicted.
+LOCAL_TTL = 3600
+
+# Modules that are never bundled: lithops is installed in the runtime, and
+# airflow and this plugin are not needed there (see proxy_signature)
+NOT_BUNDLED = ('lithops', 'airflow', 'lithops_airflow_plugin')
+
+_SYSTEM_PATHS = tuple(os.path.realpath(p) for p in {sysconfig.get_paths()[name]
+                                                     for name in ('stdlib', 'platstdlib',
+                                                                  'purelib', 'platlib')})
+
+# Dependencies found per module and options, with the mtimes they were read at
+_MODULES_MEMO = {}
+
+
+def _is_local_module(module):
+    name = getattr(module, '__name__', '') or ''
+    path = getattr(module, '__file__', None)
+    if not path or not path.endswith('.py') or name == '__main__':
+        return False
+    if name.split('.')[0] in NOT_BUNDLED:
+        return False
+    return not os.path.realpath(path).startswith(_SYSTEM_PATHS)
+
+
+def _referenced_modules(module):
+    for value in list(vars(module).values()):
+        if isinstance(value, ModuleType):
+            yield value
+        else:
+            owner = sys.modules.get(getattr(value, '__module__', None) or '')
+            if owner is not None:
+                yield owner
+
+
+def _root_modules(function):
+    """
+    The module of the function and, for closures such as batched map
+    functions, the modules of the callables it wraps.
+    """
+    names, pending, seen = set(), [function], set()
+    while pending:
+        value = pending.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        names.add(getattr(value, '__module__', None))
+        # Wrappers such as batched or combined functions nest closures
+        for cell in getattr(value, '__closure__', None) or ():
+            try:
+                pending.append(cell.cell_contents)
+            except ValueError:
+                continue
+    return sorted(name for name in names if name in sys.modules)
+
+
+def dependency_modules(function, include_modules=(), exclude_modules=()):
+    """
+    Returns the local modules a function needs, following the Lithops
+    include_modules convention: an empty list means every dependency that
+    is found, None means none, and a list of names means those modules.
+
+    :param exclude_modules: Module names left out, with their submodules.
+    """
+    if include_modules is None:
+        found = []
+    elif include_modules:
+        found = [sys.modules[name] for name in include_modules if name in sys.modules]
+    else:
+        found, pending = [], [sys.modules[name] for name in _root_modules(function)]
+        while pending:
+            module = pending.pop()
+            if module in found or not _is_local_module(module):
+                continue
+            found.append(module)
+            pending.extend(_referenced_modules(module))
+
+    excluded = tuple(exclude_modules or ())
+    return sorted({m for m in found if _is_local_module(m)
+                   and not any(m.__name__ == e or m.__name__.startswith(e + '.') for e in excluded)},
+                  key=lambda m: m.__name__)
+
+
+def _module_files(modules):
+    """
+    Returns {relative path: file path} for the modules and their parent packages.
+    """
+    files = {}
+    for module in modules:
+        parts = module.__name__.split('.')
+        for depth in range(1, len(parts)):
+            package = sys.modules.get('.'.join(parts[:depth]))
+            if getattr(package, '__file__', None):
+                files[os.path.join(*parts[:depth], '__init__.py')] = package.__file__
+        if os.path.basename(module.__file__) == '__init__.py':
+            files[os.path.join(*parts, '__init__.py')] = module.__file__
+        else:
+            files[os.path.join(*parts) + '.py'] = module.__file__
+    return files
+
+
+def _stamps(files):
+    stamps = []
+    for relpath, path in sorted(files.items()):
+        st = os.stat(path)
+        stamps.append((relpath, st.st_mtime_ns, st.st_size))
+    return stamps
+
+
+def _module_sources(function, include_modules, exclude_modules):
+    """
+    Returns (module names, {relative path: source}) of the function's
+    dependencies, re-reading the files only when they changed.
+    """
+    memo_key = (tuple(_root_modules(function)),
+                None if include_modules is None else tuple(include_modules),
+                tuple(exclude_modules or ()))
+    memo = _MODULES_MEMO.get(memo_key)
+    if memo is not None:
+        names, files, stamps, sources = memo
+        try:
+            if _stamps(files) == stamps:
+                return names, sources
+        except OSError:
+            pass
+
+    modules = dependency_modules(function, include_modules, exclude_modules)
+    names = [m.__name__ for m in modules]
+    files = _module_files(modules)
+    sources = {}
+    for relpath, path in files.items():
+        with open(path, 'rb') as f:
+            sources[relpath] = f.read()
+    _MODULES_MEMO[memo_key] = (names, files, _stamps(files), sources)
+    return names, sources
+
+
+def make_loader(function, bucket, object_key, bundle_key):
+    """
+    Returns a function with the parameters of the original one that, in
+    the runtime, extracts the bundle once per container and calls the
+    bundled function.
+    """
+    signature, added = proxy_signature(function, extra=('storage',))
+    wants_storage = 'storage' not in added
+
+    # Reducers may get their results positionally
+    def run_bundled(*args, **kwargs):
+        import os
+        import sys
+        import pickle
+        import shutil
+        import tempfile
+
+        storage = kwargs.get('storage') if wants_storage else kwargs.pop('storage', None)
+        if storage is None:
+            from lithops.storage import Storage
+            storage = Storage()
+        path = os.path.join(tempfile.gettempdir(), 'lithops-airflow-bundles', bundle_key)
+        if not os.path.isdir(path):
+            bundle = pickle.loads(storage.get_object(bucket, object_key))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            staging = tempfile.mkdtemp(dir=os.path.dirname(path))
+            for relpath, source in bundle['modules'].items():
+                os.makedirs(os.path.join(staging, os.path.dirname(relpath)), exist_ok=True)
+                with open(os.path.join(staging, relpath), 'wb') as f:
+                    f.write(source)
+            with open(os.path.join(staging, '__bundle__.pickle'), 'wb') as f:
+                pickle.dump((bundle['names'], bundle['function']), f)
+            try:
+                os.rename(staging, path)
+            except OSError:
+                # Another call in this container extracted it first
+                shutil.rmtree(staging, ignore_errors=True)
+
+        with open(os.path.join(path, '__bundle__.pickle'), 'rb') as f:
+            names, function_bytes = pickle.load(f)
+        # A warm container may hold other versions of the bundled modules
+        for name in names:
+            module = sys.modules.get(name)
+            if module is not None and not (getattr(module, '__file__', None) or '').startswith(path):
+                del sys.modules[name]
+        if not sys.path or sys.path[0] != path:
+            if path in sys.path:
+                sys.path.remove(path)
+            sys.path.insert(0, path)
+        return pickle.loads(function_bytes)(*args, **kwargs)
+
+    run_bundled.__name__ = function.__name__
+    run_bundled.__signature__ = signature
+    return run_bundled
+
+
+class BundleCache:
+
+    def __init__(self, storage, ttl=DEFAULT_TTL, max_bytes=None, prefix=BUNDLE_PREFIX):
+        """
+        Uploads function bundles once per content hash. Uploaded bundles are
+        recorded locally, so a host only checks storage for a bundle once
+        per LOCAL_TTL, and in an index in storage used for eviction.
+
+        :param storage: Lithops storage client.
+        :param ttl: Seconds a bundle stays after its last use. Default 7 days.
+        :param max_bytes: Size of all the bundles above which the least
+                          recently used are evicted. Default None (unbounded).
+        """
+        self.storage = storage
+        self.bucket = storage.bucket
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.local_hits = 0
+        self.remote_hits = 0
+        self.uploads = 0
+
+        self._known = set()
+        self._touched = {}
+
+    def _object_key(self, key):
+        return '{}/{}.pickle'.format(self.prefix, key)
+
+    def loader(self, function, include_modules=(), exclude_modules=()):
+        """
+        Makes sure the bundle of the function is in storage and returns the
+        loader to submit in its place, with no modules for Lithops to pickle.
+        """
+        names, sources = _module_sources(function, include_modules, exclude_modules)
+        function_bytes = cloudpickle.dumps(function)
+        h = hashlib.sha256(function_bytes)
+        for relpath in sorted(sources):
+            h.update(relpath.encode('utf-8'))
+            h.update(hashlib.sha256(sources[relpath]).digest())
+        key = h.hexdigest()
+
+        if key not in self._known:
+            self._ensure_uploaded(key, lambda: pickle.dumps({'names': names,
+                                                            'modules': sources,
+                                                            'function': function_bytes},
+                                                           protocol=pickle.HIGHEST_PROTOCOL))
+            self._known.add(key)
+        return make_loader(function, self.bucket, self._object_key(key), key)
+
+    def _ensure_uploaded(self, key, encode):
+        path = local_state_path(STATE_FILE)
+        local_key = '{}/{}'.format(self.bucket, key)
+        now = time.time()
+        state = load_json(path, {})
+        if now - state.get(local_key, 0) < LOCAL_TTL:
+            self.local_hits += 1
+            return
+
+        try:
+            self.storage.head_object(self.bucket, self._object_key(key))
+            self.remote_hits += 1
+            self._touched[key] = None
+        except Exception:
+            body = encode()
+            self.storage.put_object(self.bucket, self._object_key(key), body)
+            self.uploads += 1
+            self._touched[key] = len(body)
+            logger.info('Uploaded function bundle %s (%d bytes)', key[:12], len(body))
+
+        with updating_json(path, {}) as state:
+            for k in [k for k, t in state.items() if now - t >= LOCAL_TTL]:
+                del state[k]
+            state[local_key] = now
+
+    def close(self):
+        """
+        Records the bundles checked by this task in the index and applies
+        the TTL and size limits. Like the result cache index, it is best
+        effort under concurrent updates.
+        """
+        if not self._touched:
+            return
+
+        # The index maps each key to [size, last_used]
+        index_key = '{}/index.json'.format(self.prefix)
+        try:
+            index = json.loads(self.storage.get_object(self.bucket, index_key))
+        except Exception:
+            index = {}
+
+        now = time.time()
+        for key, size in self._touched.items():
+            if size is not None or key not in index:
+                index[key] = [size or 0, now]
+            else:
+                index[key][1] = now
+
+        # Hosts may still trust bundles used within LOCAL_TTL
+        evictable = sorted((k for k, (_, last_used) in index.items() if now - last_used > LOCAL_TTL),
+                           key=lambda k: index[k][1])
+        evicted = {k for k in evictable if self.ttl is not None and now - index[k][1] > self.ttl}
+        if self.max_bytes is not None:
+            total = sum(size for k, (size, _) in index.items() if k not in evicted)
+            for key in evictable:
+                if total <= self.max_bytes:
+                    break
+                if key not in evicted:
+                    evicted.add(key)
+                    total -= index[key][0]
+
+        if evicted:
+            self.storage.delete_objects(self.bucket, [self._object_key(k) for k in evicted])
+            for key in evicted:
+                del index[key]
+            logger.info('Evicted %d function bundles', len(evicted))
+
+        self.storage.put_object(self.bucket, index_key, json.dumps(index))
+        self._touched = {}
+
+    def stats(self):
+        return {'local_hits': self.local_hits,
+                'remote_hits': self.remote_hits,
+                'uploads': self.uploads}
@@ -0,0 +1,95 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import pickle
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+CHECKPOINT_PREFIX = 'lithops.airflow/checkpoints'
+IO_THREADS = 64
+# Most keys a delete request takes
+DELETE_BATCH = 1000
+
+
+def item_fingerprint(item):
+    return hashlib.blake2b(pickle.dumps(item, protocol=4), digest_size=16).digest()
+
+
+class CallCheckpoint:
+
+    def __init__(self, storage, dag_id, task_id, run_id, items, prefix=CHECKPOINT_PREFIX):
+        """
+        Per-call completion state of a map task run, kept in object storage
+        so that retries and manual clears only invoke the calls that did not
+        succeed. Every result is stored with the fingerprint of its input, so
+        results are not reused if the upstream iterdata changed.
+
+        :param storage: Lithops storage client.
+        :param items: The full iterdata of the task, in call order.
+        """
+        self.storage = storage
+        self.bucket = storage.bucket
+        self.prefix = '/'.join([prefix, dag_id, task_id, run_id])
+        self._fingerprints = [item_fingerprint(item) for item in items]
+
+    def _key(self, index):
+        return '{}/{:08d}.pickle'.format(self.prefix, index)
+
+    def _load(self, index):
+        try:
+            fingerprint, value = pickle.loads(self.storage.get_object(self.bucket, self._key(index)))
+        except Exception:
+            return index, False, None
+        return index, fingerprint == self._fingerprints[index], value
+
+    def completed(self):
+        """
+        Returns {index: value} for the calls that already succeeded.
+        """
+        indexes = []
+        for key in self.storage.list_keys(self.bucket, self.prefix + '/'):
+            try:
+                index = int(key.rsplit('/', 1)[1].split('.')[0])
+            except ValueError:
+                continue
+            if index < len(self._fingerprints):
+                indexes.append(index)
+
+        with ThreadPoolExecutor(IO_THREADS) as pool:
+            loaded = list(pool.map(self._load, indexes))
+        return {index: value for index, valid, value in loaded if valid}
+
+    def save(self, pairs):
+        """
+        Stores (index, value) pairs of successful calls.
+        """
+        def put(pair):
+            index, value = pair
+            body = pickle.dumps((self._fingerprints[index], value), protocol=pickle.HIGHEST_PROTOCOL)
+            self.storage.put_object(self.bucket, self._key(index), body)
+
+        with ThreadPoolExecutor(IO_THREADS) as pool:
+            list(pool.map(put, pairs))
+
+    def clear(self):
+        """
+        Deletes the saved results of the task run, once every call succeeded
+        and they will not be resumed. Returns how many were deleted.
+        """
+        keys = self.storage.list_keys(self.bucket, self.prefix + '/')
+        for i in range(0, len(keys), DELETE_BATCH):
+            self.storage.delete_objects(self.bucket, keys[i:i + DELETE_BATCH])
+        return len(keys)
@@ -0,0 +1,514 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Long-lived executor service for Airflow workers.
+
+Building a lithops FunctionExecutor parses the config, creates the storage
+client and talks to the compute backend. The service keeps warm executors
+around, keyed by their resolved config, so that tasks only pay that cost once
+per worker. Tasks talk to it over a Unix socket through ExecutorServiceClient,
+which exposes the same call_async/map/map_reduce/wait/get_result methods as
+FunctionExecutor.
+
+Run it manually with:
+
+    python -m lithops_airflow_plugin.executor_service --socket /tmp/lithops-airflow/executor.sock
+
+or let ExecutorServiceClient start it on first use.
+
+Requests are pickled, so the socket lives in a directory only its owner can
+enter and the service drops connections from processes of other users before
+reading anything from them.
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import pickle
+import stat
+import socket
+import struct
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+import socketserver
+from collections import OrderedDict
+
+import cloudpickle
+
+logger = logging.getLogger(__name__)
+
+SOCKET_PATH_ENV = 'LITHOPS_EXECUTOR_SERVICE_SOCKET'
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), 'lithops-airflow-{}'.format(os.getuid()), 'executor.sock')
+MAX_EXECUTORS = 8
+IDLE_TIMEOUT = 900
+SPAWN_TIMEOUT = 30
+
+SUBMIT_OPS = ('call_async', 'map', 'map_reduce')
+COLLECT_OPS = ('wait', 'get_result')
+
+_HEADER = struct.Struct('!Q')
+
+
+def get_socket_path():
+    return os.environ.get(SOCKET_PATH_ENV, DEFAULT_SOCKET_PATH)
+
+
+def config_key(executor_config):
+    """
+    Returns a stable hash of an executor config, used to key warm executors.
+    """
+    dumped = json.dumps(executor_config, sort_keys=True, default=str)
+    return hashlib.sha256(dumped.encode('utf-8')).hexdigest()
+
+
+def future_key(future):
+    return (future.executor_id, future.job_id, future.call_id)
+
+
+def _private_dir(socket_path):
+    """
+    Creates the directory of the socket, readable only by the current user,
+    and refuses one that someone else owns or can enter.
+    """
+    path = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError('Executor service directory {} must be a directory owned by uid {} '
+                              'with mode 0700'.format(path, os.getuid()))
+    return path
+
+
+def _peer_uid(sock):
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    _, uid, _ = struct.unpack('3i', creds)
+    return uid
+
+
+def _send_msg(sock, obj):
+    # cloudpickle sends closures, such as batched and bundled functions, by value
+    data = cloudpickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(min(size - len(buf), 1 << 20))
+        if not chunk:
+            raise ConnectionError('Executor service closed the connection')
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _recv_msg(sock):
+    size, = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return pickle.loads(_recv_exact(sock, size))
+
+
+class _WarmExecutor:
+    def __init__(self, executor):
+        self.executor = executor
+        # FunctionExecutor.wait cleans every job with a done call, deleting the
+        # output of the calls of that job that a client has not fetched yet.
+        # The service cleans a job once all its calls were fetched instead.
+        self.executor.data_cleaner = False
+        self.last_used = time.time()
+        # Futures submitted by each client until it fetches them or disconnects
+        self.futures = {}
+        # Calls of each job whose output was not fetched yet, by any client
+        self.unfetched = {}
+        self.feeders = {}
+        self.submit_lock = threading.Lock()
+        # Workers granted to each connected client, which share the invoker
+        self.client_workers = {}
+        self.default_workers = self._invoker_workers()
+
+    def track(self, client, futures):
+        # The map calls of a map_reduce only feed its reducer, and are
+        # dropped along with the reducer's job
+        feeders = [f for f in futures if not getattr(f, '_produce_output', True)]
+        for future in futures:
+            key = future_key(future)
+            self.futures[key] = (client, future)
+            if getattr(future, '_produce_output', True):
+                self.unfetched.setdefault(key[:2], set()).add(key)
+                self.feeders.setdefault(key[:2], feeders)
+
+    def fetched(self, futures):
+        """
+        Forgets fetched futures, also in the shared executor, and returns one
+        future of each job whose calls have all been fetched, to clean.
+        """
+        finished, dropped = [], list(futures)
+        for future in futures:
+            key = future_key(future)
+            self.futures.pop(key, None)
+            calls = self.unfetched.get(key[:2])
+            if calls is None:
+                continue
+            calls.discard(key)
+            if not calls:
+                del self.unfetched[key[:2]]
+                dropped.extend(self.feeders.pop(key[:2], []))
+                finished.append(future)
+        self.drop(dropped)
+        return finished
+
+    def drop(self, futures):
+        """
+        Removes futures from the executor, which otherwise keeps every
+        future it ever submitted.
+        """
+        ids = {id(f) for f in futures}
+        self.executor.futures[:] = [f for f in self.executor.futures if id(f) not in ids]
+
+    def _invoker_workers(self):
+        invoker = self.executor.invoker
+        return getattr(invoker, 'max_workers', getattr(invoker, 'workers', None))
+
+    def set_workers(self, client, workers):
+        """
+        Limits the invoker to the workers of the connected clients, or to its
+        own config when none sets them.
+        """
+        if workers:
+            self.client_workers[client] = workers
+        else:
+            self.client_workers.pop(client, None)
+        limit = sum(self.client_workers.values()) or self.default_workers
+        invoker = self.executor.invoker
+        setattr(invoker, 'max_workers' if hasattr(invoker, 'max_workers') else 'workers', limit)
+
+
+class ExecutorPool:
+
+    def __init__(self, max_executors=MAX_EXECUTORS, idle_timeout=IDLE_TIMEOUT):
+        """
+        LRU pool of warm FunctionExecutors keyed by resolved config.
+
+        :param max_executors: Maximum number of executors kept warm at once.
+        :param idle_timeout: Seconds after which an unused executor is evicted.
+        """
+        self.max_executors = max_executors
+        self.idle_timeout = idle_timeout
+        self._executors = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per config being created, so that other configs are served meanwhile
+        self._creating = {}
+
+    def _lookup(self, key):
+        with self._lock:
+            warm = self._executors.get(key)
+            if warm is not None:
+                self._executors.move_to_end(key)
+                warm.last_used = time.time()
+            return warm
+
+    def get(self, executor_config):
+        """
+        Returns the warm executor for this config, creating it if needed.
+        """
+        from lithops import FunctionExecutor
+
+        key = config_key(executor_config)
+        warm = self._lookup(key)
+        if warm is not None:
+            return warm
+
+        with self._lock:
+            creating = self._creating.setdefault(key, threading.Lock())
+        with creating:
+            warm = self._lookup(key)
+            if warm is not None:
+                return warm
+            logger.info('Creating executor for config %s', key[:12])
+            warm = _WarmExecutor(FunctionExecutor(**executor_config))
+            evicted = []
+            with self._lock:
+                self._executors[key] = warm
+                self._creating.pop(key, None)
+                while len(self._executors) > self.max_executors:
+                    old_key, old = self._executors.popitem(last=False)
+                    logger.info('Evicted executor %s (LRU)', old_key[:12])
+                    evicted.append(old)
+        self._clean(evicted)
+        return warm
+
+    def evict_idle(self):
+        now = time.time()
+        evicted = []
+        with self._lock:
+            for key in list(self._executors):
+                if now - self._executors[key].last_used > self.idle_timeout:
+                    evicted.append(self._executors.pop(key))
+                    logger.info('Evicted executor %s (idle)', key[:12])
+        self._clean(evicted)
+
+    @staticmethod
+    def _clean(evicted):
+        # Lithops only cleans the jobs whose results were fetched, calls still
+        # watched by a trigger keep their data
+        for warm in evicted:
+            try:
+                warm.executor.clean()
+            except Exception:
+                logger.exception('Could not clean evicted executor %s', warm.executor.executor_id)
+
+    def forget(self, client):
+        """
+        Drops the workers and the unfetched futures of a client that disconnected.
+        """
+        with self._lock:
+            executors = list(self._executors.values())
+        for warm in executors:
+            with warm.submit_lock:
+                if client in warm.client_workers:
+                    warm.set_workers(client, None)
+                dropped = [f for owner, f in warm.futures.values() if owner == client]
+                for f in dropped:
+                    del warm.futures[future_key(f)]
+                warm.drop(dropped)
+
+    def __len__(self):
+        return len(self._executors)
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        try:
+            self._serve()
+        finally:
+            self.server.pool.forget(id(self))
+
+    def _serve(self):
+        while True:
+            try:
+                request = _recv_msg(self.request)
+            except (ConnectionError, EOFError):
+                return
+            try:
+                response = {'status': 'ok', 'value': self.server.dispatch(request, client=id(self))}
+            except Exception as e:
+                logger.exception('Request %s failed', request.get('op'))
+                response = {'status': 'error', 'error': e}
+            try:
+                _send_msg(self.request, response)
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                _send_msg(self.request, {'status': 'error',
+                                         'error': RuntimeError(repr(response.get('error', e)))})
+
+
+class ExecutorService(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, pool=None):
+        self.pool = pool if pool is not None else ExecutorPool()
+        super().__init__(socket_path, _RequestHandler)
+        os.chmod(socket_path, 0o600)
+
+    def verify_request(self, request, client_address):
+        # Runs before anything is unpickled from the connection
+        if not hasattr(socket, 'SO_PEERCRED'):
+            # Without peer credentials, the private directory keeps others out
+            return True
+        uid = _peer_uid(request)
+        if uid != os.getuid():
+            logger.warning('Refused a connection from uid %s', uid)
+            return False
+        return True
+
+    def dispatch(self, request, client=None):
+        op = request['op']
+        if op == 'ping':
+            return len(self.pool)
+
+        warm = self.pool.get(request['config'])
+        kwargs = request['kwargs']
+
+        if op in SUBMIT_OPS:
+            with warm.submit_lock:
+                warm.set_workers(client, request.get('workers'))
+                futures = getattr(warm.executor, op)(**kwargs)
+                warm.track(client, futures if isinstance(futures, list) else [futures])
+            return futures
+
+        if op in COLLECT_OPS:
+            # The client sends back copies of the futures, swap them for the
+            # ones this executor is tracking. A client that deferred sends
+            # them from another connection, after its own were dropped.
+            fs = kwargs['fs'] if isinstance(kwargs['fs'], list) else [kwargs['fs']]
+            tracked = dict(warm.futures)
+            kwargs['fs'] = [tracked[future_key(f)][1] if future_key(f) in tracked else f for f in fs]
+            value = getattr(warm.executor, op)(**kwargs)
+            if op == 'get_result' or kwargs.get('download_results'):
+                # wait only downloads the futures that are done
+                fetched = value[0] if op == 'wait' else kwargs['fs']
+                with warm.submit_lock:
+                    finished = warm.fetched(fetched)
+                if finished:
+                    warm.executor.clean(fs=finished, clean_cloudobjects=False)
+            return value
+
+        raise ValueError('Unknown executor service operation: {}'.format(op))
+
+    def evict_loop(self, interval=60):
+        while True:
+            time.sleep(interval)
+            self.pool.evict_idle()
+
+
+class ExecutorServiceClient:
+
+    def __init__(self, executor_config, socket_path=None, autostart=True, workers=None):
+        """
+        Proxy with the FunctionExecutor submit and collect API that forwards
+        calls to the executor service.
+
+        :param executor_config: Keyword arguments for FunctionExecutor.
+        :param socket_path: Service socket. Default from LITHOPS_EXECUTOR_SERVICE_SOCKET.
+        :param autostart: Start the service if it is not running.
+        :param workers: Workers this client may use of the shared executor, such as
+                        a governor lease. Kept out of the config so that clients with
+                        different grants share the warm executor.
+        """
+        self.executor_config = executor_config
+        self.workers = workers
+        # The service cleans each job once all its results are fetched
+        self.data_cleaner = False
+        self.socket_path = socket_path or get_socket_path()
+        self._sock = None
+        if autostart:
+            ensure_service(self.socket_path)
+
+    def _request(self, op, **kwargs):
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.connect(self.socket_path)
+        _send_msg(self._sock, {'op': op, 'config': self.executor_config, 'workers': self.workers,
+                               'kwargs': kwargs})
+        response = _recv_msg(self._sock)
+        if response['status'] == 'error':
+            raise response['error']
+        return response['value']
+
+    def call_async(self, **kwargs):
+        return self._request('call_async', **kwargs)
+
+    def map(self, **kwargs):
+        return self._request('map', **kwargs)
+
+    def map_reduce(self, **kwargs):
+        return self._request('map_reduce', **kwargs)
+
+    def wait(self, **kwargs):
+        return self._request('wait', **kwargs)
+
+    def get_result(self, **kwargs):
+        return self._request('get_result', **kwargs)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+def is_running(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        _send_msg(sock, {'op': 'ping'})
+        _recv_msg(sock)
+        return True
+    except (OSError, ConnectionError):
+        return False
+    finally:
+        sock.close()
+
+
+def ensure_service(socket_path):
+    """
+    Starts a detached executor service on socket_path unless one is already
+    answering there. The service inherits the caller's sys.path so that it
+    can unpickle the DAG callables.
+    """
+    _private_dir(socket_path)
+    if is_running(socket_path):
+        return
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in sys.path if p)
+    with open(socket_path + '.log', 'ab') as log_file:
+        subprocess.Popen([sys.executable, '-m', __name__, '--socket', socket_path],
+                         stdout=log_file, stderr=subprocess.STDOUT,
+                         stdin=subprocess.DEVNULL, env=env, start_new_session=True)
+
+    deadline = time.time() + SPAWN_TIMEOUT
+    while time.time() < deadline:
+        if is_running(socket_path):
+            return
+        time.sleep(0.1)
+    raise RuntimeError('Executor service did not start on {}'.format(socket_path))
+
+
+def serve(socket_path, max_executors=MAX_EXECUTORS, idle_timeout=IDLE_TIMEOUT):
+    _private_dir(socket_path)
+    # Several tasks may try to start the service at the same time, only the
+    # one holding the lock binds the socket
+    lock_file = open(socket_path + '.lock', 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        logger.info('Executor service already starting on %s', socket_path)
+        return
+
+    if os.path.exists(socket_path):
+        if is_running(socket_path):
+            return
+        os.unlink(socket_path)
+
+    server = ExecutorService(socket_path, ExecutorPool(max_executors, idle_timeout))
+    threading.Thread(target=server.evict_loop, daemon=True).start()
+    logger.info('Executor service listening on %s', socket_path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lithops executor service for Airflow workers')
+    parser.add_argument('--socket', default=get_socket_path())
+    parser.add_argument('--max-executors', type=int, default=MAX_EXECUTORS)
+    parser.add_argument('--idle-timeout', type=int, default=IDLE_TIMEOUT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+    serve(args.socket, args.max_executors, args.idle_timeout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Concurrency governor shared by the Lithops tasks of a deployment. The
+account concurrency of the backend is split in worker tokens, and every
+task takes a lease of tokens before it creates its executor, which then runs
+with that many workers. Leases live in an Airflow Variable of the metadata
+database, which every worker and the triggerer already share, so the
+governor needs no service: every allocation is a transaction that locks the
+variable's row.
+
+Tokens are split by weighted max-min fairness over the running and waiting
+tasks. Running tasks keep the tokens they were granted, since a Lithops job
+can not change its workers once submitted, so a waiting task starts once at
+least half of its fair share is free. When a task ends its tokens go back to
+the pool and the waiting tasks take them on their next poll. A deferred task
+keeps its lease while the trigger renews it, and a task that invoked its
+calls asynchronously keeps it until their timeout.
+"""
+
+import os
+import json
+import math
+import time
+import random
+import socket
+import threading
+
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
+
+from airflow.configuration import conf
+from airflow.models import Variable
+from airflow.utils.session import create_session
+
+GOVERNOR_KEY = 'lithops_governor'
+# Seconds a task waits after registering when others compete for the tokens,
+# so that the tasks started together share them
+SETTLE_TIME = 5
+POLL_INTERVAL = 1
+# Leases not renewed for this long belong to lost workers
+LEASE_TTL = 60
+# Seconds the lease of a task that invoked its calls asynchronously is kept
+# when the operator has no timeout, the default execution timeout of Lithops
+ASYNC_HOLD = 1800
+# A waiting task starts once it can get this fraction of its fair share
+MIN_GRANT_FRACTION = 0.5
+# Attempts of a transaction that hit a lock conflict, which SQLite reports instead of waiting
+LOCK_RETRIES = 10
+
+
+def governor_from_config():
+    """
+    Returns the ConcurrencyGovernor set by [lithops] governor_capacity and
+    governor_key, or None when no capacity is set.
+    """
+    capacity = conf.getint('lithops', 'governor_capacity', fallback=0)
+    if not capacity:
+        return None
+    return ConcurrencyGovernor(capacity,
+                               key=conf.get('lithops', 'governor_key', fallback=GOVERNOR_KEY),
+                               settle_time=conf.getfloat('lithops', 'governor_settle_time',
+                                                         fallback=SETTLE_TIME))
+
+
+def fair_shares(capacity, demands):
+    """
+    Weighted max-min fair split of capacity tokens. Tasks that need less
+    than their share get what they need and the rest is split again among
+    the others, in proportion to their weights. When there are more tasks
+    than tokens, the tokens left by rounding go one each to the first tasks
+    without any, and the rest get none and wait.
+
+    :param demands: {key: (weight, demand)} in arrival order, demand None for unbounded.
+    """
+    shares = {}
+    pending = dict(demands)
+    remaining = capacity
+    while pending:
+        total_weight = sum(weight for weight, _ in pending.values()) or 1
+        satisfied = {key: demand for key, (weight, demand) in pending.items()
+                     if demand is not None and demand <= remaining * weight / total_weight}
+        if not satisfied:
+            for key, (weight, _) in pending.items():
+                shares[key] = int(remaining * weight / total_weight)
+            left = remaining - sum(shares[key] for key in pending)
+            for key in pending:
+                if left <= 0:
+                    break
+                if not shares[key]:
+                    shares[key] = 1
+                    left -= 1
+            break
+        for key, demand in satisfied.items():
+            shares[key] = demand
+            remaining -= demand
+            del pending[key]
+    return shares
+
+
+def _alive(host, pid):
+    # Detached leases have no process, they expire instead
+    if pid is None or host != socket.gethostname():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Lease:
+
+    def __init__(self, governor, key, tokens, waited, peers):
+        """
+        Tokens granted to a task, renewed in the background until released
+        or detached.
+        """
+        self.governor = governor
+        self.key = key
+        self.tokens = tokens
+        self.waited = waited
+        self.peers = peers
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._renew, daemon=True)
+        self._heartbeat.start()
+
+    def _renew(self):
+        while not self._stop.wait(LEASE_TTL / 3):
+            try:
+                self.governor.renew(self.key)
+            except SQLAlchemyError:
+                pass
+
+    def release(self):
+        self._stop.set()
+        self.governor.release(self.key)
+
+    def detach(self, hold=LEASE_TTL):
+        """
+        Stops renewing the lease from this process, which is about to end
+        while the calls still run. The lease is kept for hold seconds, or for
+        as long as someone else renews it.
+        """
+        self._stop.set()
+        self.governor.detach(self.key, hold)
+
+    def stats(self):
+        return {'tokens': self.tokens,
+                'capacity': self.governor.capacity,
+                'waited': round(self.waited, 3),
+                'peers': self.peers}
+
+
+class ConcurrencyGovernor:
+
+    def __init__(self, capacity, key=GOVERNOR_KEY, settle_time=SETTLE_TIME, poll_interval=POLL_INTERVAL):
+        """
+        :param capacity: Worker tokens of the whole deployment, such as the account
+                         concurrency of the backend.
+        :param key: Airflow Variable that holds the leases. Default lithops_governor.
+        :param settle_time: Seconds a task waits after registering, when others compete
+                            for the tokens, before taking its share.
+        """
+        self.capacity = capacity
+        self.key = key
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+
+    def _transaction(self, update):
+        """
+        Runs update(leases, now) with the row of the variable locked, saves
+        the leases and returns what update returned.
+        """
+        for attempt in range(LOCK_RETRIES):
+            try:
+                with create_session() as session:
+                    # Lock the row with a write before reading it, as SQLite ignores FOR UPDATE
+                    # and only takes its lock on the first write of a transaction
+                    query = session.query(Variable).filter(Variable.key == self.key)
+                    query.update({Variable.key: Variable.key}, synchronize_session=False)
+                    variable = query.one_or_none()
+                    if variable is None:
+                        variable = Variable(key=self.key, val='{}',
+                                            description='Leases of the Lithops concurrency governor')
+                        session.add(variable)
+                    leases = json.loads(variable.val)
+                    result = update(leases, time.time())
+                    variable.val = json.dumps(leases, sort_keys=True)
+                return result
+            except (OperationalError, IntegrityError):
+                # A lock conflict, or another task created the variable first
+                if attempt == LOCK_RETRIES - 1:
+                    raise
+                time.sleep(random.uniform(0.05, 0.2) * (attempt + 1))
+
+    @staticmethod
+    def _drop_stale(leases, now):
+        for key in [k for k, lease in leases.items()
+                    if lease['expires'] < now or not _alive(lease['host'], lease['pid'])]:
+            del leases[key]
+
+    @staticmethod
+    def _new_lease(weight, demand, start, now):
+        return {'weight': weight, 'demand': demand, 'granted': 0,
+                'host': socket.gethostname(), 'pid': os.getpid(),
+                'registered_at': start, 'expires': now + LEASE_TTL}
+
+    def _contended(self, leases, key, demand):
+        others = [lease for k, lease in leases.items() if k != key]
+        if not others:
+            return False
+        free = self.capacity - sum(lease['granted'] for lease in others)
+        waiting = any(not lease['granted'] for lease in others)
+        return waiting or demand is None or demand > free
+
+    def acquire(self, key, weight=1, demand=None, timeout=None):
+        """
+        Registers a task and waits until it can take at least half of its
+        fair share of the tokens left by the running tasks. Returns its Lease.
+
+        :param key: Unique key of the task run.
+        :param weight: Share of the task relative to the others.
+        :param demand: Most tokens the task can use. Default None (unbounded).
+        :param timeout: Seconds to wait for tokens before raising TimeoutError. Default None (forever).
+        """
+        start = time.time()
+
+        def register(leases, now):
+            self._drop_stale(leases, now)
+            leases[key] = self._new_lease(weight, demand, start, now)
+            return self._contended(leases, key, demand)
+
+        try:
+            # Alone, or with tokens to spare, there is nobody to wait for
+            if self._transaction(register):
+                time.sleep(self.settle_time)
+            while True:
+                lease = self._try_grant(key, weight, demand, start)
+                if lease is not None:
+                    return lease
+                if timeout is not None and time.time() - start > timeout:
+                    raise TimeoutError('No concurrency tokens were available for {} in {}s'.format(key, timeout))
+                time.sleep(self.poll_interval)
+        except BaseException:
+            self._transaction(lambda leases, now: self._unregister(leases, key))
+            raise
+
+    @staticmethod
+    def _unregister(leases, key):
+        if key in leases and not leases[key]['granted']:
+            del leases[key]
+
+    def _try_grant(self, key, weight, demand, start):
+        def grant(leases, now):
+            self._drop_stale(leases, now)
+            if key not in leases:
+                # Dropped while waiting, such as after the host was suspended
+                leases[key] = self._new_lease(weight, demand, start, now)
+            leases[key]['expires'] = now + LEASE_TTL
+            # Running tasks can only use what they were granted
+            order = sorted(leases, key=lambda k: leases[k]['registered_at'])
+            demands = {k: (leases[k]['weight'], leases[k]['granted'] or leases[k]['demand']) for k in order}
+            target = fair_shares(self.capacity, demands)[key]
+            free = self.capacity - sum(lease['granted'] for k, lease in leases.items() if k != key)
+            tokens = min(target, free)
+            if tokens < max(1, math.ceil(target * MIN_GRANT_FRACTION)):
+                return None
+            leases[key]['granted'] = tokens
+            return tokens, now - start, len(leases) - 1
+
+        granted = self._transaction(grant)
+        if granted is None:
+            return None
+        tokens, waited, peers = granted
+        return Lease(self, key, tokens, waited, peers)
+
+    def renew(self, key, ttl=LEASE_TTL):
+        def update(leases, now):
+            if key in leases:
+                leases[key]['expires'] = max(leases[key]['expires'], now + ttl)
+
+        self._transaction(update)
+
+    def detach(self, key, hold=LEASE_TTL):
+        """
+        Keeps the lease of a task whose process ends for hold seconds, after
+        which it expires unless renewed.
+        """
+        def update(leases, now):
+            if key in leases:
+                leases[key].update(host=None, pid=None, expires=now + hold)
+
+        self._transaction(update)
+
+    def release(self, key):
+        self._transaction(lambda leases, now: leases.pop(key, None))
+
+    def leases(self):
+        """
+        Returns the current leases, granted and waiting, oldest first.
+        """
+        with create_session() as session:
+            variable = session.query(Variable).filter(Variable.key == self.key).one_or_none()
+            leases = json.loads(variable.val) if variable is not None else {}
+        return [dict(leases[key], key=key) for key in sorted(leases, key=lambda k: leases[k]['registered_at'])]
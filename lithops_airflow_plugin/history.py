@@ -0,0 +1,314 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Execution history of the Lithops tasks, one row per task run and one per
+call, kept in a SQLite database in the local state directory. The calls of
+a run are held in memory while the task runs and inserted in a single
+transaction when it ends. The report CLI reads it:
+
+    lithops-airflow-history tasks --dag-id meteo --since 30
+    lithops-airflow-history runs meteo plot_temp_spain --last 20
+"""
+
+import sys
+import json
+import time
+import sqlite3
+import argparse
+
+from airflow.configuration import conf
+
+from lithops_airflow_plugin.utils import local_state_path
+from lithops_airflow_plugin.metrics import percentile
+
+HISTORY_FILE = 'history.db'
+# Seconds to wait for the lock of the database held by another task
+LOCK_TIMEOUT = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    dag_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    try_number INTEGER,
+    recorded_at REAL NOT NULL,
+    runtime_memory INTEGER,
+    phases TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_task ON runs (dag_id, task_id, recorded_at);
+CREATE TABLE IF NOT EXISTS calls (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    call_id TEXT,
+    exec_time REAL,
+    queue_delay REAL,
+    cold_start INTEGER,
+    data_bytes INTEGER,
+    result_bytes INTEGER,
+    peak_memory INTEGER,
+    error INTEGER
+);
+CREATE INDEX IF NOT EXISTS calls_run ON calls (run);
+"""
+
+
+def history_from_config():
+    """
+    Returns the ExecutionHistory set by [lithops] execution_history and
+    execution_history_path, or None when it is disabled.
+    """
+    if not conf.getboolean('lithops', 'execution_history', fallback=True):
+        return None
+    return ExecutionHistory(conf.get('lithops', 'execution_history_path', fallback=None))
+
+
+class ExecutionHistory:
+
+    def __init__(self, path=None):
+        """
+        :param path: SQLite database. Default history.db in the local state directory.
+        """
+        self.path = path or local_state_path(HISTORY_FILE)
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT)
+        # Readers do not block the tasks that write
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA foreign_keys=ON')
+        connection.executescript(SCHEMA)
+        return connection
+
+    def record(self, dag_id, task_id, run_id, try_number=None, runtime_memory=None, phases=None, calls=()):
+        """
+        Inserts a task run and its calls in one transaction.
+
+        :param calls: Tuples of call_id, exec_time, queue_delay, cold_start, data_bytes,
+                      result_bytes, peak_memory and error, as collected by CallStats.
+        """
+        connection = self.connect()
+        try:
+            with connection:
+                cursor = connection.execute(
+                    'INSERT INTO runs (dag_id, task_id, run_id, try_number, recorded_at, runtime_memory, phases) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (dag_id, task_id, run_id, try_number, time.time(), runtime_memory, json.dumps(phases or {})))
+                run = cursor.lastrowid
+                connection.executemany('INSERT INTO calls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                       [(run,) + tuple(call) for call in calls])
+        finally:
+            connection.close()
+
+    def runs(self, dag_id=None, task_id=None, since=None, last=None):
+        """
+        Returns the recorded runs, oldest first, with the stats of their calls.
+
+        :param since: Only runs recorded in the last this many days.
+        :param last: Only the last this many runs of each task.
+        """
+        where, args = [], []
+        for column, value in (('dag_id', dag_id), ('task_id', task_id)):
+            if value is not None:
+                where.append('{} = ?'.format(column))
+                args.append(value)
+        if since is not None:
+            where.append('recorded_at >= ?')
+            args.append(time.time() - since * 86400)
+        query = 'SELECT id, dag_id, task_id, run_id, try_number, recorded_at, runtime_memory, phases FROM runs'
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += ' ORDER BY recorded_at'
+
+        connection = self.connect()
+        try:
+            runs = [dict(zip(('id', 'dag_id', 'task_id', 'run_id', 'try_number', 'recorded_at',
+                              'runtime_memory', 'phases'), row))
+                    for row in connection.execute(query, args)]
+            if last is not None:
+                by_task = {}
+                for run in runs:
+                    by_task.setdefault((run['dag_id'], run['task_id']), []).append(run)
+                kept = {run['id'] for task_runs in by_task.values() for run in task_runs[-last:]}
+                runs = [run for run in runs if run['id'] in kept]
+            for run in runs:
+                run['phases'] = json.loads(run['phases'] or '{}')
+                run['calls'] = connection.execute(
+                    'SELECT exec_time, queue_delay, cold_start, data_bytes, result_bytes, peak_memory, error '
+                    'FROM calls WHERE run = ?', (run['id'],)).fetchall()
+        finally:
+            connection.close()
+        return runs
+
+    def prune(self, older_than):
+        """
+        Deletes the runs recorded more than older_than days ago, and their calls.
+        """
+        connection = self.connect()
+        try:
+            with connection:
+                deleted = connection.execute('DELETE FROM runs WHERE recorded_at < ?',
+                                             (time.time() - older_than * 86400,)).rowcount
+            connection.execute('VACUUM')
+        finally:
+            connection.close()
+        return deleted
+
+
+def summarize_calls(calls, runtime_memory=None):
+    exec_times = sorted(c[0] for c in calls if c[0] is not None)
+    cold = [c[2] for c in calls if c[2] is not None]
+    gb_seconds = runtime_memory / 1024 * sum(exec_times) if runtime_memory else None
+    return {'calls': len(calls),
+            'errors': sum(1 for c in calls if c[6]),
+            'exec_time_p50': percentile(exec_times, 50),
+            'exec_time_p95': percentile(exec_times, 95),
+            'exec_time_p99': percentile(exec_times, 99),
+            'cold_start_rate': sum(cold) / len(cold) if cold else None,
+            'data_bytes': sum(c[3] or 0 for c in calls),
+            'result_bytes': sum(c[4] or 0 for c in calls),
+            'peak_memory': max((c[5] for c in calls if c[5] is not None), default=None),
+            'gb_seconds': gb_seconds}
+
+
+def run_report(run, price=None):
+    report = {'dag_id': run['dag_id'], 'task_id': run['task_id'], 'run_id': run['run_id'],
+              'try_number': run['try_number'], 'recorded_at': run['recorded_at'],
+              'runtime_memory': run['runtime_memory'], 'duration': round(sum(run['phases'].values()), 3)}
+    report.update(summarize_calls(run['calls'], run['runtime_memory']))
+    report['cost'] = report['gb_seconds'] * price if price and report['gb_seconds'] is not None else None
+    return report
+
+
+def task_report(runs, price=None):
+    """
+    Aggregates the runs of one task. The trend is the change of the mean
+    GB-seconds per run of the newer half of the runs over the older half.
+    """
+    calls = [call for run in runs for call in run['calls']]
+    report = {'dag_id': runs[0]['dag_id'], 'task_id': runs[0]['task_id'], 'runs': len(runs)}
+    report.update(summarize_calls(calls))
+    gb_seconds = [summarize_calls(run['calls'], run['runtime_memory'])['gb_seconds'] for run in runs]
+    gb_seconds = [value for value in gb_seconds if value is not None]
+    report['data_bytes'] //= len(runs)
+    report['result_bytes'] //= len(runs)
+    report['gb_seconds'] = sum(gb_seconds) / len(gb_seconds) if gb_seconds else None
+    report['cost'] = report['gb_seconds'] * price if price and report['gb_seconds'] is not None else None
+    report['gb_seconds_trend'] = None
+    half = len(gb_seconds) // 2
+    if half:
+        older = sum(gb_seconds[:half]) / half
+        newer = sum(gb_seconds[-half:]) / half
+        report['gb_seconds_trend'] = newer / older - 1 if older else None
+    return report
+
+
+def _format(value, kind=None):
+    if value is None:
+        return '-'
+    if kind == 'bytes':
+        for unit in ('B', 'KiB', 'MiB', 'GiB'):
+            if abs(value) < 1024:
+                return '{:.0f}{}'.format(value, unit)
+            value /= 1024
+        return '{:.1f}TiB'.format(value)
+    if kind == 'percent':
+        return '{:+.0%}'.format(value)
+    if kind == 'rate':
+        return '{:.0%}'.format(value)
+    if isinstance(value, float):
+        return '{:.3g}'.format(value)
+    return str(value)
+
+
+def _print_table(rows, columns):
+    table = [[name for name, _, _ in columns]]
+    table += [[_format(row[key], kind) for _, key, kind in columns] for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    for line in table:
+        print('  '.join(cell.rjust(width) for cell, width in zip(line, widths)))
+
+
+TASK_COLUMNS = [('dag', 'dag_id', None), ('task', 'task_id', None), ('runs', 'runs', None),
+                ('calls', 'calls', None), ('p50', 'exec_time_p50', None), ('p95', 'exec_time_p95', None),
+                ('p99', 'exec_time_p99', None), ('cold', 'cold_start_rate', 'rate'),
+                ('data/run', 'data_bytes', 'bytes'), ('results/run', 'result_bytes', 'bytes'),
+                ('GB-s/run', 'gb_seconds', None), ('trend', 'gb_seconds_trend', 'percent')]
+RUN_COLUMNS = [('run', 'run_id', None), ('try', 'try_number', None), ('memory', 'runtime_memory', None),
+               ('calls', 'calls', None), ('errors', 'errors', None), ('duration', 'duration', None),
+               ('p50', 'exec_time_p50', None), ('p95', 'exec_time_p95', None), ('p99', 'exec_time_p99', None),
+               ('cold', 'cold_start_rate', 'rate'), ('data', 'data_bytes', 'bytes'),
+               ('results', 'result_bytes', 'bytes'), ('peak', 'peak_memory', 'bytes'),
+               ('GB-s', 'gb_seconds', None)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='lithops-airflow-history',
+                                     description='Reports the execution history of the Lithops tasks.')
+    parser.add_argument('--db', help='History database. Default the one set in the Airflow config.')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON lines')
+    parser.add_argument('--price', type=float,
+                        help='Price of a GB-second, to add the cost to the report')
+    commands = parser.add_subparsers(dest='command')
+
+    tasks = commands.add_parser('tasks', help='Summary of each task across its runs')
+    tasks.add_argument('--dag-id')
+    tasks.add_argument('--since', type=float, help='Only runs of the last this many days')
+    tasks.add_argument('--last', type=int, help='Only the last this many runs of each task')
+
+    runs = commands.add_parser('runs', help='Stats of each run of a task')
+    runs.add_argument('dag_id')
+    runs.add_argument('task_id')
+    runs.add_argument('--since', type=float, help='Only runs of the last this many days')
+    runs.add_argument('--last', type=int, default=20, help='Only the last this many runs')
+
+    prune = commands.add_parser('prune', help='Delete old runs')
+    prune.add_argument('--older-than', type=float, required=True, help='Days')
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 1
+    history = ExecutionHistory(args.db or conf.get('lithops', 'execution_history_path', fallback=None))
+
+    if args.command == 'prune':
+        print('Deleted {} runs'.format(history.prune(args.older_than)))
+        return 0
+
+    if args.command == 'tasks':
+        by_task = {}
+        for run in history.runs(dag_id=args.dag_id, since=args.since, last=args.last):
+            by_task.setdefault((run['dag_id'], run['task_id']), []).append(run)
+        rows = [task_report(task_runs, args.price) for _, task_runs in sorted(by_task.items())]
+        columns = TASK_COLUMNS
+    else:
+        rows = [run_report(run, args.price)
+                for run in history.runs(args.dag_id, args.task_id, since=args.since, last=args.last)]
+        columns = RUN_COLUMNS
+
+    if args.price:
+        columns = columns + [('cost', 'cost', None)]
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+    elif rows:
+        _print_table(rows, columns)
+    else:
+        print('No runs recorded')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
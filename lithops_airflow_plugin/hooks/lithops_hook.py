@@ -14,10 +14,127 @@
 # limitations under the License.
 #
 
+import copy
+import time
+import inspect
+import threading
+
 from airflow.hooks.base_hook import BaseHook
+from airflow.configuration import conf
 from airflow.exceptions import AirflowException
 
+import lithops
 from lithops import FunctionExecutor
+from lithops.storage import Storage
+
+from lithops_airflow_plugin.executor_service import ExecutorServiceClient, config_key
+
+DEFAULT_CONNECTION_CACHE_TTL = 300
+DEFAULT_LOG_LEVEL = 'DEBUG'
+
+EXECUTOR_TYPES = ('serverless', 'localhost', 'standalone')
+# FunctionExecutor arguments an operator can set, besides config
+EXECUTOR_PARAMS = ('type', 'backend', 'storage', 'runtime', 'runtime_memory',
+                   'rabbitmq_monitor', 'workers', 'remote_invoker', 'log_level')
+# Names and values of the parameters that later Lithops versions renamed, newest last
+EXECUTOR_PARAM_ALIASES = {
+    'type': (('mode', lambda value: value),),
+    'rabbitmq_monitor': (('monitoring', lambda value: 'rabbitmq' if value else 'storage'),),
+    'workers': (('max_workers', lambda value: value),),
+}
+
+# Connection extras by conn_id, with the time they were loaded
+_connections = {}
+# Resolved executor specs that passed validation, by config hash
+_specs = {}
+_lock = threading.Lock()
+
+
+def merge_config(base, override):
+    """
+    Deep merges two Lithops configs into a new one. Values of override win,
+    None values in override are ignored.
+    """
+    merged = copy.deepcopy(base)
+    for key in sorted(override):
+        value = override[key]
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        elif value is not None:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def validate_spec(spec):
+    """
+    Checks a resolved executor spec before any executor is built with it.
+    """
+    unknown = sorted(set(spec) - set(EXECUTOR_PARAMS) - {'config'})
+    if unknown:
+        raise AirflowException('Unknown Lithops executor parameters: {}'.format(', '.join(unknown)))
+    if spec.get('type') is not None and spec['type'] not in EXECUTOR_TYPES:
+        raise AirflowException('Lithops executor type must be one of {}, got {!r}'.format(
+            ', '.join(EXECUTOR_TYPES), spec['type']))
+    for name in ('runtime_memory', 'workers'):
+        value = spec.get(name)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value <= 0):
+            raise AirflowException('Lithops {} must be a positive integer, got {!r}'.format(name, value))
+    if not isinstance(spec.get('config'), dict):
+        raise AirflowException('Lithops config must be a dict')
+    for section, value in spec['config'].items():
+        if not isinstance(value, dict):
+            raise AirflowException('Lithops config section {!r} must be a dict'.format(section))
+
+
+def resolve_executor_spec(connection_config, executor_params):
+    """
+    Returns the FunctionExecutor arguments for an operator: the operator's
+    config merged over the connection config, plus the operator's other
+    executor parameters that are set. The same inputs always give the same
+    spec, and each distinct spec is validated once per process.
+
+    :param connection_config: Lithops config from the Airflow connection.
+    :param executor_params: Executor parameters of the operator.
+    """
+    params = dict(executor_params or {})
+    config = merge_config(connection_config or {}, params.pop('config', None) or {})
+    spec = {'log_level': DEFAULT_LOG_LEVEL}
+    spec.update({name: params[name] for name in sorted(params) if params[name] is not None})
+    # The storage backend is also read from the config by storage clients and triggers
+    if spec.get('storage') is not None:
+        config = merge_config(config, {'lithops': {'storage': spec['storage']}})
+    spec['config'] = config
+
+    key = config_key(spec)
+    with _lock:
+        if key not in _specs:
+            validate_spec(spec)
+            _specs[key] = spec
+        return copy.deepcopy(_specs[key])
+
+
+def executor_kwargs(spec, executor_class=FunctionExecutor):
+    """
+    Returns the keyword arguments for the installed FunctionExecutor from an
+    executor spec, renaming the parameters that this Lithops version calls
+    differently. Versions that take the compute backend settings as extra
+    keyword arguments get them by their newest names.
+    """
+    parameters = inspect.signature(executor_class).parameters
+    named = {name for name, param in parameters.items() if param.kind != inspect.Parameter.VAR_KEYWORD}
+    var_keyword = len(named) < len(parameters)
+    kwargs = {}
+    for name in sorted(spec):
+        candidates = ((name, lambda value: value),) + EXECUTOR_PARAM_ALIASES.get(name, ())
+        match = next((c for c in candidates if c[0] in named), None)
+        if match is None:
+            if not var_keyword:
+                raise AirflowException('Lithops {} does not support the executor parameter {!r}'.format(
+                    lithops.__version__, name))
+            match = candidates[-1]
+        alias, convert = match
+        kwargs[alias] = convert(spec[name])
+    return kwargs
 
 
 class LithopsHook(BaseHook):
@@ -26,20 +143,61 @@ class LithopsHook(BaseHook):
         """
         Initializes hook for Lithops
         """
+        self.conn_id = conn_id
+        self.lithops_config = self._connection_config(conn_id)
+        self.executor_spec = None
+
+    def _connection_config(self, conn_id):
+        """
+        Returns the Lithops config of the connection, cached in the process
+        for [lithops] connection_cache_ttl seconds to spare the metadata DB.
+        """
+        ttl = conf.getfloat('lithops', 'connection_cache_ttl', fallback=DEFAULT_CONNECTION_CACHE_TTL)
+        with _lock:
+            cached = _connections.get(conn_id)
+        if cached is not None and time.time() - cached[0] < ttl:
+            return copy.deepcopy(cached[1])
+
         # Get config from Airflow's config parameters
         try:
-            conn = self.get_connection(conn_id)
-            self.lithops_config = conn.extra_dejson
+            config = self.get_connection(conn_id).extra_dejson
             self.log.info('lithops config load from Airflow connections')
         except AirflowException:
             self.log.warning('Could not find Lithops config in Airflow connections, \
             loading from ~/.lithops_config instead')
-            self.lithops_config = {}
+            config = {}
+        with _lock:
+            _connections[conn_id] = (time.time(), config)
+        return copy.deepcopy(config)
 
-    def get_conn(self, lithops_executor_config):
+    def resolve(self, executor_params=None):
+        """
+        Resolves the executor spec of an operator and makes the storage
+        clients of this hook use its config.
+        """
+        self.executor_spec = resolve_executor_spec(self.lithops_config, executor_params)
+        self.lithops_config = self.executor_spec['config']
+        return self.executor_spec
+
+    def get_conn(self, executor_params=None, use_executor_service=False, workers=None):
         """
         Initializes Lithops executor.
+        :param executor_params: Executor parameters of the operator, merged
+                                over the connection config.
+        :param use_executor_service: Submit through the worker's warm executor service
+                                     instead of building a new FunctionExecutor.
+        :param workers: Concurrent workers of the executor, such as a governor lease.
+                        Default from executor_params or the config.
+        """
+        spec = self.resolve(executor_params)
+        if use_executor_service:
+            return ExecutorServiceClient(executor_kwargs(spec), workers=workers)
+        if workers:
+            spec = dict(spec, workers=workers)
+        return FunctionExecutor(**executor_kwargs(spec))
+
+    def get_storage(self):
+        """
+        Returns a Lithops storage client for the same config the executors use.
         """
-        lithops_executor_config['log_level'] = 'DEBUG'
-        lithops_executor_config['config'] = self.lithops_config
-        return FunctionExecutor(**lithops_executor_config)
+        return Storage(config=self.lithops_config or None)
@@ -0,0 +1,147 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Adaptive invocation concurrency. Calls are submitted in waves and the
+invoke_pool_threads of each wave is chosen with AIMD: it grows additively
+while invocations stay fast and halves on throttling or when the time per
+invocation round degrades.
+"""
+
+import math
+
+from lithops_airflow_plugin.utils import local_state_path, load_json, updating_json
+
+INITIAL_CONCURRENCY = 32
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 500
+ADDITIVE_INCREASE = 16
+MULTIPLICATIVE_DECREASE = 0.5
+LATENCY_TOLERANCE = 2.0
+WAVE_ROUNDS = 4
+STATE_FILE = 'invoker.json'
+
+# Error codes of the AWS, IBM Cloud and S3 compatible APIs when a request is throttled,
+# which are also the class names of the modeled exceptions of their SDKs
+THROTTLE_ERROR_CODES = ('Throttling', 'ThrottlingException', 'ThrottledException', 'TooManyRequests',
+                        'TooManyRequestsException', 'RequestLimitExceeded', 'RequestThrottled',
+                        'SlowDown')
+THROTTLE_STATUS_CODE = 429
+
+
+def _throttled(error):
+    if type(error).__name__ in THROTTLE_ERROR_CODES:
+        return True
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        # botocore and ibm_botocore ClientError
+        code = response.get('Error', {}).get('Code')
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        return code in THROTTLE_ERROR_CODES or status == THROTTLE_STATUS_CODE
+    # requests HTTPError, and the SDKs that keep the HTTP status in the error
+    status = getattr(response, 'status_code', None) or getattr(error, 'status_code', None)
+    return status == THROTTLE_STATUS_CODE or getattr(error, 'code', None) == THROTTLE_STATUS_CODE
+
+
+def is_throttle_error(error):
+    """
+    True when the error, or the error it was raised from, is the backend
+    rejecting requests for exceeding its rate or concurrency.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if _throttled(error):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def call_exception(future):
+    """
+    Returns the exception raised by a failed call, from the status Lithops
+    fetched for its future, or None.
+    """
+    if not getattr(future, 'error', False):
+        return None
+    exception = getattr(future, '_exception', None)
+    if isinstance(exception, tuple):
+        # (type, value, traceback) as unpickled from the call status
+        return exception[1]
+    return exception
+
+
+def count_throttled(futures):
+    """
+    Counts the failed calls whose exception is a throttling error, among the
+    futures whose status was already fetched.
+    """
+    return sum(1 for f in futures if is_throttle_error(call_exception(f)))
+
+
+class AIMDController:
+
+    def __init__(self, initial=INITIAL_CONCURRENCY, minimum=MIN_CONCURRENCY,
+                 maximum=MAX_CONCURRENCY, increase=ADDITIVE_INCREASE,
+                 decrease=MULTIPLICATIVE_DECREASE, latency_tolerance=LATENCY_TOLERANCE):
+        """
+        :param initial: Starting concurrency.
+        :param increase: Threads added after a healthy wave.
+        :param decrease: Factor applied after a throttled or slow wave.
+        :param latency_tolerance: A wave is slow when its time per invocation
+                                  round exceeds this many times the best seen.
+        """
+        self.concurrency = max(minimum, min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.best_round_time = None
+        self.history = []
+
+    def wave_size(self):
+        return self.concurrency * WAVE_ROUNDS
+
+    def on_wave(self, calls, elapsed, throttled=0):
+        """
+        Updates the concurrency after a wave of calls was invoked.
+        """
+        rounds = max(1, math.ceil(calls / self.concurrency))
+        round_time = elapsed / rounds
+        if self.best_round_time is None or round_time < self.best_round_time:
+            self.best_round_time = round_time
+
+        if throttled or round_time > self.latency_tolerance * self.best_round_time:
+            self.on_throttle()
+        else:
+            self.concurrency = min(self.maximum, self.concurrency + self.increase)
+        self.history.append((calls, round(round_time, 4), throttled, self.concurrency))
+
+    def on_throttle(self):
+        self.concurrency = max(self.minimum, int(self.concurrency * self.decrease))
+
+
+def load_settled(key):
+    """
+    Returns the concurrency the last adaptive run with this key settled on.
+    """
+    return load_json(local_state_path(STATE_FILE), {}).get(key)
+
+
+def save_settled(key, concurrency):
+    with updating_json(local_state_path(STATE_FILE), {}) as state:
+        state[key] = concurrency
@@ -0,0 +1,92 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import re
+from itertools import islice
+
+from lithops_airflow_plugin.results import is_manifest, iter_manifest
+
+
+# Keys of the iterdata dicts whose value Lithops reads from storage or a URL
+STORAGE_KEYS = ('obj', 'url')
+STORAGE_URL = re.compile(r'^[a-z][a-z0-9+.-]*://[^/]+', re.IGNORECASE)
+
+
+def is_storage_iterdata(iterdata):
+    """
+    True for iterdata that Lithops expands itself from object storage, such
+    as 'cos://bucket/prefix/' or {'obj': 'cos://bucket/key'}, which can not
+    be split into batches here. Other strings and dicts are the input of a
+    single call.
+    """
+    if isinstance(iterdata, str):
+        return STORAGE_URL.match(iterdata) is not None
+    if isinstance(iterdata, dict) and not is_manifest(iterdata):
+        return any(key in iterdata for key in STORAGE_KEYS)
+    return False
+
+
+def single_call(iterdata):
+    """
+    Wraps a string or dict that is not storage iterdata in a list, as
+    Lithops maps it to one call, so that it is never iterated item by item.
+    """
+    if isinstance(iterdata, (str, dict)) and not is_manifest(iterdata) and not is_storage_iterdata(iterdata):
+        return [iterdata]
+    return iterdata
+
+
+def iter_upstream(value, get_storage):
+    """
+    Yields the items of an upstream XCom value without building new lists.
+    Result manifests are read one part at a time.
+
+    :param value: Pulled XCom value: a list or a result manifest.
+    :param get_storage: Callable returning a Lithops storage client, only used for manifests.
+    """
+    if is_manifest(value):
+        for _, item in iter_manifest(get_storage(), value):
+            yield item
+    else:
+        for item in value:
+            yield item
+
+
+def wrap_kwarg(kwarg, values):
+    """
+    Lazily turns each value into the {kwarg: value} input of one call.
+    """
+    return ({kwarg: value} for value in values)
+
+
+def resolve_iterdata(iterdata):
+    """
+    Returns the iterable to map over. Callables are called, so that DAGs can
+    pass generator factories that are only evaluated when the task runs.
+    """
+    return single_call(iterdata() if callable(iterdata) else iterdata)
+
+
+def iter_batches(iterable, batch_size):
+    """
+    Yields lists of at most batch_size items from any iterable.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
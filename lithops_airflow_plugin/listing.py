@@ -0,0 +1,262 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Persistent index of the objects under a bucket prefix, with their size and
+ETag, so that prefix iterdata is not listed from scratch on every run.
+
+The index is stored as JSON in object storage. A refresh only lists the keys
+after the last indexed one, which finds the new objects of prefixes whose
+keys grow in order, such as dated or numbered keys. Changed, deleted or
+out-of-order objects are picked up by a full listing, done when the last one
+is older than the full refresh interval. A full listing that finds objects
+the incremental refreshes missed marks the prefix as unordered, and it is
+then always listed in full. Sizes may be stale until the next full listing,
+so the objects about to be processed are checked with stale_objects first.
+
+The index works with a Lithops storage client or a boto3 S3 client, so it
+can be used against any S3 stand-in such as MinIO or moto.
+"""
+
+import json
+import time
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+LISTING_PREFIX = 'lithops.airflow/listings'
+FULL_REFRESH_INTERVAL = 24 * 3600
+# Objects checked one by one at most, past that a full listing takes fewer requests
+VERIFY_HEAD_LIMIT = 100
+VERIFY_THREADS = 16
+
+
+def _s3_client(client):
+    """
+    Returns a boto3-style client that can list from a given key, or None.
+    """
+    if hasattr(client, 'list_objects_v2'):
+        return client
+    get_client = getattr(client, 'get_client', None)
+    s3 = get_client() if get_client is not None else None
+    # The localhost backend imitates a few boto3 methods with other return values
+    return s3 if hasattr(s3, 'list_objects_v2') and hasattr(s3, 'meta') else None
+
+
+def _timestamp(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return value.timestamp()
+
+
+def list_objects(client, bucket, prefix='', start_after=None):
+    """
+    Yields {'Key', 'Size', 'ETag', 'LastModified'} of the objects under
+    prefix, in key order, only those after start_after when it is set.
+    Storage backends that can not start a listing at a key are listed in
+    full and filtered.
+    """
+    s3 = _s3_client(client)
+    if s3 is None:
+        entries = sorted(client.list_objects(bucket, prefix=prefix or None), key=lambda e: e['Key'])
+        entries = (e for e in entries if start_after is None or e['Key'] > start_after)
+    else:
+        entries = _list_pages(s3, bucket, prefix, start_after)
+    for entry in entries:
+        yield {'Key': entry['Key'],
+               'Size': entry.get('Size', 0),
+               'ETag': (entry.get('ETag') or '').strip('"') or None,
+               'LastModified': _timestamp(entry.get('LastModified'))}
+
+
+def _list_pages(s3, bucket, prefix, start_after):
+    kwargs = {'Bucket': bucket, 'Prefix': prefix or ''}
+    if start_after is not None:
+        kwargs['StartAfter'] = start_after
+    while True:
+        response = s3.list_objects_v2(**kwargs)
+        for entry in response.get('Contents', []):
+            yield entry
+        if not response.get('IsTruncated'):
+            return
+        kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+
+def _get_object(client, bucket, key):
+    if hasattr(client, 'list_objects_v2'):
+        return client.get_object(Bucket=bucket, Key=key)['Body'].read()
+    return client.get_object(bucket, key)
+
+
+def head_object(client, bucket, key):
+    """
+    Returns (size, etag) of an object, etag None when the backend has none,
+    or None when the object does not exist.
+    """
+    if hasattr(client, 'list_objects_v2'):
+        try:
+            response = client.head_object(Bucket=bucket, Key=key)
+        except Exception as e:
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('404', 'NoSuchKey'):
+                return None
+            raise
+        return response['ContentLength'], (response.get('ETag') or '').strip('"') or None
+
+    from lithops.storage.utils import StorageNoSuchKeyError
+    try:
+        headers = client.head_object(bucket, key)
+    except StorageNoSuchKeyError:
+        return None
+    headers = {name.lower(): value for name, value in headers.items()}
+    return int(headers['content-length']), (headers.get('etag') or '').strip('"') or None
+
+
+def stale_objects(client, objects, limit=VERIFY_HEAD_LIMIT):
+    """
+    Returns the keys of the listed objects whose size or ETag changed since
+    they were listed, or that were deleted. More than limit objects are not
+    checked and None is returned, a full listing is cheaper.
+
+    :param objects: Dicts with bucket, key, size and etag, as planned for partitioning.
+    """
+    if len(objects) > limit:
+        return None
+
+    def check(obj):
+        current = head_object(client, obj['bucket'], obj['key'])
+        if current is None:
+            return True
+        size, etag = current
+        return size != obj['size'] or (etag is not None and obj['etag'] is not None and etag != obj['etag'])
+
+    with ThreadPoolExecutor(max_workers=VERIFY_THREADS) as pool:
+        changed = list(pool.map(check, objects))
+    return [obj['key'] for obj, stale in zip(objects, changed) if stale]
+
+
+def _put_object(client, bucket, key, body):
+    if hasattr(client, 'list_objects_v2'):
+        client.put_object(Bucket=bucket, Key=key, Body=body)
+    else:
+        client.put_object(bucket, key, body)
+
+
+class ListingIndex:
+
+    def __init__(self, client, bucket, prefix='', full_refresh_interval=FULL_REFRESH_INTERVAL,
+                 index_bucket=None):
+        """
+        Index of the objects of bucket under prefix.
+
+        :param client: Lithops storage client or boto3 S3 client.
+        :param full_refresh_interval: Seconds after which the next refresh lists the whole
+                                      prefix again. 0 lists it on every refresh.
+        :param index_bucket: Bucket of the index object. Default the Lithops storage bucket,
+                             or bucket with a boto3 client.
+        """
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix or ''
+        self.full_refresh_interval = full_refresh_interval
+        self.index_bucket = index_bucket or getattr(client, 'bucket', None) or bucket
+        self.full_listings = 0
+        self.incremental_listings = 0
+        self.new_objects = 0
+        self.out_of_order_objects = 0
+
+        name = hashlib.sha1('{}/{}'.format(bucket, self.prefix).encode('utf-8')).hexdigest()[:20]
+        self.index_key = '{}/{}.json'.format(LISTING_PREFIX, name)
+        self._state = None
+
+    def _load(self):
+        try:
+            state = json.loads(_get_object(self.client, self.index_bucket, self.index_key))
+        except Exception:
+            return None
+        if state.get('bucket') != self.bucket or state.get('prefix') != self.prefix:
+            return None
+        return state
+
+    def _list(self, start_after=None):
+        objects = {}
+        for entry in list_objects(self.client, self.bucket, self.prefix, start_after):
+            # The index itself may be under the listed prefix
+            if self.bucket == self.index_bucket and entry['Key'].startswith(LISTING_PREFIX + '/'):
+                continue
+            objects[entry['Key']] = [entry['Size'], entry['ETag'], entry['LastModified']]
+        return objects
+
+    def refresh(self, full=False):
+        """
+        Brings the index up to date and stores it. Lists the whole prefix
+        when full is set, there is no index yet, the prefix is unordered or
+        the last full listing is older than full_refresh_interval, and only
+        the keys after the last indexed one otherwise.
+        """
+        now = time.time()
+        state = self._load()
+        if full or state is None or not state.get('ordered', True) or \
+                now - state['full_listed_at'] >= self.full_refresh_interval:
+            objects = self._list()
+            ordered = True
+            if state is not None:
+                new = set(objects) - set(state['objects'])
+                self.new_objects += len(new)
+                # New keys before the last indexed one were missed by the incremental refreshes
+                last_key = max(state['objects'], default=None)
+                missed = [key for key in new if last_key is not None and key < last_key]
+                ordered = state.get('ordered', True) and not missed
+                if missed:
+                    self.out_of_order_objects += len(missed)
+                    logger.warning('%d objects of %s/%s were added out of key order, the prefix will '
+                                   'always be listed in full', len(missed), self.bucket, self.prefix)
+            else:
+                self.new_objects += len(objects)
+            state = {'bucket': self.bucket, 'prefix': self.prefix,
+                     'full_listed_at': now, 'ordered': ordered, 'objects': objects}
+            self.full_listings += 1
+        else:
+            last_key = max(state['objects']) if state['objects'] else None
+            objects = self._list(start_after=last_key)
+            state['objects'].update(objects)
+            self.new_objects += len(objects)
+            self.incremental_listings += 1
+            if not objects:
+                self._state = state
+                return self
+        _put_object(self.client, self.index_bucket, self.index_key, json.dumps(state))
+        logger.info('Indexed %d objects of %s/%s', len(state['objects']), self.bucket, self.prefix)
+        self._state = state
+        return self
+
+    def objects(self):
+        """
+        Returns {'Key', 'Size', 'ETag', 'LastModified'} of the indexed
+        objects in key order, refreshing the index first if it was not.
+        """
+        if self._state is None:
+            self.refresh()
+        return [{'Key': key, 'Size': size, 'ETag': etag, 'LastModified': last_modified}
+                for key, (size, etag, last_modified) in sorted(self._state['objects'].items())]
+
+    def stats(self):
+        return {'full_listings': self.full_listings,
+                'incremental_listings': self.incremental_listings,
+                'new_objects': self.new_objects,
+                'out_of_order_objects': self.out_of_order_objects,
+                'objects': len(self._state['objects']) if self._state else 0}
@@ -21,6 +21,8 @@ from lithops_airflow_plugin.operators.lithops_operator import (
     LithopsCallAsyncOperator,
     LithopsMapOperator,
     LithopsMapReduceOperator,
+    LithopsPipelineOperator,
+    LithopsWarmupOperator,
 )
 
 
@@ -28,5 +30,7 @@ class LithopsAirflowPlugin(AirflowPlugin):
     name = "lithops_airflow_plugin"
     operators = [LithopsCallAsyncOperator,
                  LithopsMapOperator,
-                 LithopsMapReduceOperator]
+                 LithopsMapReduceOperator,
+                 LithopsPipelineOperator,
+                 LithopsWarmupOperator]
     hooks = [LithopsHook]
@@ -0,0 +1,175 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+runtime_memory autotuning from the history of each task. Every run records
+the memory it used, the peak memory and durations of its calls and the calls
+that ran out of memory. The next run picks, among the sizes that fit the
+highest peak seen plus a safety margin and never ran out of memory, the one
+with the best measured GB-seconds or wall time. Sizes next to the best one
+that were never tried are tried once, so the choice keeps improving.
+"""
+
+import math
+import time
+
+from lithops_airflow_plugin.utils import local_state_path, load_json, updating_json
+
+STATE_FILE = 'memory.json'
+MEMORY_SIZES = (256, 512, 1024, 1536, 2048, 3072, 4096, 6144, 8192, 10240)
+# Size of the first run of a task without history
+INITIAL_MEMORY = 1024
+SAFETY_MARGIN = 0.25
+OBJECTIVES = ('gb_seconds', 'wall_time')
+# Runs kept per task
+MAX_RUNS = 20
+
+MEMORY_ERROR_MARKERS = ('memoryerror', 'out of memory', 'outofmemory', 'exceeded maximum memory',
+                        'memory limit', 'oomkilled')
+
+
+def is_memory_error(future):
+    """
+    True for a failed call whose exception, as reported by Lithops, is a
+    memory failure.
+    """
+    exception = getattr(future, '_exception', None)
+    if not exception:
+        return False
+    exc_type, exc_value = exception[0], exception[1]
+    message = '{} {}'.format(getattr(exc_type, '__name__', exc_type), exc_value).lower()
+    return any(marker in message for marker in MEMORY_ERROR_MARKERS)
+
+
+def task_key(dag_id, task_id):
+    return '{}.{}'.format(dag_id, task_id)
+
+
+def load_runs(key):
+    return load_json(local_state_path(STATE_FILE), {}).get(key, [])
+
+
+def record_run(key, memory, calls=0, peak_memory=None, exec_time_mean=None, exec_time_p95=None,
+               memory_errors=0):
+    """
+    Appends a run of a task to its history.
+
+    :param memory: runtime_memory of the run, in MB.
+    :param peak_memory: Highest peak memory of its calls, in bytes.
+    :param memory_errors: Calls that ran out of memory at this size.
+    """
+    with updating_json(local_state_path(STATE_FILE), {}) as state:
+        runs = state.get(key, [])
+        runs.append({'memory': memory,
+                     'calls': calls,
+                     'peak_memory': peak_memory,
+                     'exec_time_mean': exec_time_mean,
+                     'exec_time_p95': exec_time_p95,
+                     'memory_errors': memory_errors,
+                     'time': time.time()})
+        state[key] = runs[-MAX_RUNS:]
+
+
+class MemoryTuner:
+
+    def __init__(self, runs, objective='gb_seconds', safety_margin=SAFETY_MARGIN,
+                 sizes=MEMORY_SIZES, max_memory=None, initial=INITIAL_MEMORY):
+        """
+        Picks the runtime_memory of a task from its recorded runs.
+
+        :param objective: 'gb_seconds' to minimize the memory times the call duration,
+                          or 'wall_time' to minimize the p95 call duration.
+        :param safety_margin: Fraction added to the highest peak memory seen.
+        :param max_memory: Largest size to use, in MB. Default the largest of sizes.
+        :param initial: Size of the first run, in MB.
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError('Unknown memory objective {!r}, use one of {}'.format(
+                objective, ', '.join(OBJECTIVES)))
+        self.runs = runs
+        self.objective = objective
+        self.safety_margin = safety_margin
+        self.max_memory = max_memory or max(sizes)
+        self.sizes = sorted(s for s in sizes if s <= self.max_memory) or [self.max_memory]
+        self.initial = initial
+
+    def required(self):
+        """
+        Smallest size in MB the history allows: above the highest peak
+        memory plus the safety margin and above any size that ran out of memory.
+        """
+        peaks = [run['peak_memory'] for run in self.runs if run['peak_memory']]
+        required = math.ceil(max(peaks) / 1024 ** 2 * (1 + self.safety_margin)) if peaks else 0
+        for run in self.runs:
+            if run['memory_errors']:
+                required = max(required, run['memory'] + 1)
+        return required
+
+    def _scores(self):
+        """
+        The objective of each size measured without memory errors, lower is better.
+        """
+        durations = {}
+        for run in self.runs:
+            if run['memory_errors'] or run['exec_time_mean'] is None:
+                continue
+            durations.setdefault(run['memory'], []).append(run)
+        scores = {}
+        for memory, runs in durations.items():
+            calls = sum(run['calls'] for run in runs) or 1
+            if self.objective == 'gb_seconds':
+                mean = sum(run['exec_time_mean'] * run['calls'] for run in runs) / calls
+                scores[memory] = memory / 1024 * mean
+            else:
+                scores[memory] = sum(run['exec_time_p95'] for run in runs) / len(runs)
+        return scores
+
+    def choose(self):
+        """
+        Returns (memory in MB, reason).
+        """
+        if not self.runs:
+            return self.initial, 'no history'
+
+        required = self.required()
+        feasible = [s for s in self.sizes if s >= required]
+        if not feasible:
+            return self.sizes[-1], 'needs more than the largest size'
+        scores = {memory: score for memory, score in self._scores().items() if memory in feasible}
+        if not scores:
+            smaller = [s for s in feasible if s < self.runs[-1]['memory']]
+            if smaller:
+                return smaller[-1], 'one size below the last run'
+            return feasible[0], 'smallest size above the peak memory'
+
+        best = min(scores, key=lambda memory: (scores[memory], memory))
+        smaller = [s for s in feasible if s < best]
+        if self.objective == 'gb_seconds' and smaller and smaller[-1] not in scores:
+            # A smaller size costs less unless the calls slow down as much. One size
+            # at a time, as the peak memory of one run does not bound the next ones
+            return smaller[-1], 'trying a smaller size'
+        larger = [s for s in feasible if s > best]
+        if self.objective == 'wall_time' and larger and larger[0] not in scores and best == max(scores):
+            # More memory gives more CPU in most backends
+            return larger[0], 'trying a larger size'
+        return best, 'best measured {}'.format(self.objective)
+
+    def next_size(self, memory):
+        """
+        Returns the next size above memory to retry calls that ran out of it, or None.
+        """
+        larger = [s for s in self.sizes if s > memory]
+        return larger[0] if larger else None
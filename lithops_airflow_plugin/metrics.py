@@ -0,0 +1,193 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import time
+import logging
+from datetime import timedelta
+from contextlib import contextmanager
+
+from airflow.stats import Stats
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = 'lithops'
+
+# Lithops has renamed some stats between versions, the first key found is used
+STAT_KEYS = {
+    'exec_time': ('worker_func_exec_time', 'worker_exec_time'),
+    'cold_start': ('worker_cold_start',),
+    'result_bytes': ('func_result_size', 'worker_result_size'),
+    'data_bytes': ('data_size_bytes', 'host_data_size', 'worker_data_size'),
+    'serialize_time': ('host_job_serialize_time',),
+    'peak_memory': ('worker_peak_memory_end', 'worker_peak_memory'),
+}
+
+
+def _stat(stats, name):
+    for key in STAT_KEYS[name]:
+        if key in stats:
+            return stats[key]
+    return None
+
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))
+    return values[index]
+
+
+class CallStats:
+    """
+    Aggregates the per-call stats that Lithops attaches to each future.
+    """
+
+    def __init__(self, keep_calls=False):
+        """
+        :param keep_calls: Also keep the stats of every call, for the execution history.
+        """
+        self.call_rows = [] if keep_calls else None
+        self.calls = 0
+        self.cold_starts = 0
+        self.warm_starts = 0
+        self.result_bytes = 0
+        self.data_bytes = 0
+        self.serialize_time = 0.0
+        self.peak_memory = None
+        self.exec_times = []
+        self.queue_delays = []
+
+    def add(self, futures):
+        for f in futures:
+            stats = getattr(f, 'stats', None)
+            if not stats:
+                continue
+            self.calls += 1
+            exec_time = _stat(stats, 'exec_time')
+            if exec_time is not None:
+                self.exec_times.append(exec_time)
+            queue_delay = None
+            if 'worker_start_tstamp' in stats and 'host_submit_tstamp' in stats:
+                queue_delay = stats['worker_start_tstamp'] - stats['host_submit_tstamp']
+                self.queue_delays.append(queue_delay)
+            cold_start = _stat(stats, 'cold_start')
+            if cold_start:
+                self.cold_starts += 1
+            elif cold_start is not None:
+                self.warm_starts += 1
+            result_bytes = _stat(stats, 'result_bytes')
+            data_bytes = _stat(stats, 'data_bytes')
+            self.result_bytes += result_bytes or 0
+            self.data_bytes += data_bytes or 0
+            self.serialize_time = max(self.serialize_time, _stat(stats, 'serialize_time') or 0.0)
+            peak_memory = _stat(stats, 'peak_memory')
+            if peak_memory is not None:
+                self.peak_memory = max(self.peak_memory or 0, peak_memory)
+            if self.call_rows is not None:
+                call_id = '{}/{}'.format(getattr(f, 'job_id', None), getattr(f, 'call_id', None))
+                self.call_rows.append((call_id, exec_time, queue_delay,
+                                       None if cold_start is None else int(bool(cold_start)),
+                                       data_bytes, result_bytes, peak_memory, int(bool(getattr(f, 'error', False)))))
+
+    def summary(self):
+        exec_times = sorted(self.exec_times)
+        queue_delays = sorted(self.queue_delays)
+        return {'calls': self.calls,
+                'cold_starts': self.cold_starts,
+                'warm_starts': self.warm_starts,
+                'exec_time_p50': percentile(exec_times, 50),
+                'exec_time_p95': percentile(exec_times, 95),
+                'exec_time_max': exec_times[-1] if exec_times else None,
+                'queue_delay_p50': percentile(queue_delays, 50),
+                'queue_delay_p95': percentile(queue_delays, 95),
+                'result_bytes': self.result_bytes,
+                'data_bytes': self.data_bytes,
+                'serialize_time': self.serialize_time,
+                'peak_memory': self.peak_memory}
+
+
+class TaskMetrics:
+
+    def __init__(self, dag_id, task_id, history=None):
+        """
+        Phase timings and call stats of one Lithops task.
+
+        :param history: ExecutionHistory the run and its calls are recorded in, or None.
+        """
+        self.dag_id = dag_id
+        self.task_id = task_id
+        self.history = history
+        # Memory of the calls, set by the operator for the execution history
+        self.runtime_memory = None
+        self.phases = {}
+        self.calls = CallStats(keep_calls=history is not None)
+        self._overhead = 0.0
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.time() - start
+
+    def add_calls(self, futures):
+        start = time.time()
+        self.calls.add(futures)
+        self._overhead += time.time() - start
+
+    def summary(self):
+        summary = {'phases': {name: round(value, 4) for name, value in self.phases.items()}}
+        summary.update(self.calls.summary())
+        return summary
+
+    def emit(self, context):
+        """
+        Sends the metrics to StatsD, records the run in the execution
+        history and pushes the summary as the 'lithops_metrics' XCom of the task.
+        """
+        start = time.time()
+        summary = self.summary()
+        prefix = '{}.{}.{}'.format(METRICS_PREFIX, self.dag_id, self.task_id)
+        for name, value in summary['phases'].items():
+            Stats.timing('{}.phase.{}'.format(prefix, name), timedelta(seconds=value))
+        Stats.gauge('{}.calls'.format(prefix), summary['calls'])
+        Stats.gauge('{}.cold_starts'.format(prefix), summary['cold_starts'])
+        Stats.gauge('{}.result_bytes'.format(prefix), summary['result_bytes'])
+        Stats.gauge('{}.data_bytes'.format(prefix), summary['data_bytes'])
+        for name in ('exec_time_p50', 'exec_time_p95', 'queue_delay_p50', 'queue_delay_p95'):
+            if summary[name] is not None:
+                Stats.timing('{}.{}'.format(prefix, name), timedelta(seconds=summary[name]))
+        if self.history is not None:
+            self._record_history(context, summary)
+
+        summary['instrumentation_overhead'] = round(self._overhead + time.time() - start, 6)
+        context['task_instance'].xcom_push(key='lithops_metrics', value=summary)
+        return summary
+
+    def _record_history(self, context, summary):
+        # The history is for reporting, never fail the task because of it
+        try:
+            self.history.record(self.dag_id, self.task_id, context['run_id'],
+                                try_number=context['task_instance'].try_number,
+                                runtime_memory=self.runtime_memory,
+                                phases=summary['phases'],
+                                calls=self.calls.call_rows)
+        except Exception as e:
+            logger.warning('Could not record the execution history: %s', e)
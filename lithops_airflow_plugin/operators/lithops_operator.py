@@ -14,15 +14,96 @@
 # limitations under the License.
 #
 
+import time
+import uuid
+import pickle
+import inspect
+from itertools import islice
+from contextlib import contextmanager
+
 from airflow.utils.decorators import apply_defaults
 from airflow.models.baseoperator import BaseOperator
-from airflow.exceptions import AirflowException
+from airflow.exceptions import AirflowException, TaskDeferred
 from airflow.operators.python_operator import PythonOperator
+from lithops.wait import ALWAYS, ANY_COMPLETED
+
 from lithops_airflow_plugin.hooks.lithops_hook import LithopsHook
+from lithops_airflow_plugin.executor_service import config_key, future_key
+from lithops_airflow_plugin.results import StorageResultSink
+from lithops_airflow_plugin.result_cache import ResultCache
+from lithops_airflow_plugin.checkpoint import CallCheckpoint
+from lithops_airflow_plugin.metrics import CallStats, TaskMetrics, percentile
+from lithops_airflow_plugin.history import history_from_config
+from lithops_airflow_plugin.governor import ASYNC_HOLD, governor_from_config
+from lithops_airflow_plugin.speculation import StragglerPolicy
+from lithops_airflow_plugin.bundles import DEFAULT_TTL as BUNDLE_TTL, BundleCache
+from lithops_airflow_plugin.warmup import WARMUP_HOLD, make_warmup_function, summarize_warmup
+from lithops_airflow_plugin.pipeline import PIPELINE_PREFIX, make_stage_function, validate_stages
+from lithops_airflow_plugin.result_codecs import (
+    CODECS,
+    CodecStats,
+    make_decoding_reducer,
+    make_encoding_function,
+)
+from lithops_airflow_plugin.listing import FULL_REFRESH_INTERVAL as LISTING_REFRESH_INTERVAL
+from lithops_airflow_plugin.partitioner import (
+    TARGET_CALL_DURATION,
+    is_self_overlapping,
+    make_partition_function,
+    plan_partitions,
+    record_throughput,
+    throughput_key,
+)
+from lithops_airflow_plugin.memory import (
+    OBJECTIVES as MEMORY_OBJECTIVES,
+    SAFETY_MARGIN,
+    MemoryTuner,
+    is_memory_error,
+    load_runs,
+    record_run,
+    task_key,
+)
+from lithops_airflow_plugin.watermark import FORCE_FULL_CONF, MODES as WATERMARK_MODES, Watermark
+from lithops_airflow_plugin.tree_reduce import (
+    OUTPUT_PREFIX_ENV,
+    TREE_PREFIX,
+    make_map_writer,
+    make_tree_reducer,
+    tree_levels,
+)
+from lithops_airflow_plugin.invoker import (
+    MAX_CONCURRENCY,
+    AIMDController,
+    count_throttled,
+    is_throttle_error,
+    load_settled,
+    save_settled,
+)
+from lithops_airflow_plugin.batching import (
+    PROBE_ITEMS,
+    choose_batch_size,
+    iter_batch_result,
+    make_batch_function,
+    make_combine_function,
+    pack_batches,
+    unpack_results,
+)
+from lithops_airflow_plugin.iterdata import (
+    is_storage_iterdata,
+    iter_batches,
+    iter_upstream,
+    resolve_iterdata,
+    single_call,
+    wrap_kwarg,
+)
 
 
 class LithopsOperator(BaseOperator):
     ui_color = '#c4daff'
+    # Set by the operators whose map results can be encoded
+    result_codec = None
+    # Set by the operators whose futures give a single result, not one per call
+    single_result = False
 
     @apply_defaults
     def __init__(self,
@@ -37,6 +118,16 @@ class LithopsOperator(BaseOperator):
                  remote_invoker: bool = None,
                  async_invoke: bool = False,
                  get_result: bool = True,
+                 use_executor_service: bool = False,
+                 deferrable: bool = False,
+                 poll_interval: float = 5.0,
+                 stream_results: bool = False,
+                 result_batch_size: int = 1000,
+                 result_prefix: str = None,
+                 bundle_cache: bool = False,
+                 bundle_cache_ttl: float = BUNDLE_TTL,
+                 bundle_cache_max_bytes: int = None,
+                 concurrency_weight: float = None,
                  *args, **kwargs):
         """
         Wrapper around Lithops FunctionExecutor
@@ -51,11 +142,31 @@ class LithopsOperator(BaseOperator):
         :param remote_invoker Use remote invocation functionality. 
         :param async_invoke Asynchronous invocation, does not wait for functions to end execution.
         :param get_result Get functions result.
+        :param use_executor_service Reuse a warm executor from the worker's executor service.
+        :param deferrable Release the worker slot while the functions run, waiting in the triggerer instead.
+        :param poll_interval Seconds between job status checks when deferred.
+        :param stream_results Write results to storage as they complete and return a manifest instead.
+        :param result_batch_size Number of results per storage object when streaming.
+        :param result_prefix Storage prefix for streamed results. Default lithops.airflow/results/<dag>/<task>/<run>.
+        :param bundle_cache Upload the function and its module dependencies once per content hash and reuse them across runs.
+        :param bundle_cache_ttl Seconds an unused function bundle is kept in storage. Default 7 days.
+        :param bundle_cache_max_bytes Size of all the bundles above which the least recently used are evicted.
+        :param concurrency_weight Share of the deployment's worker tokens relative to other tasks. Default the priority_weight.
         """
 
         self.lithops_config = config if config is not None else {}
         self.async_invoke = async_invoke
         self.get_result = get_result
+        self.use_executor_service = use_executor_service
+        self.deferrable = deferrable
+        self.poll_interval = poll_interval
+        self.stream_results = stream_results
+        self.result_batch_size = result_batch_size
+        self.result_prefix = result_prefix
+        self.bundle_cache = bundle_cache
+        self.bundle_cache_ttl = bundle_cache_ttl
+        self.bundle_cache_max_bytes = bundle_cache_max_bytes
+        self.concurrency_weight = concurrency_weight
 
         self._executor_params = {
             'type': type,
@@ -72,6 +183,23 @@ class LithopsOperator(BaseOperator):
         self._function_result = None
         self._futures = None
         self._executor = None
+        self._hook = None
+
+        # Results known before submission, by item index, and the item index
+        # of each submitted call when only part of the iterdata is submitted
+        self._prefilled = None
+        self._index_map = None
+        self._cache = None
+        self._cache_keys = None
+        self._checkpoint = None
+        self._metrics = None
+        self._bundles = None
+        self._prewarmed = None
+        self._codec_stats = None
+        self._partition_plan = None
+        self._map_futures = None
+        self._watermark = None
+        self._lease_workers = None
 
         # Initialize BaseOperator
         super().__init__(*args, **kwargs)
@@ -80,19 +208,213 @@ class LithopsOperator(BaseOperator):
         """
         Executes function. Overrides 'execute' from BaseOperator.
         """
-        # Initialize lithops hook
-        self._executor = LithopsHook().get_conn(self.lithops_config)
+        self._metrics = TaskMetrics(self.dag_id, self.task_id, history=history_from_config())
+        lease = self._acquire_concurrency(context)
+        deferred = False
+        try:
+            # Initialize lithops hook
+            with self._metrics.phase('init'):
+                hook = self._hook = LithopsHook()
+                self._executor = hook.get_conn(self._executor_params,
+                                               use_executor_service=self.use_executor_service,
+                                               workers=self._lease_workers)
+
+            with self._metrics.phase('submit'):
+                self._futures = self.execute_callable(context)
+                if self._bundles is not None:
+                    self._bundles.close()
+                    context['task_instance'].xcom_push(key='bundle_cache', value=self._bundles.stats())
+            self.log.info("Execution Done")
+
+            if not self.async_invoke and self._futures:
+                if self.deferrable:
+                    self._defer(hook, lease)
+                if not self.stream_results:
+                    with self._metrics.phase('wait'):
+                        self._wait()
+            else:
+                self.log.info("Done: Not waiting for result")
+
+            return self._finish(hook, context)
+        except TaskDeferred:
+            deferred = True
+            raise
+        finally:
+            if lease is not None:
+                self._end_lease(lease, deferred)
+
+    def _acquire_concurrency(self, context):
+        """
+        Waits for a lease of worker tokens from the concurrency governor of
+        the deployment, when [lithops] governor_capacity is set, and runs
+        the executor with that many workers. Returns the lease, or None.
+        """
+        governor = governor_from_config()
+        if governor is None:
+            return None
+        weight = self.concurrency_weight or self.priority_weight
+        with self._metrics.phase('governor'):
+            lease = governor.acquire(self._lease_key(context), weight=weight,
+                                     demand=self._executor_params['workers'])
+        # Not part of the executor params, so that warm executors are shared whatever the grant
+        self._lease_workers = lease.tokens
+        self.log.info("Granted {} of {} workers, shared with {} other tasks".format(
+            lease.tokens, governor.capacity, lease.peers))
+        context['task_instance'].xcom_push(key='concurrency', value=lease.stats())
+        return lease
 
-        self._futures = self.execute_callable(context)
-        self.log.info("Execution Done")
+    def _lease_key(self, context):
+        return '{}.{}.{}'.format(self.dag_id, self.task_id, context['run_id'])
 
-        if not self.async_invoke:
-            self._executor.wait(fs=self._futures)
+    def _end_lease(self, lease, deferred):
+        """
+        Gives the worker tokens back once the calls are done. The trigger of
+        a deferred task renews its lease until execute_complete releases it,
+        and asynchronous calls keep it until they time out.
+        """
+        if deferred:
+            lease.detach()
+        elif self.async_invoke and self._futures:
+            lease.detach(getattr(self, 'timeout', None) or ASYNC_HOLD)
         else:
-            self.log.info("Done: Not waiting for result")
+            lease.release()
+
+    def execute_complete(self, context, event):
+        """
+        Resumes a deferred task once the trigger has seen all its calls finish.
+        """
+        try:
+            self._metrics = TaskMetrics(self.dag_id, self.task_id, history=history_from_config())
+            hook = self._hook = LithopsHook()
+            hook.resolve(self._executor_params)
+            storage = hook.get_storage()
+            futures_key = event['futures_key']
+            self._futures = pickle.loads(storage.get_object(storage.bucket, futures_key))
+            storage.delete_object(storage.bucket, futures_key)
+
+            if event['status'] != 'success':
+                raise AirflowException('Lithops trigger failed: {}'.format(event.get('message')))
+
+            self._executor = hook.get_conn(self._executor_params,
+                                           use_executor_service=self.use_executor_service)
+            return self._finish(hook, context)
+        finally:
+            # The lease was kept while deferred
+            governor = governor_from_config()
+            if governor is not None:
+                governor.release(self._lease_key(context))
+
+    def _bundle(self, function):
+        """
+        Returns the function to submit and the include_modules and
+        exclude_modules to submit it with. With bundle_cache, a loader of the
+        cached bundle is submitted instead and Lithops pickles no modules.
+        """
+        if not self.bundle_cache:
+            return function, self.include_modules, self.exclude_modules
+        if self._bundles is None:
+            self._bundles = BundleCache(self._hook.get_storage(), ttl=self.bundle_cache_ttl,
+                                        max_bytes=self.bundle_cache_max_bytes)
+        loader = self._bundles.loader(function, self.include_modules, self.exclude_modules)
+        return loader, None, []
+
+    def _wait(self):
+        # With checkpoints, failures are raised once the successful results are saved
+        done, not_done = self._executor.wait(fs=self._futures,
+                                             throw_except=self._checkpoint is None)
+        # The executor service returns updated copies of the futures
+        if isinstance(self._futures, list):
+            self._futures = done + not_done
+
+    def _finish(self, hook, context):
+        with self._metrics.phase('results'):
+            result = self._collect_result(hook, context)
+        if self._watermark is not None:
+            # Only reached when every call succeeded
+            self._watermark.commit()
+            self.log.info("Watermark advanced past {} objects".format(
+                self._watermark.selected + self._watermark.skipped))
+        if self._checkpoint is not None and not self.async_invoke:
+            # Only reached when every call succeeded, no later try resumes from them
+            self.log.info("Deleted {} checkpointed results".format(self._checkpoint.clear()))
+        self._metrics.runtime_memory = self._map_runtime_memory()
+        summary = self._metrics.emit(context)
+        self.log.info("Phases: {}".format(summary['phases']))
+        if self._prewarmed is not None:
+            self.log.info("{} of {} calls started warm, {} containers were pre-warmed".format(
+                summary['warm_starts'], summary['calls'], self._prewarmed))
+            context['task_instance'].xcom_push(key='prewarm',
+                                               value={'containers': self._prewarmed,
+                                                      'calls': summary['calls'],
+                                                      'warm_hits': summary['warm_starts']})
+        return result
+
+    def _prewarm(self, context, prewarm, runtime_memory):
+        """
+        Warms up containers before the real calls are submitted.
+
+        :param prewarm: Number of containers to warm up, or the task_id of a
+                        LithopsWarmupOperator that already did.
+        """
+        if isinstance(prewarm, str):
+            summary = context['task_instance'].xcom_pull(task_ids=prewarm) or {}
+            self._prewarmed = summary.get('containers', 0)
+            return
+        futures = self._executor.map(map_function=make_warmup_function(),
+                                     map_iterdata=list(range(prewarm)),
+                                     runtime_memory=runtime_memory,
+                                     include_modules=None)
+        summary = summarize_warmup(self._executor.get_result(fs=futures))
+        self._prewarmed = summary['containers']
+        self.log.info("Pre-warmed {} containers".format(self._prewarmed))
+
+    def _map_runtime_memory(self):
+        return self._executor_params.get('runtime_memory')
+
+    def _defer(self, hook, lease):
+        from lithops_airflow_plugin.triggers.lithops_trigger import LithopsJobTrigger
+
+        futures = self._futures if isinstance(self._futures, list) else [self._futures]
+        jobs = {}
+        for f in futures:
+            jobs.setdefault((f.executor_id, f.job_id), []).append(f.call_id)
+        calls = [[executor_id, job_id, call_ids] for (executor_id, job_id), call_ids in jobs.items()]
+
+        # Futures are too large for the trigger row, park them in storage
+        storage = hook.get_storage()
+        futures_key = 'lithops.airflow/deferred/{}.pickle'.format(uuid.uuid4().hex)
+        storage.put_object(storage.bucket, futures_key, pickle.dumps(self._futures))
+
+        self.log.info("Deferring until {} calls are done".format(len(futures)))
+        self.defer(trigger=LithopsJobTrigger(conn_id=hook.conn_id,
+                                             executor_params=self._executor_params,
+                                             calls=calls,
+                                             futures_key=futures_key,
+                                             poll_interval=self.poll_interval,
+                                             lease_key=lease.key if lease is not None else None),
+                   method_name='execute_complete')
 
-        if self.get_result and not self.async_invoke:
-            self._function_result = self._executor.get_result(fs=self._futures)
+    def _collect_result(self, hook, context):
+        if self.get_result and not self.async_invoke and self.stream_results:
+            self._function_result = self._stream_result(hook, context)
+            self.log.info("Streamed {} results to {}".format(
+                self._function_result['count'], self._function_result['prefix']))
+        elif self.get_result and not self.async_invoke and self._checkpoint is not None:
+            futures = self._executor.wait(fs=self._futures, throw_except=False)[0] if self._futures else []
+            call_index = {future_key(f): i for i, f in enumerate(self._futures)}
+            pairs, failed = self._download_pairs(futures, call_index)
+            self._raise_failed(failed)
+            self._finish_results(context)
+            self._function_result = self._merge_prefilled([value for _, value in sorted(pairs)])
+        elif self.get_result and not self.async_invoke:
+            results = self._get_results(self._futures) if self._futures else []
+            self._metrics.add_calls(self._futures if isinstance(self._futures, list) else [self._futures])
+            # Only map results are batched, cached and checkpointed per call
+            if self._per_call(self._futures):
+                results = unpack_results(results)
+                self._record_results(list(enumerate(results)))
+            self._finish_results(context)
+            self._function_result = self._merge_prefilled(results)
             self.log.debug("Returned value was: {}".format(
                 self._function_result))
         else:
@@ -100,6 +422,210 @@ class LithopsOperator(BaseOperator):
 
         return self._function_result if self.get_result else self._futures
 
+    def _download_pairs(self, futures, call_index):
+        """
+        Downloads the results of done futures as (submitted_index, value)
+        pairs and records them. With checkpoints, failed calls are skipped
+        and counted instead of raised, so the rest can still be saved.
+        """
+        self._metrics.add_calls(futures)
+        failed = 0
+        if self._checkpoint is not None:
+            failed = sum(1 for f in futures if f.error)
+            futures = [f for f in futures if not f.error]
+        if not futures:
+            results = []
+        elif self._per_call(futures):
+            results = self._get_results(futures)
+        else:
+            # One result per reducer
+            results = self._decode_results(self._read_results(futures))
+        pairs = [pair for f, result in zip(futures, results)
+                 for pair in iter_batch_result(call_index[future_key(f)], result)]
+        self._record_results(pairs)
+        return pairs, failed
+
+    def _raise_failed(self, failed):
+        if failed:
+            raise AirflowException('{} calls failed, the successful ones are checkpointed '
+                                   'and will not be invoked again on retry'.format(failed))
+
+    def _record_results(self, pairs):
+        """
+        Receives (submitted_index, result) pairs as results are downloaded.
+        """
+        if self._cache is not None:
+            self._cache.store([(self._cache_keys[index], value) for index, value in pairs])
+        if self._checkpoint is not None:
+            self._checkpoint.save([(self._original_index(index), value) for index, value in pairs])
+
+    def _get_results(self, futures):
+        """
+        Downloads the results of futures, decoding those encoded with result_codec.
+        """
+        if self._per_call(futures):
+            return self._decode_results(self._executor.get_result(fs=futures))
+        # A single value, or a list with a reducer per object
+        results = self._decode_results(self._read_results(futures))
+        return results[0] if len(results) == 1 else results
+
+    def _decode_results(self, results):
+        """
+        Decodes results encoded with result_codec by the map calls, and
+        unwraps those of reducers that decoded them, keeping their stats.
+        """
+        if self.result_codec is None:
+            return results
+        if self._codec_stats is None:
+            self._codec_stats = CodecStats(self.result_codec)
+        return [self._codec_stats.decode(result) for result in results]
+
+    def _read_results(self, futures):
+        """
+        Downloads the results of the futures that produce output, in their
+        order and as a list even for one future. FunctionExecutor.get_result
+        unwraps a lone result unless the last job of the executor was a map,
+        which depends on whatever else was submitted to it.
+        """
+        fs = [f for f in (futures if isinstance(futures, list) else [futures]) if f._produce_output]
+        done, _ = self._executor.wait(fs=fs, download_results=True)
+        done = {future_key(f): f for f in done}
+        return [done[future_key(f)].result() for f in fs]
+
+    def _per_call(self, futures):
+        """
+        True when futures give one result per call, as from a map, and not
+        the single result of call_async, a map_reduce or a final reduce.
+        """
+        return isinstance(futures, list) and not self.single_result
+
+    def _finish_results(self, context):
+        if self._cache is not None:
+            self._cache.close()
+            stats = self._cache.stats()
+            self.log.info("Result cache: {} hits, {} misses".format(stats['hits'], stats['misses']))
+            context['task_instance'].xcom_push(key='result_cache', value=stats)
+        if self._codec_stats is not None and self._codec_stats.sizes:
+            summary = self._codec_stats.summary()
+            self.log.info("Result codec {}: {} bytes, {:.3f}s encoding, {:.3f}s decoding".format(
+                summary['codec'], summary['encoded_bytes'], summary['encode_time'], summary['decode_time']))
+            context['task_instance'].xcom_push(key='result_codec', value=summary)
+
+    def _original_index(self, index):
+        return index if self._index_map is None else self._index_map[index]
+
+    def _skip_known(self, items, known):
+        """
+        Leaves out of the submission the items whose results are already
+        known, given as {position in items: value}, and returns the rest.
+        Can be applied several times, positions are mapped back to item order.
+        """
+        index_map = self._index_map if self._index_map is not None else list(range(len(items)))
+        self._prefilled = dict(self._prefilled or {})
+        for position, value in known.items():
+            self._prefilled[index_map[position]] = value
+        remaining = [position for position in range(len(items)) if position not in known]
+        self._index_map = [index_map[position] for position in remaining]
+        return [items[position] for position in remaining]
+
+    def _merge_prefilled(self, results):
+        """
+        Puts the results of the submitted calls and the prefilled results
+        back together in item order.
+        """
+        if self._index_map is None:
+            return results
+        merged = [None] * (len(results) + len(self._prefilled))
+        for index, value in self._prefilled.items():
+            merged[index] = value
+        for index, value in enumerate(results):
+            merged[self._index_map[index]] = value
+        return merged
+
+    @contextmanager
+    def _deferred_cleaning(self, futures):
+        """
+        Keeps the temporary data of the jobs in storage while their results
+        are downloaded as calls complete, and cleans the jobs of futures,
+        which may grow meanwhile, at the end. FunctionExecutor.wait cleans
+        every job with a done call, along with the output of the calls of
+        that job not downloaded yet.
+        """
+        data_cleaner = self._executor.data_cleaner
+        self._executor.data_cleaner = False
+        try:
+            yield
+        finally:
+            self._executor.data_cleaner = data_cleaner
+            if data_cleaner and futures:
+                self._executor.clean(fs=futures, clean_cloudobjects=False)
+
+    def _stream_result(self, hook, context):
+        """
+        Moves results to storage as calls complete, holding at most one batch
+        of results in memory, and returns the manifest of what was written.
+        """
+        prefix = self.result_prefix or 'lithops.airflow/results/{}/{}/{}'.format(
+            self.dag_id, self.task_id, context['run_id'])
+        sink = StorageResultSink(hook.get_storage(), prefix, self.result_batch_size)
+
+        futures = self._futures if isinstance(self._futures, list) else [self._futures]
+        # map_reduce map calls feed the reducer and have no output of their own
+        pending = [f for f in futures if getattr(f, '_produce_output', True)]
+        call_index = {future_key(f): i for i, f in enumerate(pending)}
+        self._futures = None
+        failed = 0
+
+        with self._deferred_cleaning(futures):
+            while pending:
+                done, pending = self._executor.wait(fs=pending, return_when=ANY_COMPLETED,
+                                                    download_results=False,
+                                                    throw_except=self._checkpoint is None)
+                for i in range(0, len(done), self.result_batch_size):
+                    chunk = done[i:i + self.result_batch_size]
+                    pairs, chunk_failed = self._download_pairs(chunk, call_index)
+                    failed += chunk_failed
+                    for index, value in pairs:
+                        sink.add(self._original_index(index), value)
+                    # Futures keep the downloaded value, drop it once it is in the sink
+                    for f in chunk:
+                        f._return_val = None
+
+        self._raise_failed(failed)
+        for index, value in (self._prefilled or {}).items():
+            sink.add(index, value)
+        self._finish_results(context)
+        return sink.manifest()
+
+    def _delete_intermediate(self, storage, prefix):
+        keys = storage.list_keys(storage.bucket, prefix + '/')
+        for i in range(0, len(keys), 1000):
+            storage.delete_objects(storage.bucket, keys[i:i + 1000])
+        self.log.info("Deleted {} intermediate objects".format(len(keys)))
+
+    def _iterdata_from_context(self, context):
+        """
+        Returns the iterdata of a map operator, pulling it from the upstream
+        task when iterdata_from_task is set. Upstream values are streamed
+        rather than copied into new lists.
+        """
+        if self.iterdata_from_task is None:
+            return resolve_iterdata(self.map_iterdata)
+
+        if isinstance(self.iterdata_from_task, dict):
+            kwarg, task_id = list(self.iterdata_from_task.items()).pop()
+            values = context['task_instance'].xcom_pull(task_ids=task_id)
+            return wrap_kwarg(kwarg, iter_upstream(values, self._hook.get_storage))
+
+        values = single_call(context['task_instance'].xcom_pull(task_ids=self.iterdata_from_task))
+        if is_storage_iterdata(values):
+            return values
+        return iter_upstream(values, self._hook.get_storage)
+
+    def _invoker_key(self):
+        return '{}-{}'.format(self._executor_params.get('backend') or 'default',
+                              config_key(self._hook.lithops_config)[:12])
+
     def execute_callable(self, context):
         raise NotImplementedError()
 
@@ -137,7 +663,7 @@ class LithopsCallAsyncOperator(LithopsOperator):
         self.include_modules = include_modules
         self.exclude_modules = exclude_modules
 
-        super().__init__(**kwargs)
+        super().__init__(runtime_memory=runtime_memory, **kwargs)
 
     def execute_callable(self, context):
         """
@@ -152,16 +678,102 @@ class LithopsCallAsyncOperator(LithopsOperator):
                 self.data[kwarg] = data
 
         self.log.debug("Params: {}".format(self.data))
-        return self._executor.call_async(func=self.func,
+        func, include_modules, exclude_modules = self._bundle(self.func)
+        return self._executor.call_async(func=func,
                                          data=self.data,
                                          extra_env=self.extra_env,
                                          runtime_memory=self.runtime_memory,
                                          timeout=self.timeout,
-                                         include_modules=self.include_modules,
-                                         exclude_modules=self.exclude_modules)
+                                         include_modules=include_modules,
+                                         exclude_modules=exclude_modules)
+
 
+class _MapPartitioningMixin:
+    """
+    Listing and splitting of storage iterdata by the plugin itself, shared
+    by the operators that run a map.
+    """
+
+    def plan_partitions(self, context=None, iterdata=None):
+        """
+        Returns the PartitionPlan of the storage iterdata of a map operator,
+        as it would be submitted with chunk_size='auto', listing_index or
+        incremental, so it can be inspected before running the task. Without
+        context only map_iterdata can be planned.
+        """
+        if self._hook is None:
+            self._hook = LithopsHook()
+            self._hook.resolve(self._executor_params)
+        if iterdata is None:
+            iterdata = self._iterdata_from_context(context) if context else resolve_iterdata(self.map_iterdata)
+        storage = self._hook.get_storage()
+        if self.incremental is not None:
+            self._watermark = Watermark(storage, self.dag_id, self.task_id, self.incremental)
+        dag_run = (context or {}).get('dag_run')
+        conf = (dag_run.conf if dag_run is not None else None) or {}
+        return plan_partitions(storage, iterdata, self.map_function,
+                               runtime_memory=self._map_runtime_memory(),
+                               chunk_size=self.chunk_size,
+                               chunk_n=self.chunk_n,
+                               target_duration=self.target_call_duration,
+                               delimiter=self.record_delimiter,
+                               listing_index=self.listing_index,
+                               listing_refresh_interval=self.listing_refresh_interval,
+                               watermark=self._watermark,
+                               full=self.force_full or bool(conf.get(FORCE_FULL_CONF)))
+
+    def _partition(self, context, iterdata):
+        """
+        Plans the partitions of storage iterdata that the plugin splits
+        itself and returns the map function, iterdata and extra_args that
+        read them.
+        """
+        plan = self._partition_plan = self.plan_partitions(context, iterdata)
+        summary = plan.summary()
+        self.log.info("Partitioned {} bytes of {} objects in {} calls of up to {} bytes".format(
+            summary['total_bytes'], summary['objects'], summary['calls'], summary['largest_partition']))
+        if plan.throughput is not None:
+            self.log.info("Chunk size {} from a {} throughput of {} bytes/s".format(
+                summary['chunk_size'], summary['throughput_source'], summary['throughput']))
+        if plan.listing is not None:
+            self.log.info("Listing index: {}".format(plan.listing))
+        if plan.incremental is not None:
+            self.log.info("{} new or changed objects, {} already processed{}".format(
+                plan.incremental['selected'], plan.incremental['skipped'],
+                ' (full reprocess)' if plan.incremental['full'] else ''))
+        context['task_instance'].xcom_push(key='partition_plan', value=summary)
+        return (make_partition_function(self.map_function, self.extra_args, plan.delimiter),
+                plan.iterdata(), None)
+
+    def _splits_objects(self):
+        """
+        True when the plugin lists and splits the storage iterdata itself.
+        """
+        return self.chunk_size == 'auto' or self.listing_index or self.incremental is not None
+
+    def _chunking(self):
+        """
+        Returns the chunk_size and chunk_n to pass to Lithops, which has
+        nothing to split when the plugin partitioned the objects.
+        """
+        if self._partition_plan is not None:
+            return None, None
+        return self.chunk_size, self.chunk_n
+
+    def _record_throughput(self, exec_times):
+        """
+        Records the bytes per second of execution that the map calls of a
+        partitioned run processed, for the chunk size of the next runs.
+        """
+        exec_time = sum(exec_times)
+        if self._partition_plan is None or exec_time <= 0:
+            return
+        throughput = record_throughput(throughput_key(self.map_function, self._map_runtime_memory()),
+                                       self._partition_plan.total_bytes / exec_time)
+        self.log.info("Recorded a throughput of {:.0f} bytes/s".format(throughput))
 
-class LithopsMapOperator(LithopsOperator):
+
+class LithopsMapOperator(_MapPartitioningMixin, LithopsOperator):
     def __init__(self,
                  map_function,
                  map_iterdata=None,
@@ -175,24 +787,90 @@ class LithopsMapOperator(LithopsOperator):
                  invoke_pool_threads=500,
                  include_modules=[],
                  exclude_modules=[],
+                 iterdata_batch_size=None,
+                 map_batch_size=None,
+                 result_cache=False,
+                 cache_ttl=None,
+                 cache_max_bytes=None,
+                 cache_version=None,
+                 resume_on_retry=False,
+                 speculative=False,
+                 speculation_quantile=0.9,
+                 speculation_percentile=90,
+                 speculation_multiplier=1.5,
+                 max_speculative_fraction=0.05,
+                 prewarm=None,
+                 result_codec=None,
+                 target_call_duration=TARGET_CALL_DURATION,
+                 record_delimiter=b'\n',
+                 listing_index=False,
+                 listing_refresh_interval=LISTING_REFRESH_INTERVAL,
+                 incremental=None,
+                 force_full=False,
+                 memory_objective='gb_seconds',
+                 memory_safety_margin=SAFETY_MARGIN,
+                 max_runtime_memory=None,
                  **kwargs):
         """
         Executes a parallel map function.
 
         :param map_function: the function to map over the data
-        :param map_iterdata: An iterable of input data
+        :param map_iterdata: An iterable of input data, or a callable returning one
         :param extra_args: Additional arguments to pass to the function activation. Default None.
         :param extra_env: Additional environment variables for action environment. Default None.
-        :param runtime_memory: Memory to use to run the function. Default None (loaded from config).
+        :param runtime_memory: Memory to use to run the function, or 'auto' to pick it from the peak
+                               memory and durations of previous runs of the task, and retry the calls
+                               that run out of memory with more. Default None (loaded from config).
         :param chunk_size: the size of the data chunks to split each object. 'None' for processing
-                           the whole file in one function activation.
+                           the whole file in one function activation, or 'auto' to size the chunks
+                           from the throughput of previous runs and align them to records.
         :param chunk_n: Number of chunks to split each object. 'None' for processing the whole
                         file in one function activation.
         :param remote_invocation: Enable or disable remote_invocation mechanism. Default 'False'
         :param timeout: Time that the functions have to complete their execution before raising a timeout.
-        :param invoke_pool_threads: Number of threads to use to invoke.
+        :param invoke_pool_threads: Number of threads to use to invoke, or 'auto' to adapt them to the
+                                    invocation latency and throttling of the backend.
         :param include_modules: Explicitly pickle these dependencies.
         :param exclude_modules: Explicitly keep these modules from pickled dependencies.
+        :param iterdata_batch_size: Submit the iterdata in batches of this many calls, so that it
+                                    is never fully held in memory. Default None (one submission).
+        :param map_batch_size: Run this many iterdata items in a loop inside each invocation, or 'auto'
+                               to size batches from a probe call. Results are still one per item.
+                               Default None (one item per invocation).
+        :param result_cache: Reuse the stored result of any item already computed by the same function
+                             code with the same extra_args, and only invoke the misses.
+        :param cache_ttl: Seconds a cached result stays valid. Default None (forever).
+        :param cache_max_bytes: Size of the function's cache above which the least recently used
+                                results are evicted. Default None (unbounded).
+        :param cache_version: Salt of the function hash. Change it to drop the cached results when
+                              code the function uses outside its module changes. Default None.
+        :param resume_on_retry: Save each successful call's result, so that retries and manual clears
+                                of the same run only invoke the missing or failed calls.
+        :param speculative: Duplicate straggler calls and keep whichever attempt finishes first.
+        :param speculation_quantile: Fraction of calls that must be done before duplicating stragglers.
+        :param speculation_percentile: Percentile of the finished call durations used as reference.
+        :param speculation_multiplier: Calls running longer than this many times the reference are stragglers.
+        :param max_speculative_fraction: Maximum duplicates, as a fraction of the calls (at least one).
+        :param prewarm: Number of containers to warm up with no-op calls before the map, or the task_id
+                        of an upstream LithopsWarmupOperator. The warm starts of the map are pushed as
+                        the 'prewarm' XCom. Default None (no pre-warming).
+        :param result_codec: Encode the results in the workers with one of 'pickle', 'pickle5', 'zstd'
+                             or 'lz4'. Default None (returned as is).
+        :param target_call_duration: Seconds each call should take with chunk_size='auto'. Default 60.
+        :param record_delimiter: Delimiter the chunks are aligned to when the plugin partitions the
+                                 objects, None for raw byte ranges. Default newline.
+        :param listing_index: Resolve prefix iterdata from a persistent index of the prefix, refreshed
+                              incrementally, instead of listing it in full.
+        :param listing_refresh_interval: Seconds after which the index is refreshed with a full listing.
+                                         Default 1 day.
+        :param incremental: Only process the objects added or changed since the last successful run,
+                            tracked by 'last_modified' time or by 'etag'. Default None (all objects).
+        :param force_full: Process all the objects in incremental mode, as does a dag_run conf with
+                           'lithops_force_full' set. The watermark is still advanced.
+        :param memory_objective: What runtime_memory='auto' minimizes, 'gb_seconds' or 'wall_time'.
+                                 Also used for the size recommended in the 'runtime_memory' XCom.
+        :param memory_safety_margin: Fraction over the highest peak memory seen that the size must leave.
+        :param max_runtime_memory: Largest size runtime_memory='auto' and its retries can use, in MB.
         """
         super().__init__(**kwargs)
 
@@ -200,6 +878,36 @@ class LithopsMapOperator(LithopsOperator):
             raise AirflowException(
                 'At least map_iterdata or iterdata_from_task must be set')
 
+        if memory_objective not in MEMORY_OBJECTIVES:
+            raise AirflowException('memory_objective must be one of {}'.format(', '.join(MEMORY_OBJECTIVES)))
+        if runtime_memory == 'auto' and (self.deferrable or self.async_invoke):
+            raise AirflowException("runtime_memory='auto' can not be used with deferrable or async_invoke")
+
+        if chunk_size == 'auto' or listing_index or incremental is not None:
+            if 'obj' not in inspect.signature(map_function).parameters:
+                raise AirflowException("chunk_size='auto', listing_index and incremental need a map "
+                                       "function that takes 'obj'")
+            if record_delimiter is not None and is_self_overlapping(record_delimiter):
+                raise AirflowException('record_delimiter {!r} can overlap itself, such as b\'||\' in '
+                                       'b\'|||\', so records can not be aligned to it'.format(record_delimiter))
+            if (chunk_size == 'auto' and chunk_n is not None) or map_batch_size is not None \
+                    or result_cache or resume_on_retry:
+                raise AirflowException("chunk_size='auto', listing_index and incremental can not be used "
+                                       "with map_batch_size, result_cache or resume_on_retry")
+
+        if incremental is not None:
+            if incremental not in WATERMARK_MODES:
+                raise AirflowException('incremental must be one of {}'.format(', '.join(WATERMARK_MODES)))
+            if self.deferrable or self.async_invoke:
+                raise AirflowException('incremental can not be used with deferrable or async_invoke')
+
+        if (result_cache or resume_on_retry or speculative) and self.deferrable:
+            raise AirflowException('result_cache, resume_on_retry and speculative '
+                                   'can not be used with deferrable')
+        if (speculative or runtime_memory == 'auto') and self.stream_results:
+            # Streamed results are written as calls finish, before any retry or duplicate could win
+            raise AirflowException("speculative and runtime_memory='auto' can not be used with stream_results")
+
         self.map_function = map_function
         self.map_iterdata = map_iterdata
         self.iterdata_from_task = iterdata_from_task
@@ -212,37 +920,415 @@ class LithopsMapOperator(LithopsOperator):
         self.invoke_pool_threads = invoke_pool_threads
         self.include_modules = include_modules
         self.exclude_modules = exclude_modules
+        self.iterdata_batch_size = iterdata_batch_size
+        self.map_batch_size = map_batch_size
+        self.result_cache = result_cache
+        self.cache_ttl = cache_ttl
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_version = cache_version
+        self.resume_on_retry = resume_on_retry
+        self.speculative = speculative
+        self.speculation_quantile = speculation_quantile
+        self.speculation_percentile = speculation_percentile
+        self.speculation_multiplier = speculation_multiplier
+        self.max_speculative_fraction = max_speculative_fraction
+        self.prewarm = prewarm
+        self.result_codec = result_codec
+        self.target_call_duration = target_call_duration
+        self.record_delimiter = record_delimiter
+        self.listing_index = listing_index
+        self.listing_refresh_interval = listing_refresh_interval
+        self.incremental = incremental
+        self.force_full = force_full
+        self.memory_objective = memory_objective
+        self.memory_safety_margin = memory_safety_margin
+        self.max_runtime_memory = max_runtime_memory
+
+        if result_codec is not None and result_codec not in CODECS:
+            raise AirflowException('result_codec must be one of {}'.format(', '.join(CODECS)))
+
+        # Input and submission time of each submitted call, kept to relaunch stragglers
+        self._call_inputs = None
+        self._submit_times = None
+        self._call_function = None
+        # Input of each submitted call by future, kept to retry calls that ran out of memory
+        self._call_items = {}
+        self._memory = None
+        self._memory_reason = None
+        self._memory_errors = 0
+        self._fallback_sizes = []
 
     def execute_callable(self, context):
         """
         Overrides 'execute_callable' from LithopsOperator.
         Wrap of Lithops map function.
         """
-        if self.iterdata_from_task is not None:
-            if isinstance(self.iterdata_from_task, dict):
-                kwarg, task_id = list(self.iterdata_from_task.items()).pop()
-                values = context['task_instance'].xcom_pull(task_ids=task_id)
-                self.map_iterdata = [{kwarg: value} for value in values]
-            else:
-                self.map_iterdata = context['task_instance'].xcom_pull(
-                    task_ids=self.iterdata_from_task)
+        iterdata = self._iterdata_from_context(context)
+        map_function, extra_args = self.map_function, self.extra_args
+        futures = []
 
-        self.log.debug("Params: {}".format(self.map_iterdata))
+        if self._splits_objects():
+            map_function, iterdata, extra_args = self._partition(context, iterdata)
+            if not iterdata:
+                return []
+        elif is_storage_iterdata(iterdata):
+            if self.prewarm:
+                self._prewarm(context, self.prewarm, self._map_runtime_memory())
+            return self._map(map_function, iterdata, extra_args)
 
-        return self._executor.map(map_function=self.map_function,
-                                  map_iterdata=self.map_iterdata,
-                                  extra_args=self.extra_args,
-                                  extra_env=self.extra_env,
-                                  runtime_memory=self.runtime_memory,
-                                  chunk_size=self.chunk_size,
-                                  chunk_n=self.chunk_n,
-                                  timeout=self.timeout,
-                                  invoke_pool_threads=self.invoke_pool_threads,
-                                  include_modules=self.include_modules,
-                                  exclude_modules=self.exclude_modules)
+        if self.resume_on_retry:
+            iterdata = self._resume_checkpoint(context, iterdata)
+
+        if self.result_cache:
+            iterdata = self._lookup_cache(iterdata)
+
+        if (self.resume_on_retry or self.result_cache) and not iterdata:
+            return []
+
+        if self.prewarm:
+            self._prewarm(context, self.prewarm, self._map_runtime_memory())
+
+        if self.map_batch_size is not None:
+            map_function, extra_args = make_batch_function(self.map_function, self.extra_args), None
+            iterdata, futures = self._pack_iterdata(iterdata, map_function)
 
+        if self.invoke_pool_threads == 'auto':
+            futures.extend(self._map_adaptive(context, map_function, iterdata, extra_args))
+            return futures
+
+        if self.iterdata_batch_size is None:
+            iterdata = iterdata if isinstance(iterdata, list) else list(iterdata)
+            self.log.debug("Params: {}".format(iterdata))
+            if not futures:
+                return self._map(map_function, iterdata, extra_args)
+            submissions = [iterdata] if iterdata else []
+        else:
+            submissions = iter_batches(iterdata, self.iterdata_batch_size)
+
+        for batch in submissions:
+            futures.extend(self._map(map_function, batch, extra_args))
+            self.log.debug("Submitted {} calls".format(len(futures)))
+        return futures
+
+    def _map_runtime_memory(self):
+        if self.runtime_memory == 'auto':
+            if self._memory is None:
+                self._memory, self._memory_reason = self._memory_tuner().choose()
+                self.log.info("Using {} MB of runtime memory ({})".format(self._memory, self._memory_reason))
+            return self._memory
+        return self.runtime_memory or super()._map_runtime_memory()
+
+    def _memory_tuner(self):
+        return MemoryTuner(load_runs(task_key(self.dag_id, self.task_id)),
+                           objective=self.memory_objective,
+                           safety_margin=self.memory_safety_margin,
+                           max_memory=self.max_runtime_memory)
+
+    def _finish(self, hook, context):
+        result = super()._finish(hook, context)
+        self._record_throughput(self._metrics.calls.exec_times)
+        self._record_memory(context)
+        return result
+
+    def _record_memory(self, context):
+        """
+        Adds the run to the memory history of the task and pushes the size
+        recommended for the next runs as the 'runtime_memory' XCom.
+        """
+        memory = self._map_runtime_memory()
+        calls = self._metrics.calls
+        if memory is None or not calls.calls:
+            return
+        exec_times = sorted(calls.exec_times)
+        if self._fallback_sizes:
+            # Calls ran at several sizes, only their peak memory is comparable
+            record_run(task_key(self.dag_id, self.task_id), self._fallback_sizes[-1],
+                       calls=calls.calls, peak_memory=calls.peak_memory)
+        else:
+            record_run(task_key(self.dag_id, self.task_id), memory, calls=calls.calls,
+                       peak_memory=calls.peak_memory,
+                       exec_time_mean=sum(exec_times) / len(exec_times) if exec_times else None,
+                       exec_time_p95=percentile(exec_times, 95))
+
+        recommended, reason = self._memory_tuner().choose()
+        if recommended != memory:
+            self.log.info("Recommended runtime memory for the next runs: {} MB ({})".format(recommended, reason))
+        context['task_instance'].xcom_push(key='runtime_memory',
+                                           value={'objective': self.memory_objective,
+                                                  'used': memory,
+                                                  'peak_memory': calls.peak_memory,
+                                                  'recommended': recommended,
+                                                  'reason': reason,
+                                                  'memory_errors': self._memory_errors,
+                                                  'fallback_sizes': self._fallback_sizes})
+
+    def _lookup_cache(self, iterdata):
+        """
+        Fills in the cached results and returns the items still to invoke.
+        """
+        items = iterdata if isinstance(iterdata, list) else list(iterdata)
+        self._cache = ResultCache(self._hook.get_storage(), self.map_function, self.extra_args,
+                                  ttl=self.cache_ttl, max_bytes=self.cache_max_bytes,
+                                  version=self.cache_version)
+        hits, misses = self._cache.lookup(items)
+        self._cache_keys = [key for _, key in misses]
+        self.log.info("Result cache: {} of {} items cached".format(len(hits), len(items)))
+        return self._skip_known(items, hits)
+
+    def _resume_checkpoint(self, context, iterdata):
+        """
+        Fills in the results saved by previous tries of this task run and
+        returns the items still to invoke.
+        """
+        items = iterdata if isinstance(iterdata, list) else list(iterdata)
+        self._checkpoint = CallCheckpoint(self._hook.get_storage(), self.dag_id, self.task_id,
+                                          context['run_id'], items)
+        completed = self._checkpoint.completed()
+        if completed:
+            self.log.info("Resuming: {} of {} calls already succeeded".format(len(completed), len(items)))
+        return self._skip_known(items, completed)
+
+    def _pack_iterdata(self, iterdata, batch_function):
+        """
+        Groups the iterdata into batched calls. With map_batch_size='auto' the
+        first items run as a probe call whose timings size the other batches.
+        Returns the remaining calls and the futures already submitted.
+        """
+        if self.map_batch_size != 'auto':
+            return pack_batches(iterdata, self.map_batch_size), []
+
+        total_items = len(iterdata) if isinstance(iterdata, list) else None
+        items = iter(iterdata)
+        probe = list(islice(items, PROBE_ITEMS))
+        if not probe:
+            return [], []
+
+        start = time.time()
+        probe_fs = self._map(batch_function, [{'batch': probe, 'offset': 0}], None)
+        done, _ = self._executor.wait(fs=probe_fs)
+        wall_time = time.time() - start
+        probe_result = self._get_results(done)[0]
+
+        item_time = probe_result['elapsed'] / len(probe)
+        stats = getattr(done[0], 'stats', None) or {}
+        if 'worker_end_tstamp' in stats and 'host_submit_tstamp' in stats:
+            overhead = stats['worker_end_tstamp'] - stats['host_submit_tstamp'] - probe_result['elapsed']
+        else:
+            overhead = wall_time - probe_result['elapsed']
+
+        batch_size = choose_batch_size(overhead, item_time, total_items=total_items,
+                                       min_calls=self._executor_params.get('workers'))
+        self.log.info("Batching {} items per call (call overhead {:.3f}s, {:.4f}s per item)".format(
+            batch_size, overhead, item_time))
+        return pack_batches(items, batch_size, offset=len(probe)), list(done)
+
+    def _map_adaptive(self, context, map_function, iterdata, extra_args):
+        """
+        Submits the calls in waves, adapting the invocation threads of each
+        wave with AIMD, and records the concurrency it settled on. Every
+        round of a wave is its own job, so that when the backend throttles
+        one only the calls of that job and the rounds after it are retried.
+        """
+        key = self._invoker_key()
+        controller = AIMDController(initial=load_settled(key) or AIMDController().concurrency)
+        items = iter(iterdata)
+        futures = []
+        wave = list(islice(items, controller.wave_size()))
+        while wave:
+            threads = controller.concurrency
+            start = time.time()
+            fs, submitted = [], 0
+            try:
+                while submitted < len(wave):
+                    calls = wave[submitted:submitted + threads]
+                    fs.extend(self._map(map_function, calls, extra_args, invoke_pool_threads=threads))
+                    submitted += len(calls)
+            except Exception as e:
+                if not is_throttle_error(e) or threads == controller.minimum:
+                    raise
+                # A job that raised returned no futures, its calls were not invoked
+                futures.extend(fs)
+                wave = wave[submitted:]
+                controller.on_throttle()
+                self.log.warning("Invocation throttled after {} calls, retrying {} with {} threads".format(
+                    submitted, len(wave), controller.concurrency))
+                continue
+            elapsed = time.time() - start
+            # Fetch the status of the calls that already ended, without waiting for the rest
+            self._executor.wait(fs=fs, return_when=ALWAYS, throw_except=False)
+            controller.on_wave(len(wave), elapsed, throttled=count_throttled(fs))
+            futures.extend(fs)
+            wave = list(islice(items, controller.wave_size()))
+
+        save_settled(key, controller.concurrency)
+        self.log.info("Invocation concurrency settled on {} threads".format(controller.concurrency))
+        context['task_instance'].xcom_push(key='invoke_concurrency',
+                                           value={'settled': controller.concurrency,
+                                                  'waves': controller.history})
+        return futures
+
+    def _map(self, map_function, iterdata, extra_args, invoke_pool_threads=None):
+        if invoke_pool_threads is None:
+            invoke_pool_threads = self.invoke_pool_threads
+            if invoke_pool_threads == 'auto':
+                invoke_pool_threads = load_settled(self._invoker_key()) or MAX_CONCURRENCY
+        submit_time = time.time()
+        if self.result_codec is not None:
+            map_function = make_encoding_function(map_function, self.result_codec)
+        function, include_modules, exclude_modules = self._bundle(map_function)
+        chunk_size, chunk_n = self._chunking()
+        futures = self._executor.map(map_function=function,
+                                     map_iterdata=iterdata,
+                                     extra_args=extra_args,
+                                     extra_env=self.extra_env,
+                                     runtime_memory=self._map_runtime_memory(),
+                                     chunk_size=chunk_size,
+                                     chunk_n=chunk_n,
+                                     timeout=self.timeout,
+                                     invoke_pool_threads=invoke_pool_threads,
+                                     include_modules=include_modules,
+                                     exclude_modules=exclude_modules)
+
+        if (self.speculative or self.runtime_memory == 'auto') and not is_storage_iterdata(iterdata):
+            self._call_function = (function, extra_args, include_modules, exclude_modules)
+            self._call_items.update((future_key(f), item) for f, item in zip(futures, iterdata))
+        if self.speculative and not is_storage_iterdata(iterdata):
+            if self._call_inputs is None:
+                self._call_inputs, self._submit_times = [], []
+            self._call_inputs.extend(iterdata)
+            self._submit_times.extend([submit_time] * len(iterdata))
+        return futures
+
+    def _wait(self):
+        """
+        Overrides '_wait' from LithopsOperator to duplicate straggler calls
+        when speculative is set, and to retry the calls that ran out of
+        memory with more when runtime_memory is 'auto'.
+        """
+        if not self._call_items or self.stream_results:
+            return super()._wait()
+
+        if self.speculative and self._call_inputs is not None:
+            self._wait_speculative()
+        else:
+            done, not_done = self._executor.wait(fs=self._futures, throw_except=False)
+            self._futures = self._updated(self._futures, done + not_done)
+        if self.runtime_memory == 'auto':
+            self._retry_memory_errors()
+
+        if self._checkpoint is None:
+            failed = [f for f in self._futures if f.error]
+            if failed:
+                # Raise the call's own exception
+                self._executor.get_result(fs=failed[:1])
+
+    @staticmethod
+    def _updated(futures, updates):
+        # The executor service returns updated copies of the futures
+        updated = {future_key(f): f for f in updates}
+        return [updated.get(future_key(f), f) for f in futures]
+
+    def _retry_memory_errors(self):
+        """
+        Resubmits the calls that ran out of memory with the next larger
+        size, until they succeed or there is no larger size. Each size that
+        ran out of memory is recorded right away, so that the next runs
+        start above it even if this one fails.
+        """
+        map_function, extra_args, include_modules, exclude_modules = self._call_function
+        tuner = self._memory_tuner()
+        memory = self._map_runtime_memory()
+        while True:
+            failed = [index for index, f in enumerate(self._futures)
+                      if f.error and future_key(f) in self._call_items and is_memory_error(f)]
+            if not failed:
+                return
+            self._memory_errors += len(failed)
+            record_run(task_key(self.dag_id, self.task_id), memory, calls=len(failed),
+                       memory_errors=len(failed))
+            memory = tuner.next_size(memory)
+            if memory is None:
+                self.log.warning("{} calls ran out of memory at the largest size".format(len(failed)))
+                return
+            self.log.warning("{} calls ran out of memory, retrying them with {} MB".format(len(failed), memory))
+            self._fallback_sizes.append(memory)
+            items = [self._call_items[future_key(self._futures[index])] for index in failed]
+            retries = self._executor.map(map_function=map_function,
+                                         map_iterdata=items,
+                                         extra_args=extra_args,
+                                         extra_env=self.extra_env,
+                                         runtime_memory=memory,
+                                         timeout=self.timeout,
+                                         include_modules=include_modules,
+                                         exclude_modules=exclude_modules)
+            done, not_done = self._executor.wait(fs=retries, throw_except=False)
+            retries = self._updated(retries, done + not_done)
+            for index, item, f in zip(failed, items, retries):
+                self._call_items[future_key(f)] = item
+                self._futures[index] = f
+
+    def _wait_speculative(self):
+        """
+        Waits for the calls duplicating the stragglers. The first attempt of
+        each call to finish is kept, the others are left to end on their own.
+        """
+        map_function, extra_args, include_modules, exclude_modules = self._call_function
+        attempts = {index: [f] for index, f in enumerate(self._futures)}
+        started = {index: [t] for index, t in enumerate(self._submit_times)}
+        policy = StragglerPolicy(len(attempts), quantile=self.speculation_quantile,
+                                 percentile=self.speculation_percentile,
+                                 multiplier=self.speculation_multiplier,
+                                 max_fraction=self.max_speculative_fraction)
+        winners, errors = {}, {}
+
+        while len(winners) < len(attempts):
+            pending = [f for index, fs in attempts.items() if index not in winners for f in fs]
+            index_of = {future_key(f): index for index, fs in attempts.items() for f in fs}
+            done, _ = self._executor.wait(fs=pending, return_when=ALWAYS, throw_except=False)
+            now = time.time()
+
+            for f in done:
+                index = index_of[future_key(f)]
+                if index in winners:
+                    continue
+                if f.error:
+                    # A failed attempt only wins when every attempt has failed
+                    errors.setdefault(index, set()).add(future_key(f))
+                    if len(errors[index]) < len(attempts[index]):
+                        continue
+                winners[index] = f
+                attempt = [future_key(g) for g in attempts[index]].index(future_key(f))
+                policy.record_done(now - started[index][attempt])
+
+            running = {index: now - started[index][0] for index, fs in attempts.items()
+                       if index not in winners and len(fs) == 1}
+            stragglers = policy.stragglers(running)
+            if stragglers:
+                self.log.info("Duplicating {} straggler calls".format(len(stragglers)))
+                duplicates = self._executor.map(map_function=map_function,
+                                                map_iterdata=[self._call_inputs[i] for i in stragglers],
+                                                extra_args=extra_args,
+                                                extra_env=self.extra_env,
+                                                runtime_memory=self._map_runtime_memory(),
+                                                timeout=self.timeout,
+                                                include_modules=include_modules,
+                                                exclude_modules=exclude_modules)
+                for index, f in zip(stragglers, duplicates):
+                    self._call_items[future_key(f)] = self._call_inputs[index]
+                    attempts[index].append(f)
+                    started[index].append(now)
+            elif len(winners) < len(attempts):
+                time.sleep(1)
+
+        if policy.launched:
+            self.log.info("Speculation: {} duplicates launched".format(policy.launched))
+        self._futures = [winners[index] for index in range(len(attempts))]
+
+
+class LithopsMapReduceOperator(_MapPartitioningMixin, LithopsOperator):
+    # The map results go to the reducers, the task gets what they return
+    single_result = True
 
-class LithopsMapReduceOperator(LithopsOperator):
     def __init__(self,
                  map_function,
                  reduce_function,
@@ -260,28 +1346,64 @@ class LithopsMapReduceOperator(LithopsOperator):
                  reducer_wait_local=False,
                  include_modules=[],
                  exclude_modules=[],
+                 prewarm=None,
+                 reduce_fan_in=None,
+                 combine_function=None,
+                 combine_batch_size=None,
+                 result_codec=None,
+                 target_call_duration=TARGET_CALL_DURATION,
+                 record_delimiter=b'\n',
+                 listing_index=False,
+                 listing_refresh_interval=LISTING_REFRESH_INTERVAL,
+                 incremental=None,
+                 force_full=False,
                  **kwargs):
         """
         Map the map_function over the data and apply the reduce_function across all futures.
         This method is executed all within CF.
 
         :param map_function: the function to map over the data
-        :param map_iterdata:  the function to reduce over the futures
+        :param map_iterdata: An iterable of input data, or a callable returning one
         :param reduce_function:  the function to reduce over the futures
         :param extra_env: Additional environment variables for action environment. Default None.
         :param extra_args: Additional arguments to pass to function activation. Default None.
         :param map_runtime_memory: Memory to use to run the map function. Default None (loaded from config).
         :param reduce_runtime_memory: Memory to use to run the reduce function. Default None (loaded from config).
         :param chunk_size: the size of the data chunks to split each object. 'None' for processing
-                           the whole file in one function activation.
+                           the whole file in one function activation, or 'auto' to size the chunks
+                           from the throughput of previous maps and align them to records.
         :param chunk_n: Number of chunks to split each object. 'None' for processing the whole
                         file in one function activation.
         :param timeout: Time that the functions have to complete their execution before raising a timeout.
         :param reducer_one_per_object: Set one reducer per object after running the partitioner
         :param reducer_wait_local: Wait for results locally
-        :param invoke_pool_threads: Number of threads to use to invoke.
+        :param invoke_pool_threads: Number of threads to use to invoke, or 'auto' to use the concurrency
+                                    that adaptive maps on the same backend settled on.
         :param include_modules: Explicitly pickle these dependencies.
         :param exclude_modules: Explicitly keep these modules from pickled dependencies.
+        :param prewarm: Number of containers to warm up with no-op calls before the map, or the task_id
+                        of an upstream LithopsWarmupOperator. Default None (no pre-warming).
+        :param reduce_fan_in: Reduce in a tree of reducer calls that each take this many outputs of the
+                              level below. The reduce_function must be associative. Default None (a
+                              single reducer).
+        :param combine_function: Function applied inside each map call to the list of the call's map
+                                 results, so that only its smaller combined value is uploaded and
+                                 reduced. Default None.
+        :param combine_batch_size: Run this many iterdata items in each map call and combine their
+                                   results together. Default None (one item per call).
+        :param result_codec: Encode the map results in the workers with one of 'pickle', 'pickle5', 'zstd'
+                             or 'lz4'; the reducers decode them. Default None (returned as is).
+        :param target_call_duration: Seconds each map call should take with chunk_size='auto'. Default 60.
+        :param record_delimiter: Delimiter the chunks are aligned to when the plugin partitions the
+                                 objects, None for raw byte ranges. Default newline.
+        :param listing_index: Resolve prefix iterdata from a persistent index of the prefix, refreshed
+                              incrementally, instead of listing it in full.
+        :param listing_refresh_interval: Seconds after which the index is refreshed with a full listing.
+                                         Default 1 day.
+        :param incremental: Only process the objects added or changed since the last successful run,
+                            tracked by 'last_modified' time or by 'etag'. Default None (all objects).
+        :param force_full: Process all the objects in incremental mode, as does a dag_run conf with
+                           'lithops_force_full' set. The watermark is still advanced.
         """
 
         self.map_function = map_function
@@ -305,36 +1427,411 @@ class LithopsMapReduceOperator(LithopsOperator):
         self.invoke_pool_threads = invoke_pool_threads
         self.include_modules = include_modules
         self.exclude_modules = exclude_modules
+        self.prewarm = prewarm
+        self.reduce_fan_in = reduce_fan_in
+        self.combine_function = combine_function
+        self.combine_batch_size = combine_batch_size
+        self.result_codec = result_codec
+        self.target_call_duration = target_call_duration
+        self.record_delimiter = record_delimiter
+        self.listing_index = listing_index
+        self.listing_refresh_interval = listing_refresh_interval
+        self.incremental = incremental
+        self.force_full = force_full
 
         super().__init__(**kwargs)
 
+        if result_codec is not None and result_codec not in CODECS:
+            raise AirflowException('result_codec must be one of {}'.format(', '.join(CODECS)))
+
+        if combine_batch_size is not None and combine_function is None:
+            raise AirflowException('combine_batch_size requires a combine_function')
+
+        if reduce_fan_in is not None:
+            if not isinstance(reduce_fan_in, int) or reduce_fan_in < 2:
+                raise AirflowException('reduce_fan_in must be an integer of at least 2')
+            if reducer_one_per_object:
+                raise AirflowException('reduce_fan_in can not be used with reducer_one_per_object')
+            # The levels are driven from the task, so it can not wait in the triggerer
+            if self.deferrable:
+                raise AirflowException('reduce_fan_in can not be used with deferrable')
+
+        if chunk_size == 'auto' or listing_index or incremental is not None:
+            if 'obj' not in inspect.signature(map_function).parameters:
+                raise AirflowException("chunk_size='auto', listing_index and incremental need a map "
+                                       "function that takes 'obj'")
+            if record_delimiter is not None and is_self_overlapping(record_delimiter):
+                raise AirflowException('record_delimiter {!r} can overlap itself, such as b\'||\' in '
+                                       'b\'|||\', so records can not be aligned to it'.format(record_delimiter))
+            if reducer_one_per_object:
+                raise AirflowException("chunk_size='auto', listing_index and incremental can not be used "
+                                       "with reducer_one_per_object")
+
+        if incremental is not None:
+            if incremental not in WATERMARK_MODES:
+                raise AirflowException('incremental must be one of {}'.format(', '.join(WATERMARK_MODES)))
+            if self.deferrable or self.async_invoke:
+                raise AirflowException('incremental can not be used with deferrable or async_invoke')
+
     def execute_callable(self, context):
         """
         Overrides 'execute_callable' from LithopsOperator.
         Wrap of Lithops map reduce function.
         """
-        if self.iterdata_from_task is not None:
-            if isinstance(self.iterdata_from_task, dict):
-                kwarg, task_id = list(self.iterdata_from_task.items()).pop()
-                values = context['task_instance'].xcom_pull(task_ids=task_id)
-                self.map_iterdata = [{kwarg: value} for value in values]
+        # A single reducer needs all the map calls in one job, so the
+        # iterdata is only materialized, once, at submission
+        iterdata = self._iterdata_from_context(context)
+        map_function, extra_args = self.map_function, self.extra_args
+        if self._splits_objects():
+            map_function, iterdata, extra_args = self._partition(context, iterdata)
+            if not iterdata:
+                return []
+        elif not is_storage_iterdata(iterdata) and not isinstance(iterdata, list):
+            iterdata = list(iterdata)
+
+        self.log.debug("Params: {}".format(iterdata))
+
+        if self.prewarm:
+            self._prewarm(context, self.prewarm, self.map_runtime_memory)
+
+        if self.combine_function is not None:
+            if self.combine_batch_size is not None:
+                if is_storage_iterdata(iterdata):
+                    raise AirflowException('combine_batch_size can not be used with object storage iterdata')
+                map_function, extra_args = make_batch_function(map_function, extra_args), None
+                iterdata = list(pack_batches(iterdata, self.combine_batch_size))
+            map_function = make_combine_function(map_function, self.combine_function)
+
+        reduce_function = self.reduce_function
+        if self.result_codec is not None:
+            map_function = make_encoding_function(map_function, self.result_codec)
+            reduce_function = make_decoding_reducer(reduce_function)
+
+        # A single job can not be split in waves, reuse what adaptive maps learned
+        invoke_pool_threads = self.invoke_pool_threads
+        if invoke_pool_threads == 'auto':
+            invoke_pool_threads = load_settled(self._invoker_key()) or MAX_CONCURRENCY
+
+        if self.reduce_fan_in is not None:
+            return self._map_tree_reduce(context, map_function, reduce_function, iterdata, extra_args,
+                                         invoke_pool_threads)
+
+        map_function, include_modules, exclude_modules = self._bundle(map_function)
+        reduce_function = self._bundle(reduce_function)[0]
+        chunk_size, chunk_n = self._chunking()
+        futures = self._executor.map_reduce(map_function=map_function,
+                                            map_iterdata=iterdata,
+                                            reduce_function=reduce_function,
+                                            extra_args=extra_args,
+                                            extra_env=self.extra_env,
+                                            map_runtime_memory=self.map_runtime_memory,
+                                            reduce_runtime_memory=self.reduce_runtime_memory,
+                                            chunk_size=chunk_size,
+                                            chunk_n=chunk_n,
+                                            timeout=self.timeout,
+                                            reducer_one_per_object=self.reducer_one_per_object,
+                                            reducer_wait_local=self.reducer_wait_local,
+                                            invoke_pool_threads=invoke_pool_threads,
+                                            include_modules=include_modules,
+                                            exclude_modules=exclude_modules)
+        if self._partition_plan is not None:
+            # Lithops returns the map futures first, one per partition
+            self._map_futures = futures[:len(iterdata)]
+        return futures
+
+    def _map_runtime_memory(self):
+        return self.map_runtime_memory or super()._map_runtime_memory()
+
+    def _finish(self, hook, context):
+        result = super()._finish(hook, context)
+        if self._map_futures:
+            # The reducer waited for the map calls, fetch their stats
+            map_futures = self._executor.wait(fs=self._map_futures, throw_except=False)[0]
+            stats = CallStats()
+            stats.add(map_futures)
+            self._record_throughput(stats.exec_times)
+        return result
+
+    def _map_tree_reduce(self, context, map_function, reduce_function, iterdata, extra_args,
+                         invoke_pool_threads):
+        """
+        Runs the map with its outputs kept in storage and reduces them in
+        groups of reduce_fan_in consecutive outputs, level by level. A
+        reducer call starts as soon as its whole group is ready. Returns the
+        future of the final reducer.
+        """
+        storage = self._hook.get_storage()
+        prefix = '{}/{}/{}/{}'.format(TREE_PREFIX, self.dag_id, self.task_id, context['run_id'])
+        # Intermediate levels are deleted even when a call fails
+        try:
+            writer = make_map_writer(map_function, storage.bucket)
+            map_function, include_modules, exclude_modules = self._bundle(writer)
+            chunk_size, chunk_n = self._chunking()
+            map_futures = self._executor.map(map_function=map_function,
+                                             map_iterdata=iterdata,
+                                             extra_args=extra_args,
+                                             extra_env=dict(self.extra_env or {},
+                                                            **{OUTPUT_PREFIX_ENV: prefix + '/level0'}),
+                                             runtime_memory=self.map_runtime_memory,
+                                             chunk_size=chunk_size,
+                                             chunk_n=chunk_n,
+                                             timeout=self.timeout,
+                                             invoke_pool_threads=invoke_pool_threads,
+                                             include_modules=include_modules,
+                                             exclude_modules=exclude_modules)
+            if self._partition_plan is not None:
+                self._map_futures = map_futures
+
+            # Level 0 are the map calls, the last level the final reducer
+            counts = [len(map_futures)] + tree_levels(len(map_futures), self.reduce_fan_in)
+            top = len(counts) - 1
+            self.log.info("Reducing {} map outputs in {} levels: {}".format(
+                counts[0], top, ', '.join(str(c) for c in counts[1:])))
+            reducers = [None] + [make_tree_reducer(reduce_function, storage.bucket, last=level == top)
+                                 for level in range(1, top + 1)]
+
+            owner = {future_key(f): (0, index) for index, f in enumerate(map_futures)}
+            outputs = [{} for _ in counts]
+            pending, final = list(map_futures), None
+            # The final reducer is cleaned once its result is downloaded
+            intermediates = []
+            with self._deferred_cleaning(intermediates):
+                while pending:
+                    done, pending = self._executor.wait(fs=pending, return_when=ANY_COMPLETED)
+                    pending = list(pending)
+                    intermediate = []
+                    for f in done:
+                        if owner[future_key(f)][0] == top:
+                            final = f
+                        else:
+                            intermediate.append(f)
+                    if not intermediate:
+                        continue
+
+                    self._metrics.add_calls(intermediate)
+                    intermediates.extend(intermediate)
+                    ready = {}
+                    for f, key in zip(intermediate, self._read_results(intermediate)):
+                        level, index = owner[future_key(f)]
+                        outputs[level][index] = key
+                        start = index - index % self.reduce_fan_in
+                        group = range(start, min(start + self.reduce_fan_in, counts[level]))
+                        if all(i in outputs[level] for i in group):
+                            ready.setdefault(level + 1, []).append(
+                                {'index': start // self.reduce_fan_in, 'keys': [outputs[level][i] for i in group],
+                                 'prefix': '{}/level{}'.format(prefix, level + 1)})
+
+                    for level, groups in sorted(ready.items()):
+                        reducer, include_modules, exclude_modules = self._bundle(reducers[level])
+                        futures = self._executor.map(map_function=reducer,
+                                                     map_iterdata=[{'group': group} for group in groups],
+                                                     extra_env=self.extra_env,
+                                                     runtime_memory=self.reduce_runtime_memory,
+                                                     timeout=self.timeout,
+                                                     include_modules=include_modules,
+                                                     exclude_modules=exclude_modules)
+                        for group, f in zip(groups, futures):
+                            owner[future_key(f)] = (level, group['index'])
+                        pending.extend(futures)
+        finally:
+            self._delete_intermediate(storage, prefix)
+        return final
+
+
+class LithopsWarmupOperator(LithopsOperator):
+    def __init__(self,
+                 containers,
+                 runtime_memory=None,
+                 hold=WARMUP_HOLD,
+                 timeout=None,
+                 **kwargs):
+        """
+        Warms up containers of the runtime ahead of a large fan-out, with
+        lightweight no-op calls. Returns the number of distinct containers
+        reached, to pass to a downstream map operator as prewarm=<task_id>.
+
+        :param containers: Number of containers to warm up.
+        :param runtime_memory: Memory of the containers, the same as the downstream map. Default None (loaded from config).
+        :param hold: Seconds each call stays busy, so that every call gets its own container.
+        :param timeout: Time that the functions have to complete their execution before raising a timeout.
+        """
+        super().__init__(**kwargs)
+
+        self.containers = containers
+        self.runtime_memory = runtime_memory
+        self.hold = hold
+        self.timeout = timeout
+
+    def execute_callable(self, context):
+        """
+        Overrides 'execute_callable' from LithopsOperator.
+        """
+        return self._executor.map(map_function=make_warmup_function(self.hold),
+                                  map_iterdata=list(range(self.containers)),
+                                  runtime_memory=self.runtime_memory,
+                                  timeout=self.timeout,
+                                  include_modules=None)
+
+    def _collect_result(self, hook, context):
+        results = super()._collect_result(hook, context)
+        if not self.get_result or self.async_invoke:
+            return results
+        self._function_result = summarize_warmup(results, self._executor_params.get('runtime'),
+                                                 self.runtime_memory)
+        self.log.info("Warmed up {} containers, {} started by the warm-up".format(
+            self._function_result['containers'], self._function_result['started']))
+        return self._function_result
+
+
+class LithopsPipelineOperator(LithopsOperator):
+    def __init__(self,
+                 stages,
+                 map_iterdata=None,
+                 iterdata_from_task=None,
+                 extra_env=None,
+                 timeout=None,
+                 include_modules=[],
+                 exclude_modules=[],
+                 **kwargs):
+        """
+        Runs an ordered list of MapStage, ReduceStage and RepartitionStage as
+        one task. Intermediate outputs stay in object storage and are passed
+        between stages by key; a map call starts as soon as its input call of
+        the previous map stage is done, while reduce and repartition stages
+        wait for the whole previous stage.
+
+        :param stages: List of lithops_airflow_plugin.pipeline stages. The first one must be a MapStage.
+        :param map_iterdata: An iterable of input data for the first stage, or a callable returning one
+        :param extra_env: Additional environment variables for action environment. Default None.
+        :param timeout: Time that the functions have to complete their execution before raising a timeout.
+        :param include_modules: Explicitly pickle these dependencies.
+        :param exclude_modules: Explicitly keep these modules from pickled dependencies.
+        """
+        super().__init__(**kwargs)
+
+        if map_iterdata is None and iterdata_from_task is None:
+            raise AirflowException(
+                'At least map_iterdata or iterdata_from_task must be set')
+        try:
+            validate_stages(stages)
+        except ValueError as e:
+            raise AirflowException(str(e))
+        if self.deferrable:
+            raise AirflowException('LithopsPipelineOperator can not be deferrable')
+
+        self.stages = stages
+        self.map_iterdata = map_iterdata
+        self.iterdata_from_task = iterdata_from_task
+        self.extra_env = extra_env
+        self.timeout = timeout
+        self.include_modules = include_modules
+        self.exclude_modules = exclude_modules
+
+    def execute_callable(self, context):
+        """
+        Overrides 'execute_callable' from LithopsOperator. Drives the
+        stages until the last one is submitted and returns its futures.
+        """
+        iterdata = self._iterdata_from_context(context)
+        if is_storage_iterdata(iterdata):
+            raise AirflowException('LithopsPipelineOperator does not take object storage iterdata')
+        items = iterdata if isinstance(iterdata, list) else list(iterdata)
+        if not items:
+            return []
+
+        # Repartitions are done by the stage before them as it writes its output
+        steps = []
+        for stage in self.stages:
+            if stage.kind == 'repartition':
+                steps[-1]['partitions'], steps[-1]['key'] = stage.partitions, stage.key
             else:
-                self.map_iterdata = context['task_instance'].xcom_pull(task_ids=self.iterdata_from_task)
+                steps.append({'stage': stage, 'partitions': None, 'key': None})
+        last = len(steps) - 1
+
+        storage = self._hook.get_storage()
+        prefix = '{}/{}/{}/{}'.format(PIPELINE_PREFIX, self.dag_id, self.task_id, context['run_id'])
+        functions = [make_stage_function(step['stage'], storage.bucket,
+                                         partitions=step['partitions'], partition_key=step['key'],
+                                         last=s == last)
+                     for s, step in enumerate(steps)]
 
-        self.log.debug("Params: {}".format(self.map_iterdata))
+        expected = [None] * len(steps)
+        outputs = [{} for _ in steps]
+        owner, final, pending = {}, {}, []
 
-        return self._executor.map_reduce(map_function=self.map_function,
-                                         map_iterdata=self.map_iterdata,
-                                         reduce_function=self.reduce_function,
-                                         extra_args=self.extra_args,
+        def set_expected(s, calls):
+            expected[s] = calls
+            # Map stages fed call by call have as many calls as the stage before
+            while s < last and steps[s]['partitions'] is None and steps[s + 1]['stage'].kind == 'map':
+                s += 1
+                expected[s] = calls
+
+        def submit(s, calls):
+            stage = steps[s]['stage']
+            function, include_modules, exclude_modules = self._bundle(functions[s])
+            futures = self._executor.map(map_function=function,
+                                         map_iterdata=[{'call': dict(call, prefix='{}/stage{}'.format(prefix, s))}
+                                                       for call in calls],
                                          extra_env=self.extra_env,
-                                         map_runtime_memory=self.map_runtime_memory,
-                                         reduce_runtime_memory=self.reduce_runtime_memory,
-                                         chunk_size=self.chunk_size,
-                                         chunk_n=self.chunk_n,
+                                         runtime_memory=stage.runtime_memory,
                                          timeout=self.timeout,
-                                         reducer_one_per_object=self.reducer_one_per_object,
-                                         reducer_wait_local=self.reducer_wait_local,
-                                         invoke_pool_threads=self.invoke_pool_threads,
-                                         include_modules=self.include_modules,
-                                         exclude_modules=self.exclude_modules)
+                                         include_modules=include_modules,
+                                         exclude_modules=exclude_modules)
+            for call, f in zip(calls, futures):
+                owner[future_key(f)] = (s, call['index'])
+            pending.extend(futures)
+
+        # Intermediate outputs are deleted even when a call fails
+        try:
+            set_expected(0, len(items))
+            submit(0, [{'index': i, 'item': item} for i, item in enumerate(items)])
+
+            # The last stage is cleaned once its results are downloaded
+            intermediates = []
+            with self._deferred_cleaning(intermediates):
+                while pending:
+                    done, pending = self._executor.wait(fs=pending, return_when=ANY_COMPLETED)
+                    pending = list(pending)
+                    intermediate = []
+                    for f in done:
+                        s, index = owner[future_key(f)]
+                        if s == last:
+                            final[index] = f
+                        else:
+                            intermediate.append(f)
+                    if not intermediate:
+                        continue
+
+                    self._metrics.add_calls(intermediate)
+                    intermediates.extend(intermediate)
+                    ready = {}
+                    for f, ref in zip(intermediate, self._read_results(intermediate)):
+                        s, index = owner[future_key(f)]
+                        outputs[s][index] = ref
+                        if steps[s]['partitions'] is None and steps[s + 1]['stage'].kind == 'map':
+                            ready.setdefault(s + 1, []).append({'index': index, 'refs': [ref]})
+                        elif len(outputs[s]) == expected[s]:
+                            ready[s + 1] = self._barrier_calls(steps, s, outputs[s])
+                            set_expected(s + 1, len(ready[s + 1]))
+                    for s in sorted(ready):
+                        submit(s, ready[s])
+                    self.log.debug("Pipeline progress: {}".format(
+                        ', '.join('{}/{}'.format(len(o), e) for o, e in zip(outputs[:last], expected[:last]))))
+        finally:
+            self._delete_intermediate(storage, prefix)
+        futures = [final[index] for index in sorted(final)]
+        # A final reduce has a single result, like a map_reduce
+        return futures[0] if steps[last]['stage'].kind == 'reduce' else futures
+
+    def _barrier_calls(self, steps, s, outputs):
+        """
+        Calls of the stage after s, once all the outputs of s are in.
+        """
+        refs = [outputs[index] for index in sorted(outputs)]
+        partitions = steps[s]['partitions']
+        if partitions is None:
+            return [{'index': 0, 'refs': refs}]
+        if steps[s + 1]['stage'].kind == 'reduce':
+            return [{'index': 0, 'refs': [ref for parts in refs for ref in parts], 'concat': True}]
+        return [{'index': p, 'refs': [parts[p] for parts in refs], 'concat': True}
+                for p in range(partitions)]
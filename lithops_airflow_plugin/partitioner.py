@@ -0,0 +1,330 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Partitioning of objects in storage done by the plugin instead of Lithops,
+for chunk_size='auto' and for prefixes resolved from a listing index. With
+chunk_size='auto', the chunk size is the number of bytes a call is expected
+to process in the target call duration, from the throughput measured in
+previous runs of the same function. Each call moves its byte range to record
+boundaries when it reads it: it skips the partial record at the start and
+reads past the end until the next delimiter, so every record is processed by
+exactly one call.
+"""
+
+import math
+import inspect
+
+from lithops_airflow_plugin.utils import local_state_path, load_json, updating_json
+from lithops_airflow_plugin.listing import FULL_REFRESH_INTERVAL, ListingIndex, list_objects, stale_objects
+
+STATE_FILE = 'partitioner.json'
+TARGET_CALL_DURATION = 60
+# Bytes per second assumed for functions without history
+DEFAULT_THROUGHPUT = 4 * 1024 ** 2
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 1024 ** 3
+# Weight of the last run in the recorded throughput
+THROUGHPUT_WEIGHT = 0.5
+# Bytes read at a time past the end of a range while looking for a delimiter
+TAIL_READ_SIZE = 64 * 1024
+
+SPECIAL_ARGS = ('obj', 'id', 'storage', 'ibm_cos')
+
+
+def parse_storage_path(path):
+    """
+    Returns (bucket, prefix) of a Lithops storage iterdata path such as
+    'cos://bucket/prefix/' or 'bucket/key'.
+    """
+    if '://' in path:
+        path = path.split('://', 1)[1]
+    bucket, _, prefix = path.partition('/')
+    return bucket, prefix
+
+
+def list_input_objects(storage, iterdata, listing_index=False,
+                       listing_refresh_interval=FULL_REFRESH_INTERVAL, full=False):
+    """
+    Returns the objects of storage iterdata, a path, a {'obj': path, ...}
+    dict or a list of them, as dicts with bucket, key, size, etag,
+    last_modified and kwargs, the other keys of their iterdata dict. With
+    listing_index, prefixes are resolved from their ListingIndex instead of
+    a full listing, unless full is set. Also returns the stats of the
+    indexes, or None.
+    """
+    items = [iterdata] if isinstance(iterdata, (str, dict)) else list(iterdata)
+    objects = []
+    stats = {'full_listings': 0, 'incremental_listings': 0, 'new_objects': 0,
+             'out_of_order_objects': 0} if listing_index else None
+    for item in items:
+        kwargs = {}
+        if isinstance(item, dict):
+            kwargs = {k: v for k, v in item.items() if k != 'obj'}
+            item = item['obj']
+        bucket, prefix = parse_storage_path(item)
+        if listing_index:
+            index = ListingIndex(storage, bucket, prefix, full_refresh_interval=listing_refresh_interval)
+            entries = index.refresh(full=full).objects()
+            for name, value in index.stats().items():
+                if name in stats:
+                    stats[name] += value
+        else:
+            entries = list_objects(storage, bucket, prefix)
+        for entry in entries:
+            key = entry['Key']
+            # 'bucket/key' also lists 'bucket/key2', keep the key and what is under it
+            if prefix and not prefix.endswith('/') and key != prefix and not key.startswith(prefix + '/'):
+                continue
+            if key.endswith('/') or not entry['Size']:
+                continue
+            objects.append({'bucket': bucket,
+                            'key': key,
+                            'size': entry['Size'],
+                            'etag': entry['ETag'],
+                            'last_modified': entry['LastModified'],
+                            'kwargs': kwargs})
+    return objects, stats
+
+
+def is_self_overlapping(delimiter):
+    """
+    Tells whether two occurrences of delimiter can overlap, as in b'||' or
+    b'abab'. A run such as b'|||' can then be split in more than one way,
+    and a call that starts reading in the middle of it can not tell which
+    one a reader of the whole object would take.
+    """
+    return any(delimiter[:size] == delimiter[-size:] for size in range(1, len(delimiter)))
+
+
+def throughput_key(function, runtime_memory=None):
+    return '{}.{}:{}'.format(function.__module__, function.__qualname__, runtime_memory or 'default')
+
+
+def load_throughput(key):
+    """
+    Returns the bytes per second recorded for a function, or None.
+    """
+    record = load_json(local_state_path(STATE_FILE), {}).get(key)
+    return record['throughput'] if record else None
+
+
+def record_throughput(key, throughput):
+    with updating_json(local_state_path(STATE_FILE), {}) as state:
+        record = state.get(key)
+        if record:
+            throughput = THROUGHPUT_WEIGHT * throughput + (1 - THROUGHPUT_WEIGHT) * record['throughput']
+        state[key] = {'throughput': throughput, 'runs': (record or {}).get('runs', 0) + 1}
+    return throughput
+
+
+class PartitionPlan:
+
+    def __init__(self, objects, chunk_size=None, chunk_n=None, delimiter=b'\n',
+                 throughput=None, throughput_source=None, target_duration=None, listing=None,
+                 incremental=None):
+        """
+        Byte ranges of the input objects, one per call. Every object is split
+        in equal ranges of at most chunk_size bytes, or in chunk_n ranges, so
+        that there is no small trailing call, or kept whole.
+
+        :param objects: Input objects, as returned by list_input_objects.
+        :param delimiter: Record delimiter the ranges are aligned to, None for raw byte ranges.
+        :param throughput: Bytes per second the chunk size was computed from, for inspection.
+        :param throughput_source: 'history' or 'default', for inspection.
+        :param listing: Stats of the listing indexes the objects came from, for inspection.
+        :param incremental: Stats of the watermark that selected the objects, for inspection.
+        """
+        self.chunk_size = chunk_size
+        self.chunk_n = chunk_n
+        self.delimiter = delimiter
+        self.throughput = throughput
+        self.throughput_source = throughput_source
+        self.target_duration = target_duration
+        self.listing = listing
+        self.incremental = incremental
+        self.objects = len(objects)
+        self.partitions = []
+
+        for obj in objects:
+            size = obj['size']
+            if chunk_n:
+                parts = chunk_n
+            elif chunk_size:
+                parts = max(1, math.ceil(size / chunk_size))
+            else:
+                parts = 1
+            part_size = math.ceil(size / parts)
+            for part in range(parts):
+                start = part * part_size
+                if start >= size:
+                    break
+                self.partitions.append({'bucket': obj['bucket'],
+                                        'key': obj['key'],
+                                        'part': part,
+                                        'start': start,
+                                        'end': min(size, start + part_size),
+                                        'size': size,
+                                        'kwargs': obj['kwargs']})
+
+    @property
+    def total_bytes(self):
+        return sum(p['end'] - p['start'] for p in self.partitions)
+
+    def iterdata(self):
+        return [{'partition': p} for p in self.partitions]
+
+    def summary(self):
+        largest = max((p['end'] - p['start'] for p in self.partitions), default=0)
+        summary = {'calls': len(self.partitions),
+                   'objects': self.objects,
+                   'total_bytes': self.total_bytes,
+                   'chunk_size': self.chunk_size,
+                   'chunk_n': self.chunk_n,
+                   'largest_partition': largest,
+                   'delimiter': None if self.delimiter is None else self.delimiter.decode('latin-1')}
+        if self.throughput is not None:
+            summary.update({'throughput': round(self.throughput),
+                            'throughput_source': self.throughput_source,
+                            'target_call_duration': self.target_duration,
+                            'estimated_call_duration': round(largest / self.throughput, 2)})
+        if self.listing is not None:
+            summary['listing'] = self.listing
+        if self.incremental is not None:
+            summary['incremental'] = self.incremental
+        return summary
+
+
+def plan_partitions(storage, iterdata, function, runtime_memory=None, chunk_size='auto', chunk_n=None,
+                    target_duration=TARGET_CALL_DURATION, delimiter=b'\n', listing_index=False,
+                    listing_refresh_interval=FULL_REFRESH_INTERVAL, watermark=None, full=False):
+    """
+    Lists the objects of storage iterdata and plans their partitions for
+    function. With chunk_size='auto' the chunk size comes from the recorded
+    throughput of the function. Nothing is invoked, so it can be used to
+    inspect the plan before submitting.
+
+    :param watermark: Watermark that selects the objects not processed yet, unless full is set.
+    """
+    if delimiter is not None and is_self_overlapping(delimiter):
+        raise ValueError('Record delimiter {!r} can overlap itself, records can not be aligned to it'.format(
+            delimiter))
+
+    def select(objects):
+        if watermark is None:
+            return objects, None
+        return watermark.select(objects, full=full), watermark.stats()
+
+    objects, listing = list_input_objects(storage, iterdata, listing_index, listing_refresh_interval)
+    objects, incremental = select(objects)
+    if listing_index and listing['incremental_listings']:
+        # Indexed sizes are as old as the last full listing, a partition
+        # planned from a stale size would lose or repeat records
+        stale = stale_objects(storage, objects)
+        if stale is None or stale:
+            objects, relisted = list_input_objects(storage, iterdata, listing_index,
+                                                   listing_refresh_interval, full=True)
+            listing = {name: listing[name] + relisted[name] for name in listing}
+            listing['stale_objects'] = None if stale is None else len(stale)
+            objects, incremental = select(objects)
+    if chunk_size != 'auto':
+        return PartitionPlan(objects, chunk_size=chunk_size, chunk_n=chunk_n, delimiter=delimiter,
+                             listing=listing, incremental=incremental)
+
+    throughput = load_throughput(throughput_key(function, runtime_memory))
+    source = 'history' if throughput else 'default'
+    throughput = throughput or DEFAULT_THROUGHPUT
+    chunk_size = int(min(MAX_CHUNK_SIZE, max(MIN_CHUNK_SIZE, throughput * target_duration)))
+    return PartitionPlan(objects, chunk_size=chunk_size, delimiter=delimiter, throughput=throughput,
+                         throughput_source=source, target_duration=target_duration, listing=listing,
+                         incremental=incremental)
+
+
+def make_partition_function(map_function, extra_args=None, delimiter=b'\n'):
+    """
+    Returns a function that reads one planned partition, aligned to record
+    boundaries, and calls map_function with it as the Lithops 'obj'
+    argument.
+
+    :param extra_args: Lithops extra_args, a dict or a tuple, applied to every call.
+    """
+    params = list(inspect.signature(map_function).parameters)
+    # Parameters that positional extra_args fill in order, as Lithops does
+    positional = [p for p in params if p not in SPECIAL_ARGS]
+    wants_id = 'id' in params
+    wants_storage = 'storage' in params
+    wants_ibm_cos = 'ibm_cos' in params
+    tail_read_size = TAIL_READ_SIZE
+
+    def run_partition(partition, id, storage):
+        import io
+        from types import SimpleNamespace
+
+        bucket, key = partition['bucket'], partition['key']
+        start, end, size = partition['start'], partition['end'], partition['size']
+
+        def read(first, last):
+            return storage.get_object(bucket, key, extra_get_args={
+                'Range': 'bytes={}-{}'.format(first, last - 1)})
+
+        if delimiter is None:
+            body = read(start, end)
+        else:
+            d = len(delimiter)
+            # A record belongs to the range it starts in, which is right after a delimiter
+            lead = max(0, start - d)
+            data = read(lead, end)
+            if start == 0:
+                first = 0
+            else:
+                found = data.find(delimiter)
+                first = len(data) if found == -1 else found + d
+            if lead + first >= end:
+                body = b''
+            else:
+                # Read on until the delimiter that ends the last record
+                search_from = max(first, end - d - lead)
+                position = lead + len(data)
+                while True:
+                    found = data.find(delimiter, search_from)
+                    if found != -1:
+                        data = data[:found + d]
+                        break
+                    if position >= size:
+                        break
+                    chunk = read(position, min(size, position + tail_read_size))
+                    position += len(chunk)
+                    data += chunk
+                body = data[first:]
+
+        obj = SimpleNamespace(bucket=bucket, key=key, part=partition['part'],
+                              data_byte_range=(start, end), chunk_size=end - start,
+                              data_stream=io.BytesIO(body))
+        kwargs = dict(partition['kwargs'])
+        kwargs['obj'] = obj
+        if isinstance(extra_args, dict):
+            kwargs.update(extra_args)
+        elif extra_args is not None:
+            kwargs.update(zip([p for p in positional if p not in kwargs], extra_args))
+        if wants_id:
+            kwargs['id'] = id
+        if wants_storage:
+            kwargs['storage'] = storage
+        if wants_ibm_cos:
+            kwargs['ibm_cos'] = storage.get_client()
+        return map_function(**kwargs)
+
+    return run_partition
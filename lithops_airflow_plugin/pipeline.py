@@ -0,0 +1,144 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Stages of a LithopsPipelineOperator. Every stage runs as Lithops calls whose
+outputs stay in object storage and are passed to the next stage by key, so
+only references go through the task.
+"""
+
+PIPELINE_PREFIX = 'lithops.airflow/pipeline'
+
+
+class MapStage:
+
+    def __init__(self, function, extra_args=None, runtime_memory=None):
+        """
+        Applies function to every output of the previous stage, or to every
+        iterdata item when it is the first stage. Each call starts as soon
+        as its input is ready.
+
+        :param extra_args: Additional arguments to pass to every call.
+        :param runtime_memory: Memory of the calls. Default None (loaded from config).
+        """
+        self.kind = 'map'
+        self.function = function
+        self.extra_args = extra_args
+        self.runtime_memory = runtime_memory
+
+
+class ReduceStage:
+
+    def __init__(self, function, runtime_memory=None):
+        """
+        Applies function once, to the list of all the outputs of the
+        previous stage in call order.
+        """
+        self.kind = 'reduce'
+        self.function = function
+        self.runtime_memory = runtime_memory
+
+
+class RepartitionStage:
+
+    def __init__(self, partitions, key=None):
+        """
+        Regroups the records of the previous stage's outputs, which must be
+        lists, into a number of partitions. The next stage gets one call per
+        partition with the list of its records. The previous stage's calls
+        write their records already split, so there is no extra invocation.
+
+        :param partitions: Number of partitions.
+        :param key: Function of a record that decides its partition, so that
+                    equal keys end up together. Default None (round robin).
+        """
+        self.kind = 'repartition'
+        self.partitions = partitions
+        self.key = key
+
+
+def validate_stages(stages):
+    if not stages or stages[0].kind != 'map':
+        raise ValueError('The first stage of a pipeline must be a MapStage')
+    for previous, stage in zip(stages, stages[1:]):
+        if stage.kind == 'repartition' and previous.kind == 'repartition':
+            raise ValueError('A RepartitionStage must follow a MapStage or a ReduceStage')
+    if stages[-1].kind == 'repartition':
+        raise ValueError('A pipeline can not end with a RepartitionStage')
+
+
+def make_stage_function(stage, bucket, partitions=None, partition_key=None, last=False):
+    """
+    Returns the function that runs one call of a map or reduce stage: it
+    loads the input references, applies the user function and writes the
+    output under the prefix of the call, split in partitions when a
+    RepartitionStage follows. The last stage returns its output directly.
+    """
+    function = stage.function
+    kind = stage.kind
+    extra_args = getattr(stage, 'extra_args', None)
+
+    def run_stage(call, storage):
+        import pickle
+        import hashlib
+
+        def load(ref):
+            return pickle.loads(storage.get_object(bucket, ref))
+
+        if 'item' in call:
+            value = call['item']
+        elif call.get('concat'):
+            value = [record for ref in call['refs'] for record in load(ref)]
+        else:
+            value = [load(ref) for ref in call['refs']]
+            if kind == 'map':
+                value = value[0]
+
+        args, kwargs = [], {}
+        if kind == 'map' and 'item' in call and isinstance(value, dict):
+            kwargs.update(value)
+        else:
+            args.append(value)
+        if isinstance(extra_args, dict):
+            kwargs.update(extra_args)
+        elif extra_args is not None:
+            args.extend(extra_args)
+        result = function(*args, **kwargs)
+
+        if last:
+            return result
+
+        key = '{}/{:08d}'.format(call['prefix'], call['index'])
+        if partitions is None:
+            storage.put_object(bucket, key + '.pickle', pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+            return key + '.pickle'
+
+        parts = [[] for _ in range(partitions)]
+        for position, record in enumerate(result):
+            if partition_key is None:
+                p = (call['index'] + position) % partitions
+            else:
+                digest = hashlib.md5(pickle.dumps(partition_key(record), protocol=4)).digest()
+                p = int.from_bytes(digest[:8], 'big') % partitions
+            parts[p].append(record)
+        refs = []
+        for p, records in enumerate(parts):
+            ref = '{}-p{:05d}.pickle'.format(key, p)
+            storage.put_object(bucket, ref, pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL))
+            refs.append(ref)
+        return refs
+
+    return run_stage
@@ -0,0 +1,177 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+import time
+import pickle
+import hashlib
+import inspect
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import cloudpickle
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'lithops.airflow/cache'
+IO_THREADS = 64
+
+
+def function_hash(function, version=None):
+    """
+    Hashes a function together with the source of its whole module, so that
+    editing the module invalidates the cached results of its functions. The
+    cloudpickle bytes of the function are hashed too, which hold closures,
+    lambdas and partials by value with the values they captured. Changes in
+    other modules are not seen, bump version for those.
+    """
+    h = hashlib.sha256()
+    h.update(cloudpickle.dumps(function, protocol=4))
+    if version is not None:
+        h.update(str(version).encode('utf-8'))
+    if isinstance(function, functools.partial):
+        function = function.func
+    h.update('{}.{}'.format(function.__module__, function.__qualname__).encode('utf-8'))
+    try:
+        h.update(inspect.getsource(inspect.getmodule(function)).encode('utf-8'))
+    except (OSError, TypeError):
+        h.update(function.__code__.co_code)
+    return h.hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, storage, function, extra_args=None, ttl=None, max_bytes=None,
+                 version=None, prefix=CACHE_PREFIX):
+        """
+        Memoizes map results in object storage, keyed by a hash of the
+        function, the iterdata item and the extra_args.
+
+        :param storage: Lithops storage client.
+        :param function: The map function.
+        :param extra_args: The extra_args of the map, part of every key.
+        :param ttl: Seconds a result stays valid. Default None (forever).
+        :param max_bytes: Size of this function's cache above which the least
+                          recently used results are evicted. Default None (unbounded).
+        :param version: Part of the function hash, changed to drop the cached results.
+        """
+        self.storage = storage
+        self.bucket = storage.bucket
+        self.namespace = '{}/{}'.format(prefix, function_hash(function, version))
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._base = hashlib.sha256(pickle.dumps(extra_args, protocol=4)).digest()
+        self._touched = {}
+
+    def key(self, item):
+        h = hashlib.sha256(self._base)
+        h.update(pickle.dumps(item, protocol=4))
+        return h.hexdigest()
+
+    def _object_key(self, key):
+        return '{}/{}.pickle'.format(self.namespace, key)
+
+    def _get(self, key):
+        try:
+            created, value = pickle.loads(self.storage.get_object(self.bucket, self._object_key(key)))
+        except Exception:
+            return False, None
+        if self.ttl is not None and time.time() - created > self.ttl:
+            return False, None
+        return True, value
+
+    def lookup(self, items):
+        """
+        Looks up every item. Returns the cached results as {index: value}
+        and the misses as a list of (index, key).
+        """
+        keys = [self.key(item) for item in items]
+        with ThreadPoolExecutor(IO_THREADS) as pool:
+            found = list(pool.map(self._get, keys))
+
+        hits, misses = {}, []
+        for index, (key, (hit, value)) in enumerate(zip(keys, found)):
+            if hit:
+                hits[index] = value
+                self._touched[key] = None
+            else:
+                misses.append((index, key))
+
+        self.hits += len(hits)
+        self.misses += len(misses)
+        return hits, misses
+
+    def store(self, entries):
+        """
+        Stores (key, value) pairs.
+        """
+        def put(entry):
+            key, value = entry
+            body = pickle.dumps((time.time(), value), protocol=pickle.HIGHEST_PROTOCOL)
+            self.storage.put_object(self.bucket, self._object_key(key), body)
+            return key, len(body)
+
+        with ThreadPoolExecutor(IO_THREADS) as pool:
+            for key, size in pool.map(put, entries):
+                self._touched[key] = size
+
+    def close(self):
+        """
+        Records the entries used by this task in the cache index and applies
+        the TTL and size limits. The index is best effort: concurrent tasks
+        may overwrite each other's updates, which only delays eviction.
+        """
+        # The index maps each key to [size, last_used, created]
+        index_key = '{}/index.json'.format(self.namespace)
+        try:
+            index = json.loads(self.storage.get_object(self.bucket, index_key))
+        except Exception:
+            index = {}
+
+        now = time.time()
+        for key, size in self._touched.items():
+            if size is not None:
+                index[key] = [size, now, now]
+            elif key in index:
+                index[key][1] = now
+
+        expired = [k for k, (_, _, created) in index.items()
+                   if self.ttl is not None and now - created > self.ttl]
+        evicted = set(expired)
+        if self.max_bytes is not None:
+            total = sum(size for k, (size, _, _) in index.items() if k not in evicted)
+            for key in sorted(index, key=lambda k: index[k][1]):
+                if total <= self.max_bytes:
+                    break
+                if key not in evicted:
+                    evicted.add(key)
+                    total -= index[key][0]
+
+        if evicted:
+            self.storage.delete_objects(self.bucket, [self._object_key(k) for k in evicted])
+            for key in evicted:
+                del index[key]
+            logger.info('Evicted %d cached results', len(evicted))
+
+        self.storage.put_object(self.bucket, index_key, json.dumps(index))
+        self._touched = {}
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,201 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Codecs for map results. The map call encodes its result into bytes in the
+worker, so Lithops only moves an opaque blob, and the task or the reducer
+decodes it.
+
+  - pickle: pickle with the highest protocol
+  - pickle5: pickle protocol 5 with out-of-band buffers, so large arrays
+    are kept as raw buffers instead of being encoded into the pickle
+    stream. Lithops still pickles the buffers along with the rest of the
+    result, so it is not zero-copy. (Python 3.8 or newer in the runtime
+    and in the task)
+  - zstd: pickle compressed with zstandard (requires the zstandard package)
+  - lz4: pickle compressed with lz4 frames (requires the lz4 package)
+"""
+
+from lithops_airflow_plugin.utils import proxy_signature
+from lithops_airflow_plugin.metrics import percentile
+
+CODECS = ('pickle', 'pickle5', 'zstd', 'lz4')
+CODEC_KEY = '__lithops_codec__'
+# Reducers return the stats of the results they decoded along with their own
+STATS_KEY = '__lithops_codec_stats__'
+ZSTD_LEVEL = 3
+
+
+def make_encoder(codec):
+    """
+    Returns a function that encodes a value into a codec envelope.
+    """
+    if codec not in CODECS:
+        raise ValueError('Unknown result codec {!r}, use one of {}'.format(codec, ', '.join(CODECS)))
+    codec_key = CODEC_KEY
+    zstd_level = ZSTD_LEVEL
+
+    def encode_value(value):
+        import time
+        import pickle
+
+        start = time.time()
+        buffers = []
+        if codec == 'pickle5':
+            data = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+            # Writable, so that decoded arrays are writable too
+            buffers = [bytearray(b.raw()) for b in buffers]
+        else:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            if codec == 'zstd':
+                import zstandard
+                data = zstandard.ZstdCompressor(level=zstd_level).compress(data)
+            elif codec == 'lz4':
+                import lz4.frame
+                data = lz4.frame.compress(data)
+        return {codec_key: codec,
+                'data': data,
+                'buffers': buffers,
+                'size': len(data) + sum(len(b) for b in buffers),
+                'encode_time': time.time() - start}
+
+    return encode_value
+
+
+def make_decoder():
+    """
+    Returns a function that decodes codec envelopes and returns any other
+    value unchanged. The sizes and times of what it decodes are added to
+    stats, a dict of 'sizes', 'encode_times' and 'decode_times' lists,
+    when given.
+    """
+    codec_key = CODEC_KEY
+    stats_key = STATS_KEY
+
+    def decode_value(value, stats=None):
+        import time
+        import pickle
+
+        if not isinstance(value, dict):
+            return value
+        if stats_key in value:
+            if stats is not None:
+                for name, values in value[stats_key].items():
+                    stats[name].extend(values)
+            return value['result']
+        if codec_key not in value:
+            return value
+
+        start = time.time()
+        codec, data = value[codec_key], value['data']
+        if codec == 'pickle5':
+            decoded = pickle.loads(data, buffers=value['buffers'])
+        else:
+            if codec == 'zstd':
+                import zstandard
+                data = zstandard.ZstdDecompressor().decompress(data)
+            elif codec == 'lz4':
+                import lz4.frame
+                data = lz4.frame.decompress(data)
+            decoded = pickle.loads(data)
+        if stats is not None:
+            stats['sizes'].append(value['size'])
+            stats['encode_times'].append(value['encode_time'])
+            stats['decode_times'].append(time.time() - start)
+        return decoded
+
+    return decode_value
+
+
+decode_value = make_decoder()
+
+
+def is_encoded(value):
+    return isinstance(value, dict) and (CODEC_KEY in value or STATS_KEY in value)
+
+
+def make_encoding_function(function, codec):
+    """
+    Returns a function with the parameters of function that returns its
+    result encoded with codec.
+    """
+    signature, _ = proxy_signature(function)
+    encode_value = make_encoder(codec)
+
+    def encode_call(**kwargs):
+        return encode_value(function(**kwargs))
+
+    encode_call.__name__ = function.__name__
+    encode_call.__signature__ = signature
+    return encode_call
+
+
+def make_decoding_reducer(reduce_function):
+    """
+    Returns a reduce function with the parameters of reduce_function that
+    decodes the encoded map results it receives before reducing them, and
+    returns its result along with the sizes and times of what it decoded.
+    Partial results of a tree reduce are unwrapped the same way.
+    """
+    signature, _ = proxy_signature(reduce_function)
+    results_param = next(iter(signature.parameters))
+    decode = make_decoder()
+    stats_key = STATS_KEY
+
+    # Reducers may get their results positionally
+    def decode_reduce(*args, **kwargs):
+        stats = {'sizes': [], 'encode_times': [], 'decode_times': []}
+        if args:
+            args = ([decode(value, stats) for value in args[0]],) + args[1:]
+        else:
+            kwargs[results_param] = [decode(value, stats) for value in kwargs[results_param]]
+        return {stats_key: stats, 'result': reduce_function(*args, **kwargs)}
+
+    decode_reduce.__name__ = reduce_function.__name__
+    decode_reduce.__signature__ = signature
+    return decode_reduce
+
+
+class CodecStats:
+
+    def __init__(self, codec):
+        """
+        Encoded size and encode and decode times of the results decoded by a
+        task, or by the reducers whose results it decodes.
+        """
+        self.codec = codec
+        self.sizes = []
+        self.encode_times = []
+        self.decode_times = []
+
+    def decode(self, value):
+        return decode_value(value, {'sizes': self.sizes,
+                                    'encode_times': self.encode_times,
+                                    'decode_times': self.decode_times})
+
+    def summary(self):
+        sizes = sorted(self.sizes)
+        encode_times = sorted(self.encode_times)
+        decode_times = sorted(self.decode_times)
+        return {'codec': self.codec,
+                'calls': len(sizes),
+                'encoded_bytes': sum(sizes),
+                'encoded_bytes_p50': percentile(sizes, 50),
+                'encoded_bytes_p95': percentile(sizes, 95),
+                'encode_time': sum(encode_times),
+                'encode_time_p95': percentile(encode_times, 95),
+                'decode_time': sum(decode_times),
+                'decode_time_p95': percentile(decode_times, 95)}
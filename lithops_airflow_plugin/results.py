@@ -0,0 +1,90 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import pickle
+
+MANIFEST_TYPE = 'lithops_result_manifest'
+
+
+def is_manifest(value):
+    return isinstance(value, dict) and value.get('type') == MANIFEST_TYPE
+
+
+class StorageResultSink:
+
+    def __init__(self, storage, prefix, batch_size=1000, bucket=None):
+        """
+        Writes results to object storage in batches of at most batch_size
+        values, so that only one batch is ever held in memory.
+
+        :param storage: Lithops storage client.
+        :param prefix: Key prefix for the result parts.
+        :param batch_size: Number of results per part.
+        :param bucket: Bucket to write to. Default is the storage bucket.
+        """
+        self.storage = storage
+        self.bucket = bucket or storage.bucket
+        self.prefix = prefix.rstrip('/')
+        self.batch_size = batch_size
+        self.count = 0
+        self._parts = []
+        self._buffer = []
+
+    def add(self, index, value):
+        """
+        Adds the result of call number index.
+        """
+        self._buffer.append((index, value))
+        self.count += 1
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        key = '{}/part-{:05d}.pickle'.format(self.prefix, len(self._parts))
+        self.storage.put_object(self.bucket, key, pickle.dumps(self._buffer))
+        self._parts.append(key)
+        self._buffer = []
+
+    def manifest(self):
+        """
+        Returns the small, XCom friendly description of what was written.
+        """
+        self.flush()
+        return {'type': MANIFEST_TYPE,
+                'bucket': self.bucket,
+                'prefix': self.prefix,
+                'parts': list(self._parts),
+                'count': self.count}
+
+
+def iter_manifest(storage, manifest):
+    """
+    Yields (index, value) pairs from a result manifest, one part at a time.
+    Pairs come in completion order, not in call order.
+    """
+    for key in manifest['parts']:
+        for index, value in pickle.loads(storage.get_object(manifest['bucket'], key)):
+            yield index, value
+
+
+def load_manifest(storage, manifest):
+    """
+    Loads all the results of a manifest into a list, in call order.
+    """
+    pairs = sorted(iter_manifest(storage, manifest), key=lambda pair: pair[0])
+    return [value for _, value in pairs]
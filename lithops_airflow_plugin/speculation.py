@@ -0,0 +1,66 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from lithops_airflow_plugin.metrics import percentile
+
+
+class StragglerPolicy:
+
+    def __init__(self, total_calls, quantile=0.9, percentile=90, multiplier=1.5,
+                 max_fraction=0.05):
+        """
+        Decides which running calls get a speculative duplicate.
+
+        :param total_calls: Number of calls of the map.
+        :param quantile: Fraction of calls that must be done before speculating.
+        :param percentile: Percentile of the finished call durations used as reference.
+        :param multiplier: Calls running longer than multiplier times the reference are stragglers.
+        :param max_fraction: Maximum duplicates, as a fraction of total_calls (at least one).
+        """
+        self.total_calls = total_calls
+        self.quantile = quantile
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.max_launches = max(1, int(total_calls * max_fraction))
+        self.launched = 0
+        self._durations = []
+
+    def record_done(self, duration):
+        self._durations.append(duration)
+
+    def threshold(self):
+        """
+        Running time above which a call is a straggler, or None while too
+        few calls have finished.
+        """
+        if len(self._durations) < self.quantile * self.total_calls:
+            return None
+        return self.multiplier * percentile(sorted(self._durations), self.percentile)
+
+    def stragglers(self, running):
+        """
+        Returns the calls to duplicate, slowest first, within the launch cap.
+
+        :param running: {call index: seconds running} of the calls without a duplicate yet.
+        """
+        threshold = self.threshold()
+        if threshold is None or self.launched >= self.max_launches:
+            return []
+        slow = sorted((i for i, elapsed in running.items() if elapsed > threshold),
+                      key=lambda i: running[i], reverse=True)
+        slow = slow[:self.max_launches - self.launched]
+        self.launched += len(slow)
+        return slow
@@ -0,0 +1,93 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Hierarchical reduction: map outputs are kept in object storage and reduced
+in groups of fan_in consecutive outputs per call, level after level, until
+one value is left. The reduce function must be associative.
+"""
+
+import math
+import inspect
+
+from lithops_airflow_plugin.utils import proxy_signature
+
+TREE_PREFIX = 'lithops.airflow/tree'
+# Environment variable with the storage prefix of the map outputs of a run
+OUTPUT_PREFIX_ENV = 'LITHOPS_AIRFLOW_TREE_PREFIX'
+
+
+def tree_levels(calls, fan_in):
+    """
+    Returns the number of reducer calls of each level for this many map calls.
+    """
+    levels = []
+    while not levels or levels[-1] > 1:
+        calls = math.ceil(calls / fan_in)
+        levels.append(calls)
+    return levels
+
+
+def make_map_writer(map_function, bucket):
+    """
+    Returns a function with the parameters of map_function that writes its
+    result to storage and returns the key, so that reducers read the map
+    outputs by themselves. The prefix of the run is read from the
+    OUTPUT_PREFIX_ENV variable of the job, so that the function pickles the
+    same for every run.
+    """
+    signature, added = proxy_signature(map_function, extra=('storage', 'id'))
+
+    def write_map_output(**kwargs):
+        import os
+        import pickle
+
+        storage = kwargs['storage']
+        call_id = kwargs['id']
+        for name in added:
+            del kwargs[name]
+        result = map_function(**kwargs)
+        key = '{}/{:08d}.pickle'.format(os.environ[OUTPUT_PREFIX_ENV], call_id)
+        storage.put_object(bucket, key, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        return key
+
+    write_map_output.__name__ = map_function.__name__
+    write_map_output.__signature__ = signature
+    return write_map_output
+
+
+def make_tree_reducer(reduce_function, bucket, last=False):
+    """
+    Returns the function of one reducer call of a level, which reduces the
+    outputs behind the keys of its group, in order, and writes the result
+    under the prefix of the group for the next level or, on the last level,
+    returns it.
+    """
+    wants_storage = 'storage' in inspect.signature(reduce_function).parameters
+
+    def reduce_group(group, storage):
+        import pickle
+
+        results = [pickle.loads(storage.get_object(bucket, key)) for key in group['keys']]
+        result = reduce_function(results, storage=storage) if wants_storage else reduce_function(results)
+        if last:
+            return result
+        key = '{}/{:08d}.pickle'.format(group['prefix'], group['index'])
+        storage.put_object(bucket, key, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        return key
+
+    reduce_group.__name__ = reduce_function.__name__
+    return reduce_group
@@ -0,0 +1,144 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import time
+import asyncio
+
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+
+from lithops.constants import JOBS_PREFIX
+from lithops.storage import Storage
+from lithops.storage.utils import create_status_key
+
+from lithops_airflow_plugin.executor_service import config_key
+from lithops_airflow_plugin.hooks.lithops_hook import LithopsHook
+from lithops_airflow_plugin.governor import LEASE_TTL, governor_from_config
+
+STALE_LISTING = 600
+
+
+class _StatusPoller:
+    """
+    Lists the status objects of every executor prefix at most once per
+    interval. It is shared by all the triggers running in the triggerer
+    process, so thousands of deferred tasks cost one listing per executor
+    instead of one request per call.
+    """
+
+    def __init__(self):
+        self._storages = {}
+        self._listings = {}
+        self._locks = {}
+
+    def _get_storage(self, config):
+        key = config_key(config)
+        if key not in self._storages:
+            self._storages[key] = Storage(config=config or None)
+        return self._storages[key]
+
+    async def list_keys(self, config, executor_id, max_age):
+        cache_key = (config_key(config), executor_id)
+        lock = self._locks.setdefault(cache_key, asyncio.Lock())
+        async with lock:
+            cached = self._listings.get(cache_key)
+            if cached is not None and time.time() - cached[0] < max_age:
+                return cached[1]
+
+            storage = self._get_storage(config)
+            prefix = '/'.join([JOBS_PREFIX, executor_id])
+            loop = asyncio.get_event_loop()
+            keys = await loop.run_in_executor(
+                None, lambda: set(storage.list_keys(storage.bucket, prefix)))
+            now = time.time()
+            self._listings[cache_key] = (now, keys)
+            # Drop listings of executors nobody has asked about for a while
+            for key in [k for k, v in self._listings.items() if now - v[0] > STALE_LISTING]:
+                del self._listings[key]
+                self._locks.pop(key, None)
+            return keys
+
+
+_poller = _StatusPoller()
+
+
+class LithopsJobTrigger(BaseTrigger):
+
+    def __init__(self, conn_id, executor_params, calls, futures_key, poll_interval=5.0, lease_key=None):
+        """
+        Waits until all the calls of one or more Lithops jobs are done. The
+        Lithops config is resolved in the triggerer from the connection, so
+        that its credentials are never written to the trigger table.
+
+        :param conn_id: Airflow connection with the Lithops config.
+        :param executor_params: Executor parameters of the operator, merged over the connection config.
+        :param calls: List of [executor_id, job_id, [call_id, ...]] to watch.
+        :param futures_key: Storage key of the pickled futures, handed back to the operator.
+        :param poll_interval: Seconds between status listings.
+        :param lease_key: Governor lease of the task, renewed until the calls are done.
+        """
+        super().__init__()
+        self.conn_id = conn_id
+        self.executor_params = executor_params
+        self.calls = calls
+        self.futures_key = futures_key
+        self.poll_interval = poll_interval
+        self.lease_key = lease_key
+
+    def serialize(self):
+        return ('lithops_airflow_plugin.triggers.lithops_trigger.LithopsJobTrigger',
+                {'conn_id': self.conn_id,
+                 'executor_params': self.executor_params,
+                 'calls': self.calls,
+                 'futures_key': self.futures_key,
+                 'poll_interval': self.poll_interval,
+                 'lease_key': self.lease_key})
+
+    def _resolve_config(self):
+        hook = LithopsHook(conn_id=self.conn_id)
+        hook.resolve(self.executor_params)
+        return hook.lithops_config
+
+    async def run(self):
+        pending = {}
+        for executor_id, job_id, call_ids in self.calls:
+            keys = pending.setdefault(executor_id, set())
+            keys.update(create_status_key(JOBS_PREFIX, executor_id, job_id, call_id)
+                        for call_id in call_ids)
+
+        governor = governor_from_config() if self.lease_key else None
+        renewed = 0
+        loop = asyncio.get_event_loop()
+
+        try:
+            config = await loop.run_in_executor(None, self._resolve_config)
+            while pending:
+                if governor is not None and time.time() - renewed > LEASE_TTL / 3:
+                    await loop.run_in_executor(None, governor.renew, self.lease_key)
+                    renewed = time.time()
+                for executor_id in list(pending):
+                    done = await _poller.list_keys(config, executor_id,
+                                                   self.poll_interval / 2)
+                    pending[executor_id] -= done
+                    if not pending[executor_id]:
+                        del pending[executor_id]
+                if pending:
+                    await asyncio.sleep(self.poll_interval)
+        except Exception as e:
+            yield TriggerEvent({'status': 'error', 'message': str(e),
+                                'futures_key': self.futures_key})
+            return
+
+        yield TriggerEvent({'status': 'success', 'futures_key': self.futures_key})
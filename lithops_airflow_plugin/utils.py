@@ -0,0 +1,97 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import json
+import fcntl
+import inspect
+import tempfile
+import contextlib
+
+LOCAL_STATE_ENV = 'LITHOPS_AIRFLOW_STATE_DIR'
+DEFAULT_LOCAL_STATE_DIR = os.path.join(os.path.expanduser('~'), '.lithops', 'airflow')
+
+
+def local_state_path(name):
+    """
+    Returns the path of a file in the plugin's local state directory, which
+    holds what the plugin learns on this machine across task runs.
+    """
+    state_dir = os.environ.get(LOCAL_STATE_ENV, DEFAULT_LOCAL_STATE_DIR)
+    os.makedirs(state_dir, exist_ok=True)
+    return os.path.join(state_dir, name)
+
+
+def load_json(path, default=None):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def dump_json(path, value):
+    """
+    Writes JSON atomically, so concurrent tasks never read a partial file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+
+
+@contextlib.contextmanager
+def updating_json(path, default):
+    """
+    Yields the JSON value at path, or default, to be changed in place, and
+    writes it back on exit. An exclusive lock on a sibling .lock file is
+    held meanwhile, so tasks running on the same machine never overwrite
+    each other's updates.
+    """
+    with open(path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            value = load_json(path, default)
+            yield value
+            dump_json(path, value)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def proxy_signature(function, extra=()):
+    """
+    Returns the signature for a function that stands in for another one,
+    and the names of the parameters added to it. Lithops passes arguments
+    by name following the signature, so the proxy keeps the parameters of
+    the original function, without annotations or defaults that could need
+    the user's modules, plus the Lithops special arguments in extra.
+
+    Every function the plugin submits, such as these proxies or the warm-up
+    and pipeline stage functions, is defined in a closure of its make_*
+    factory. cloudpickle pickles closures by value, so neither this package
+    nor airflow is imported in the runtime, and the functions import what
+    they need inside their body.
+    """
+    parameters = []
+    for p in inspect.signature(function).parameters.values():
+        default = p.default if p.default is inspect.Parameter.empty else None
+        parameters.append(p.replace(annotation=inspect.Parameter.empty, default=default))
+    names = {p.name for p in parameters}
+    added = [name for name in extra if name not in names]
+    var_keyword = [p for p in parameters if p.kind == inspect.Parameter.VAR_KEYWORD]
+    parameters = [p for p in parameters if p.kind != inspect.Parameter.VAR_KEYWORD]
+    parameters += [inspect.Parameter(name, inspect.Parameter.KEYWORD_ONLY, default=None) for name in added]
+    return inspect.Signature(parameters + var_keyword), added
@@ -0,0 +1,64 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Pre-warming of function containers. Lightweight calls of the target runtime
+and memory size are invoked ahead of a large fan-out, so that its first wave
+lands on containers that are already started.
+"""
+
+import time
+
+# Seconds each warm-up call stays busy, so that concurrent calls are
+# served by distinct containers instead of reusing the first ones
+WARMUP_HOLD = 2.0
+CONTAINER_ID_FILE = 'lithops-airflow-container-id'
+
+
+def make_warmup_function(hold=WARMUP_HOLD):
+    """
+    Returns a no-op function that reports the container it ran in.
+    """
+    container_id_file = CONTAINER_ID_FILE
+
+    def warm_container(index):
+        import os
+        import time
+        import uuid
+        import tempfile
+
+        path = os.path.join(tempfile.gettempdir(), container_id_file)
+        cold = not os.path.exists(path)
+        if cold:
+            with open(path, 'w') as f:
+                f.write(uuid.uuid4().hex)
+        with open(path) as f:
+            container = f.read()
+        time.sleep(hold)
+        return {'container': container, 'cold': cold}
+
+    return warm_container
+
+
+def summarize_warmup(results, runtime=None, runtime_memory=None):
+    """
+    Summary of a warm-up, the value the warm-up operator returns as XCom.
+    """
+    return {'containers': len({r['container'] for r in results}),
+            'started': sum(1 for r in results if r['cold']),
+            'runtime': runtime,
+            'runtime_memory': runtime_memory,
+            'warmed_at': time.time()}
@@ -0,0 +1,125 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+
+WATERMARK_PREFIX = 'lithops.airflow/watermarks'
+MODES = ('last_modified', 'etag')
+# dag_run conf key that forces a full reprocess of incremental tasks
+FORCE_FULL_CONF = 'lithops_force_full'
+
+
+def _object_id(obj):
+    return '{}/{}'.format(obj['bucket'], obj['key'])
+
+
+def _signature(obj):
+    # Backends that report no ETag still report size and modification time
+    return obj['etag'] or '{}-{}'.format(obj['size'], obj['last_modified'])
+
+
+class Watermark:
+
+    def __init__(self, storage, dag_id, task_id, mode, prefix=WATERMARK_PREFIX):
+        """
+        What an incremental task has already processed, kept in object
+        storage and only advanced once a run succeeds.
+
+          - last_modified: the newest modification time processed, and the
+            objects modified at that time, since timestamps have seconds
+            resolution in most backends.
+          - etag: the ETag of every object processed, so rewritten objects
+            are processed again even if their time did not change.
+
+        :param storage: Lithops storage client.
+        :param mode: 'last_modified' or 'etag'.
+        """
+        if mode not in MODES:
+            raise ValueError('Unknown watermark mode {!r}, use one of {}'.format(mode, ', '.join(MODES)))
+        self.storage = storage
+        self.bucket = storage.bucket
+        self.key = '{}/{}/{}.json'.format(prefix, dag_id, task_id)
+        self.mode = mode
+        self.selected = 0
+        self.skipped = 0
+        self.full = False
+        self._state = None
+        self._candidate = None
+
+    def load(self):
+        try:
+            state = json.loads(self.storage.get_object(self.bucket, self.key))
+        except Exception:
+            return None
+        return state if state.get('mode') == self.mode else None
+
+    def select(self, objects, full=False):
+        """
+        Returns the objects added or changed since the last committed run,
+        or all of them when full is set or nothing was committed yet, and
+        prepares the watermark that commit() stores.
+
+        :param objects: Input objects, as returned by list_input_objects.
+        """
+        state = self._state = self.load()
+        self.full = full or state is None
+        if self.mode == 'last_modified':
+            selected = self._select_last_modified(objects, state)
+        else:
+            selected = self._select_etag(objects, state)
+        self.selected = len(selected)
+        self.skipped = len(objects) - len(selected)
+        return selected
+
+    def _select_last_modified(self, objects, state):
+        times = [obj['last_modified'] for obj in objects if obj['last_modified'] is not None]
+        newest = max(times, default=None)
+        if state is not None and state['last_modified'] is not None and \
+                (newest is None or newest < state['last_modified']):
+            newest = state['last_modified']
+        at_newest = [_object_id(obj) for obj in objects if obj['last_modified'] == newest]
+        if state is not None and newest == state['last_modified']:
+            at_newest = sorted(set(at_newest) | set(state['at_last_modified']))
+        self._candidate = {'mode': self.mode, 'last_modified': newest, 'at_last_modified': at_newest}
+
+        if self.full:
+            return list(objects)
+        mark, seen = state['last_modified'], set(state['at_last_modified'])
+        return [obj for obj in objects
+                if obj['last_modified'] is None or mark is None or obj['last_modified'] > mark
+                or (obj['last_modified'] == mark and _object_id(obj) not in seen)]
+
+    def _select_etag(self, objects, state):
+        # Objects that are no longer listed are dropped from the watermark
+        self._candidate = {'mode': self.mode,
+                           'etags': {_object_id(obj): _signature(obj) for obj in objects}}
+        if self.full:
+            return list(objects)
+        etags = state['etags']
+        return [obj for obj in objects if etags.get(_object_id(obj)) != _signature(obj)]
+
+    def commit(self):
+        """
+        Stores the watermark prepared by the last select().
+        """
+        if self._candidate is not None:
+            self.storage.put_object(self.bucket, self.key, json.dumps(self._candidate))
+
+    def stats(self):
+        return {'mode': self.mode,
+                'full': self.full,
+                'selected': self.selected,
+                'skipped': self.skipped}
@@ -0,0 +1,118 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+XCom backend that keeps large values in the Lithops storage bucket.
+
+Enable it in airflow.cfg:
+
+    [core]
+    xcom_backend = lithops_airflow_plugin.xcom_backend.LithopsXComBackend
+
+    [lithops]
+    xcom_threshold = 65536
+
+Values whose pickle is larger than xcom_threshold bytes, and lists of Lithops
+futures, are uploaded under lithops.airflow/xcom/<sha256>. Only the reference
+is written to the metadata DB, and pulling downloads the value, so every
+consumer gets what was pushed. Values are stored once per content, and the
+object is deleted when the last XCom that references it is cleared.
+"""
+
+import pickle
+import hashlib
+
+from airflow.configuration import conf
+from airflow.models.xcom import BaseXCom
+
+from lithops.future import ResponseFuture
+
+REF_TYPE = 'lithops_xcom_ref'
+XCOM_PREFIX = 'lithops.airflow/xcom'
+DEFAULT_THRESHOLD = 64 * 1024
+
+
+def is_reference(value):
+    return isinstance(value, dict) and value.get('type') == REF_TYPE
+
+
+def _is_futures(value):
+    if isinstance(value, ResponseFuture):
+        return True
+    return isinstance(value, list) and len(value) > 0 and isinstance(value[0], ResponseFuture)
+
+
+class LithopsXComBackend(BaseXCom):
+    storage = None
+
+    @classmethod
+    def get_storage(cls):
+        if cls.storage is None:
+            from lithops_airflow_plugin.hooks.lithops_hook import LithopsHook
+            cls.storage = LithopsHook().get_storage()
+        return cls.storage
+
+    @staticmethod
+    def serialize_value(value, **kwargs):
+        threshold = conf.getint('lithops', 'xcom_threshold', fallback=DEFAULT_THRESHOLD)
+        if value is None or isinstance(value, (bool, int, float)):
+            return BaseXCom.serialize_value(value)
+
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) <= threshold and not _is_futures(value):
+            return BaseXCom.serialize_value(value)
+
+        storage = LithopsXComBackend.get_storage()
+        key = '{}/{}'.format(XCOM_PREFIX, hashlib.sha256(payload).hexdigest())
+        try:
+            storage.head_object(storage.bucket, key)
+        except Exception:
+            storage.put_object(storage.bucket, key, payload)
+
+        return BaseXCom.serialize_value({'type': REF_TYPE,
+                                         'bucket': storage.bucket,
+                                         'key': key,
+                                         'size': len(payload)})
+
+    @staticmethod
+    def deserialize_value(result):
+        value = BaseXCom.deserialize_value(result)
+        if is_reference(value):
+            storage = LithopsXComBackend.get_storage()
+            return pickle.loads(storage.get_object(value['bucket'], value['key']))
+        return value
+
+    def orm_deserialize_value(self):
+        # Shown in the UI, never download the value for it
+        value = BaseXCom.deserialize_value(self)
+        if is_reference(value):
+            return 'Lithops XCom {} ({} bytes)'.format(value['key'], value['size'])
+        return value
+
+    @staticmethod
+    def purge(xcom, session):
+        """
+        Deletes the stored value of an XCom that is being cleared, unless
+        another XCom with the same content still references it.
+        """
+        value = BaseXCom.deserialize_value(xcom)
+        if not is_reference(value):
+            return
+        # The XCom being cleared is still in the table
+        if session.query(BaseXCom).filter(BaseXCom.value == xcom.value).count() > 1:
+            return
+        storage = LithopsXComBackend.get_storage()
+        storage.delete_object(value['bucket'], value['key'])
@@ -40,6 +40,9 @@ setuptools.setup(
     entry_points = {
         'airflow.plugins': [
             'plugin = lithops_airflow_plugin.lithops_plugin:LithopsAirflowPlugin'
+        ],
+        'console_scripts': [
+            'lithops-airflow-history = lithops_airflow_plugin.history:main'
         ]
     }
 )
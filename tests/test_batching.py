@@ -0,0 +1,90 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from lithops_airflow_plugin.batching import (  # noqa: E402
+    MAX_BATCH_SIZE,
+    choose_batch_size,
+    make_batch_function,
+    pack_batches,
+    unpack_results,
+)
+
+
+def pair(a, b):
+    return (a, b)
+
+
+def single(x):
+    return x
+
+
+def with_id(x, id):
+    return (x, id)
+
+
+def run(function, batch, extra_args=None, offset=0):
+    return make_batch_function(function, extra_args)(batch=batch, offset=offset, storage=None)['results']
+
+
+def test_items_are_bound_like_lithops_does():
+    assert run(pair, [(1, 2), [3, 4], {'a': 5, 'b': 6}]) == [(1, 2), (3, 4), (5, 6)]
+    # A list with another number of values than parameters is a single value
+    assert run(single, [[1, 2], (3,), 'ab']) == [[1, 2], 3, 'ab']
+
+
+def test_extra_args_are_added_to_every_item():
+    assert run(pair, [1, (2,)], extra_args=(0,)) == [(1, 0), (2, 0)]
+    assert run(pair, [{'a': 1}], extra_args={'b': 2}) == [(1, 2)]
+    # Lithops makes a tuple of a list and the extra_args before unpacking lists
+    assert run(pair, [[1, 2]], extra_args=(0,)) == [([1, 2], 0)]
+
+
+def test_id_is_the_item_index():
+    assert run(with_id, [(1,), 2], offset=10) == [(1, 10), (2, 11)]
+
+
+def test_functions_taking_the_object_can_not_be_batched():
+    def read(obj):
+        return obj
+
+    with pytest.raises(ValueError, match='obj'):
+        make_batch_function(read)
+
+
+def test_batches_are_unpacked_in_item_order():
+    batches = list(pack_batches(iter(range(7)), 3))
+    assert batches == [{'batch': [0, 1, 2], 'offset': 0}, {'batch': [3, 4, 5], 'offset': 3},
+                       {'batch': [6], 'offset': 6}]
+    function = make_batch_function(single)
+    results = [function(storage=None, **batch) for batch in batches]
+    assert unpack_results(list(reversed(results))) == list(range(7))
+    assert unpack_results([1, 2]) == [1, 2]
+    assert unpack_results([]) == []
+
+
+def test_batch_size_keeps_the_overhead_at_the_target():
+    # 1s of overhead is 10% of a call that runs 9s of items
+    assert choose_batch_size(1, 0.1) == 90
+    assert choose_batch_size(1, 0.1, target_overhead=0.5) == 10
+    # Enough calls are kept for the workers
+    assert choose_batch_size(1, 0.1, total_items=100, min_calls=10) == 10
+    assert choose_batch_size(1, 0) == MAX_BATCH_SIZE
+    assert choose_batch_size(0, 1) == 1
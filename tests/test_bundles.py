@@ -0,0 +1,147 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from lithops_airflow_plugin import bundles  # noqa: E402
+from lithops_airflow_plugin.bundles import BUNDLE_PREFIX, LOCAL_TTL, BundleCache  # noqa: E402
+from lithops_airflow_plugin.pipeline import MapStage, make_stage_function  # noqa: E402
+from lithops_airflow_plugin.tree_reduce import make_map_writer, make_tree_reducer  # noqa: E402
+
+DAY = 86400
+START = 1e9
+
+
+class StorageStandIn:
+    # The part of the Lithops storage client the bundle cache uses, over a dict
+
+    bucket = 'bucket'
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, bucket, key, body):
+        self.objects[key] = body
+
+    def get_object(self, bucket, key):
+        return self.objects[key]
+
+    def head_object(self, bucket, key):
+        if key not in self.objects:
+            raise KeyError(key)
+        return {'content-length': str(len(self.objects[key]))}
+
+    def delete_objects(self, bucket, keys):
+        for key in keys:
+            del self.objects[key]
+
+    def bundles(self):
+        return sorted(k for k in self.objects if k != '{}/index.json'.format(BUNDLE_PREFIX))
+
+    def index(self):
+        return json.loads(self.objects['{}/index.json'.format(BUNDLE_PREFIX)])
+
+
+def add(x):
+    return x + 1
+
+
+def total(results):
+    return sum(results)
+
+
+def run_functions(bucket):
+    # What a tree reduce and a pipeline submit, whatever the run
+    return [make_map_writer(add, bucket),
+            make_tree_reducer(total, bucket),
+            make_tree_reducer(total, bucket, last=True),
+            make_stage_function(MapStage(add), bucket)]
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('LITHOPS_AIRFLOW_STATE_DIR', str(tmp_path))
+
+
+def test_bundles_are_shared_across_runs(tmp_path, monkeypatch):
+    storage = StorageStandIn()
+    first = BundleCache(storage)
+    for function in run_functions(storage.bucket):
+        first.loader(function)
+    first.close()
+    assert first.uploads == 4
+    uploaded = storage.bundles()
+
+    # A later run on another worker, without the local record of the uploads
+    monkeypatch.setenv('LITHOPS_AIRFLOW_STATE_DIR', str(tmp_path / 'other'))
+    second = BundleCache(storage)
+    for function in run_functions(storage.bucket):
+        second.loader(function)
+    second.close()
+    assert second.stats() == {'local_hits': 0, 'remote_hits': 4, 'uploads': 0}
+    assert storage.bundles() == uploaded
+
+
+def uploaded_at(storage, now, function, **options):
+    cache = BundleCache(storage, **options)
+    with mock.patch.object(bundles.time, 'time', return_value=START + now):
+        cache.loader(function)
+        cache.close()
+    return cache
+
+
+def test_bundles_expire_after_their_ttl():
+    storage = StorageStandIn()
+    uploaded_at(storage, 0, add, ttl=DAY)
+    old = storage.bundles()
+    uploaded_at(storage, DAY / 2, total, ttl=DAY)
+    assert len(storage.bundles()) == 2
+
+    # add was last used more than a day ago, total less than a day ago
+    uploaded_at(storage, DAY + LOCAL_TTL, make_map_writer(add, storage.bucket), ttl=DAY)
+    assert len(storage.bundles()) == 2
+    assert not set(old) & set(storage.bundles())
+    assert len(storage.index()) == 2
+
+
+def test_bundles_used_recently_are_not_evicted():
+    storage = StorageStandIn()
+    uploaded_at(storage, 0, add, ttl=DAY)
+    # Other hosts may still trust the bundle without checking it exists
+    uploaded_at(storage, LOCAL_TTL / 2, total, ttl=0)
+    assert len(storage.bundles()) == 2
+
+
+def test_least_recently_used_bundles_are_evicted_above_max_bytes():
+    storage = StorageStandIn()
+    uploaded_at(storage, 0, add)
+    uploaded_at(storage, 10, total)
+    uploaded_at(storage, 20, make_map_writer(add, storage.bucket))
+    index = storage.index()
+    oldest = min(index, key=lambda k: index[k][1])
+    max_bytes = sum(size for size, _ in index.values()) - 1
+
+    # total is used again, add is the least recently used
+    uploaded_at(storage, 2 * LOCAL_TTL, total, max_bytes=max_bytes)
+    assert oldest not in storage.index()
+    assert len(storage.index()) == 2
+    assert len(storage.bundles()) == 2
@@ -0,0 +1,57 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from lithops_airflow_plugin.checkpoint import CallCheckpoint  # noqa: E402
+
+
+class StorageStandIn:
+    # The part of the Lithops storage client the checkpoint uses, over a dict
+
+    bucket = 'bucket'
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, bucket, key, body):
+        self.objects[key] = body
+
+    def get_object(self, bucket, key):
+        return self.objects[key]
+
+    def list_keys(self, bucket, prefix):
+        return sorted(k for k in self.objects if k.startswith(prefix))
+
+    def delete_objects(self, bucket, keys):
+        for key in keys:
+            del self.objects[key]
+
+
+def test_completed_results_are_resumed_until_cleared():
+    storage = StorageStandIn()
+    storage.put_object('bucket', 'lithops.airflow/checkpoints/dag/other/run/00000000.pickle', b'')
+    checkpoint = CallCheckpoint(storage, 'dag', 'task', 'run', ['a', 'b', 'c'])
+    checkpoint.save([(0, 'A'), (2, 'C')])
+    assert CallCheckpoint(storage, 'dag', 'task', 'run', ['a', 'b', 'c']).completed() == {0: 'A', 2: 'C'}
+    assert CallCheckpoint(storage, 'dag', 'task', 'run', ['a', 'b', 'x']).completed() == {0: 'A'}
+
+    assert checkpoint.clear() == 2
+    assert checkpoint.completed() == {}
+    assert list(storage.objects) == ['lithops.airflow/checkpoints/dag/other/run/00000000.pickle']
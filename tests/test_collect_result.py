@@ -0,0 +1,102 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from airflow.exceptions import AirflowException  # noqa: E402
+
+from lithops_airflow_plugin.result_codecs import make_decoding_reducer, make_encoder  # noqa: E402
+from lithops_airflow_plugin.operators.lithops_operator import (  # noqa: E402
+    LithopsMapOperator,
+    LithopsMapReduceOperator,
+)
+
+
+def add(x):
+    return x + 1
+
+
+def total(results):
+    return sum(results)
+
+
+def make_future(call_id, result=None, produce_output=True):
+    future = mock.Mock(executor_id='e', job_id='M000', call_id=call_id, _produce_output=produce_output)
+    future.result.return_value = result
+    return future
+
+
+def collect(operator, futures, result):
+    operator._futures = futures
+    operator._executor = mock.Mock()
+    operator._executor.get_result.return_value = result
+    operator._executor.wait.side_effect = lambda fs, **kwargs: (fs, [])
+    operator._metrics = mock.Mock()
+    return operator._collect_result(mock.Mock(), {'task_instance': mock.Mock()})
+
+
+@pytest.mark.parametrize('result', [6, {'a': 1, 'b': 2}, [3, 4]])
+def test_map_reduce_result_returned_unchanged(result):
+    operator = LithopsMapReduceOperator(task_id='map_reduce', map_function=add,
+                                        reduce_function=total, map_iterdata=[1, 2, 3])
+    futures = [make_future('00000', produce_output=False), make_future('00001', produce_output=False),
+               make_future('00002', result)]
+    with mock.patch.object(operator, '_record_results') as record_results:
+        assert collect(operator, futures, None) == result
+    record_results.assert_not_called()
+
+
+def test_map_results_unpacked_and_recorded():
+    operator = LithopsMapOperator(task_id='map', map_function=add, map_iterdata=[1, 2])
+    with mock.patch.object(operator, '_record_results') as record_results:
+        assert collect(operator, [make_future('00000'), make_future('00001')], [2, 3]) == [2, 3]
+    record_results.assert_called_once_with([(0, 2), (1, 3)])
+
+
+def test_map_reduce_codec_decodes_single_result():
+    operator = LithopsMapReduceOperator(task_id='map_reduce', map_function=add, reduce_function=total,
+                                        map_iterdata=[1, 2, 3], result_codec='pickle')
+    assert collect(operator, [make_future('00000', produce_output=False), make_future('00001', {'a': 1})],
+                   None) == {'a': 1}
+    assert collect(operator, [make_future('00000', produce_output=False), make_future('00001', 'ab')],
+                   None) == 'ab'
+
+
+def test_map_reduce_codec_stats_come_from_the_reducers():
+    encode, reduce = make_encoder('pickle'), make_decoding_reducer(total)
+    # A tree reduce passes the partial results of a level to the next one
+    result = reduce([reduce([encode(1), encode(2)]), reduce([encode(3)])])
+    operator = LithopsMapReduceOperator(task_id='map_reduce', map_function=add, reduce_function=total,
+                                        map_iterdata=[1, 2, 3], result_codec='pickle')
+    assert collect(operator, [make_future('00000', produce_output=False), make_future('00001', result)],
+                   None) == 6
+
+    context = {'task_instance': mock.Mock()}
+    operator._finish_results(context)
+    summary = context['task_instance'].xcom_push.call_args[1]['value']
+    assert summary['calls'] == 3
+    assert summary['encoded_bytes'] == sum(encode(value)['size'] for value in (1, 2, 3))
+
+
+@pytest.mark.parametrize('options', [{'speculative': True}, {'runtime_memory': 'auto'}])
+def test_streamed_results_can_not_be_retried(options):
+    with pytest.raises(AirflowException, match='stream_results'):
+        LithopsMapOperator(task_id='map', map_function=add, map_iterdata=[1, 2, 3], stream_results=True, **options)
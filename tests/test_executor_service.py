@@ -0,0 +1,144 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('lithops')
+
+from lithops_airflow_plugin import executor_service  # noqa: E402
+from lithops_airflow_plugin.executor_service import ExecutorPool, ExecutorService  # noqa: E402
+
+
+def make_executor(**config):
+    executor = mock.Mock(executor_id=config['name'], futures=[])
+    executor.invoker.workers = 100
+    del executor.invoker.max_workers
+    return executor
+
+
+@pytest.fixture
+def pool():
+    with mock.patch('lithops.FunctionExecutor', side_effect=make_executor):
+        yield ExecutorPool(max_executors=2)
+
+
+def test_evicted_executors_are_cleaned(pool):
+    first = pool.get({'name': 'a'})
+    pool.get({'name': 'b'})
+    pool.get({'name': 'c'})
+    assert len(pool) == 2
+    first.executor.clean.assert_called_once_with()
+
+
+def test_unfetched_futures_are_dropped_on_disconnect(tmp_path, pool):
+    service = ExecutorService(str(tmp_path / 'executor.sock'), pool)
+    try:
+        future = mock.Mock(executor_id='a', job_id='M000', call_id='00000')
+        warm = pool.get({'name': 'a'})
+        warm.executor.map.return_value = [future]
+        service.dispatch({'op': 'map', 'config': {'name': 'a'}, 'workers': 10, 'kwargs': {}}, client=1)
+        assert len(warm.futures) == 1
+        assert warm.executor.invoker.workers == 10
+
+        pool.forget(1)
+        assert warm.futures == {}
+        assert warm.executor.invoker.workers == 100
+    finally:
+        service.server_close()
+
+
+def test_jobs_are_cleaned_once_all_their_results_are_fetched(tmp_path, pool):
+    service = ExecutorService(str(tmp_path / 'executor.sock'), pool)
+    try:
+        warm = pool.get({'name': 'a'})
+        assert warm.executor.data_cleaner is False
+        mapped = [mock.Mock(executor_id='a', job_id='M000', call_id=call_id, _produce_output=False)
+                  for call_id in ('00000', '00001')]
+        reducers = [mock.Mock(executor_id='a', job_id='R000', call_id=call_id, _produce_output=True)
+                    for call_id in ('00000', '00001')]
+        warm.executor.map_reduce.return_value = mapped + reducers
+        warm.executor.get_result.return_value = [1]
+        service.dispatch({'op': 'map_reduce', 'config': {'name': 'a'}, 'kwargs': {}}, client=1)
+
+        request = {'op': 'get_result', 'config': {'name': 'a'}, 'kwargs': {'fs': [reducers[0]]}}
+        service.dispatch(request, client=1)
+        warm.executor.clean.assert_not_called()
+
+        # wait only fetches the futures that are done
+        warm.executor.wait.return_value = ([], reducers[1:])
+        request = {'op': 'wait', 'config': {'name': 'a'}, 'kwargs': {'fs': reducers[1:], 'download_results': True}}
+        service.dispatch(request, client=1)
+        warm.executor.clean.assert_not_called()
+
+        request = {'op': 'get_result', 'config': {'name': 'a'}, 'kwargs': {'fs': reducers[1:]}}
+        service.dispatch(request, client=1)
+        warm.executor.clean.assert_called_once_with(fs=[reducers[1]], clean_cloudobjects=False)
+        assert warm.unfetched == {}
+    finally:
+        service.server_close()
+
+
+def test_executor_futures_stay_bounded(tmp_path, pool):
+    service = ExecutorService(str(tmp_path / 'executor.sock'), pool)
+    try:
+        warm = pool.get({'name': 'a'})
+
+        def map_reduce(**kwargs):
+            job = len(warm.executor.futures)
+            futures = [mock.Mock(executor_id='a', job_id='M{:03d}'.format(job), call_id='00000',
+                                 _produce_output=False),
+                       mock.Mock(executor_id='a', job_id='R{:03d}'.format(job), call_id='00000',
+                                 _produce_output=True)]
+            warm.executor.futures.extend(futures)
+            return futures
+
+        warm.executor.map_reduce.side_effect = map_reduce
+        for _ in range(20):
+            futures = service.dispatch({'op': 'map_reduce', 'config': {'name': 'a'}, 'kwargs': {}}, client=1)
+            assert len(warm.executor.futures) == 2
+            service.dispatch({'op': 'get_result', 'config': {'name': 'a'}, 'kwargs': {'fs': futures[1:]}},
+                             client=1)
+            assert warm.executor.futures == []
+
+        service.dispatch({'op': 'map_reduce', 'config': {'name': 'a'}, 'kwargs': {}}, client=2)
+        pool.forget(2)
+        assert warm.executor.futures == []
+    finally:
+        service.server_close()
+
+
+def test_connections_of_other_users_are_refused(tmp_path, pool):
+    service = ExecutorService(str(tmp_path / 'executor.sock'), pool)
+    try:
+        with mock.patch.object(executor_service, '_peer_uid', return_value=os.getuid() + 1):
+            assert not service.verify_request(mock.Mock(), None)
+        with mock.patch.object(executor_service, '_peer_uid', return_value=os.getuid()):
+            assert service.verify_request(mock.Mock(), None)
+    finally:
+        service.server_close()
+
+
+def test_socket_directory_must_be_private(tmp_path):
+    path = tmp_path / 'service'
+    executor_service._private_dir(str(path / 'executor.sock'))
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o700)
+
+    os.chmod(path, 0o755)
+    with pytest.raises(PermissionError):
+        executor_service._private_dir(str(path / 'executor.sock'))
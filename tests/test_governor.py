@@ -0,0 +1,84 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import time
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('airflow')
+
+from lithops_airflow_plugin.governor import ConcurrencyGovernor, fair_shares  # noqa: E402
+
+
+class InMemoryGovernor(ConcurrencyGovernor):
+    # The leases in a dict instead of the Airflow Variable
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.state = {}
+
+    def _transaction(self, update):
+        return update(self.state, time.time())
+
+
+@pytest.mark.parametrize('capacity, tasks', [(10, 3), (10, 7), (5, 8), (1000, 15), (1000, 1001)])
+def test_fair_shares_never_exceed_capacity(capacity, tasks):
+    shares = fair_shares(capacity, {i: (1, None) for i in range(tasks)})
+    assert sum(shares.values()) <= capacity
+    assert all(shares.values()) or tasks > capacity
+
+
+def test_fair_shares_more_tasks_than_tokens():
+    shares = fair_shares(5, {i: (1, None) for i in range(8)})
+    assert [shares[i] for i in range(8)] == [1, 1, 1, 1, 1, 0, 0, 0]
+
+
+def test_fair_shares_weights_and_demands():
+    shares = fair_shares(100, {'a': (1, 10), 'b': (1, None), 'c': (2, None)})
+    assert shares['a'] == 10
+    assert shares['b'] + shares['c'] <= 90
+    assert shares['c'] == 2 * shares['b']
+
+
+def test_acquire_alone_skips_settle_time():
+    governor = InMemoryGovernor(100, settle_time=30)
+    with mock.patch('lithops_airflow_plugin.governor.time.sleep') as sleep:
+        lease = governor.acquire('task')
+    sleep.assert_not_called()
+    assert lease.tokens == 100
+    lease.release()
+    assert governor.state == {}
+
+
+def test_acquire_with_waiting_peer_settles():
+    governor = InMemoryGovernor(100, settle_time=30)
+    governor.state['other'] = governor._new_lease(1, None, time.time(), time.time())
+    with mock.patch('lithops_airflow_plugin.governor.time.sleep') as sleep:
+        lease = governor.acquire('task')
+    sleep.assert_called_once_with(30)
+    assert lease.tokens == 50
+    lease.release()
+
+
+def test_detached_lease_is_kept():
+    governor = InMemoryGovernor(100, settle_time=0)
+    lease = governor.acquire('task')
+    lease.detach(hold=600)
+    assert governor.state['task']['granted'] == 100
+    assert governor.state['task']['pid'] is None
+    governor.release('task')
+    assert governor.state == {}
@@ -0,0 +1,104 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('airflow')
+
+from lithops_airflow_plugin import history as history_module  # noqa: E402
+from lithops_airflow_plugin.history import ExecutionHistory, main  # noqa: E402
+
+DAY = 86400
+
+
+def call(exec_time, cold_start=0, error=0):
+    # call_id, exec_time, queue_delay, cold_start, data_bytes, result_bytes, peak_memory, error
+    return ('00000', exec_time, 0.1, cold_start, 1024, 2048, 300 * 1024 ** 2, error)
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = ExecutionHistory(str(tmp_path / 'history.db'))
+    runs = [('dag', 'map', 'run1', 1024, [call(1.0, cold_start=1), call(3.0)]),
+            ('dag', 'map', 'run2', 2048, [call(2.0), call(2.0, error=1)]),
+            ('dag', 'reduce', 'run1', 512, [call(4.0)]),
+            ('other', 'map', 'run1', 1024, [call(1.0)])]
+    for day, (dag_id, task_id, run_id, memory, calls) in enumerate(runs):
+        with mock.patch.object(history_module.time, 'time', return_value=day * DAY):
+            history.record(dag_id, task_id, run_id, try_number=1, runtime_memory=memory,
+                           phases={'submit': 1.0, 'wait': 2.5}, calls=calls)
+    return history
+
+
+def test_runs_are_filtered_and_come_oldest_first(history):
+    assert [(r['dag_id'], r['task_id'], r['run_id']) for r in history.runs(dag_id='dag')] == \
+        [('dag', 'map', 'run1'), ('dag', 'map', 'run2'), ('dag', 'reduce', 'run1')]
+    assert [r['run_id'] for r in history.runs('dag', 'map', last=1)] == ['run2']
+    with mock.patch.object(history_module.time, 'time', return_value=3 * DAY):
+        assert [r['dag_id'] for r in history.runs(since=1.5)] == ['dag', 'other']
+
+    run = history.runs('dag', 'map')[0]
+    assert run['phases'] == {'submit': 1.0, 'wait': 2.5}
+    assert len(run['calls']) == 2
+
+
+def test_old_runs_are_pruned_with_their_calls(history):
+    with mock.patch.object(history_module.time, 'time', return_value=3 * DAY):
+        assert history.prune(older_than=1.5) == 2
+    assert [r['task_id'] for r in history.runs()] == ['reduce', 'map']
+    connection = history.connect()
+    try:
+        assert connection.execute('SELECT COUNT(*) FROM calls').fetchone()[0] == 2
+    finally:
+        connection.close()
+
+
+def test_runs_report(history, capsys):
+    assert main(['--db', history.path, '--json', '--price', '0.5', 'runs', 'dag', 'map']) == 0
+    rows = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [row['run_id'] for row in rows] == ['run1', 'run2']
+    assert rows[0]['duration'] == 3.5
+    assert rows[0]['cold_start_rate'] == 0.5
+    assert rows[0]['gb_seconds'] == 4.0
+    assert rows[0]['cost'] == 2.0
+    assert rows[1]['errors'] == 1
+
+
+def test_tasks_report(history, capsys):
+    assert main(['--db', history.path, '--json', 'tasks', '--dag-id', 'dag']) == 0
+    rows = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(row['task_id'], row['runs'], row['calls']) for row in rows] == [('map', 2, 4), ('reduce', 1, 1)]
+    # 4 GB-s on the first run and 8 on the second
+    assert rows[0]['gb_seconds'] == 6.0
+    assert rows[0]['gb_seconds_trend'] == 1.0
+    assert rows[0]['data_bytes'] == 2048
+
+    assert main(['--db', history.path, 'tasks']) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split() == ['dag', 'task', 'runs', 'calls', 'p50', 'p95', 'p99', 'cold', 'data/run',
+                                'results/run', 'GB-s/run', 'trend']
+    assert lines[1].split()[:4] == ['dag', 'map', '2', '4']
+    assert lines[1].split()[-1] == '+100%'
+    assert len(lines) == 4
+
+
+def test_empty_report(tmp_path, capsys):
+    assert main(['--db', str(tmp_path / 'history.db'), 'runs', 'dag', 'map']) == 0
+    assert capsys.readouterr().out == 'No runs recorded\n'
+    assert main(['--db', str(tmp_path / 'history.db')]) == 1
@@ -0,0 +1,97 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from lithops_airflow_plugin.invoker import count_throttled, is_throttle_error  # noqa: E402
+from lithops_airflow_plugin.operators.lithops_operator import LithopsMapOperator  # noqa: E402
+
+
+class ThrottlingError(Exception):
+    # Shaped like the botocore ClientError of a throttled request
+
+    def __init__(self):
+        super().__init__('Rate exceeded')
+        self.response = {'Error': {'Code': 'TooManyRequestsException'},
+                         'ResponseMetadata': {'HTTPStatusCode': 429}}
+
+
+class ThrottlingExecutor:
+    # Invokes the jobs with up to burst threads, and above it takes jobs until
+    # allowance calls were invoked, then rejects them with a throttling error
+
+    def __init__(self, burst, allowance):
+        self.burst = burst
+        self.allowance = allowance
+        self.invoked = []
+
+    def map(self, map_iterdata, invoke_pool_threads, **kwargs):
+        if invoke_pool_threads > self.burst:
+            if len(map_iterdata) > self.allowance:
+                raise ThrottlingError()
+            self.allowance -= len(map_iterdata)
+        self.invoked.extend(map_iterdata)
+        return [SimpleNamespace(error=False, _exception=None) for _ in map_iterdata]
+
+    def wait(self, fs, **kwargs):
+        return fs, []
+
+
+def noop(x):
+    return x
+
+
+def test_throttling_is_matched_by_code_not_message():
+    assert is_throttle_error(ThrottlingError())
+    assert not is_throttle_error(Exception('Rate exceeded, 429 Too Many Requests'))
+
+    error = Exception('Service unavailable')
+    error.response = {'Error': {'Code': 'SlowDown'}, 'ResponseMetadata': {'HTTPStatusCode': 503}}
+    assert is_throttle_error(error)
+
+    try:
+        try:
+            raise ThrottlingError()
+        except ThrottlingError as e:
+            raise RuntimeError('invocation failed') from e
+    except RuntimeError as e:
+        assert is_throttle_error(e)
+
+
+def test_count_throttled_reads_the_call_exceptions():
+    futures = [SimpleNamespace(error=True, _exception=(ThrottlingError, ThrottlingError(), None)),
+               SimpleNamespace(error=True, _exception=(ValueError, ValueError('bad input'), None)),
+               SimpleNamespace(error=False, _exception=Exception())]
+    assert count_throttled(futures) == 1
+
+
+def test_throttled_waves_retry_only_the_calls_not_invoked(tmp_path, monkeypatch):
+    monkeypatch.setenv('LITHOPS_AIRFLOW_STATE_DIR', str(tmp_path))
+    operator = LithopsMapOperator(task_id='adaptive', map_function=noop, map_iterdata=list(range(1000)),
+                                  invoke_pool_threads='auto')
+    operator._executor = ThrottlingExecutor(burst=40, allowance=60)
+    operator._hook = SimpleNamespace(lithops_config={})
+
+    futures = operator._map_adaptive({'task_instance': mock.Mock()}, noop, list(range(1000)), None)
+    assert operator._executor.allowance < 60
+    assert len(futures) == 1000
+    assert sorted(operator._executor.invoked) == list(range(1000))
@@ -0,0 +1,40 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from lithops_airflow_plugin.iterdata import is_storage_iterdata, resolve_iterdata  # noqa: E402
+
+
+@pytest.mark.parametrize('iterdata', ['cos://bucket/prefix/', 's3://bucket/key.csv', 'https://example.com/data.csv',
+                                      {'obj': 'cos://bucket/key'}, {'url': 'https://example.com/a', 'n': 1}])
+def test_storage_iterdata(iterdata):
+    assert is_storage_iterdata(iterdata)
+
+
+@pytest.mark.parametrize('iterdata', ['hello', 'bucket', {'x': 1, 'y': 2}, [{'obj': 'cos://bucket/key'}],
+                                      {'type': 'lithops_result_manifest', 'bucket': 'b', 'prefix': 'p'}])
+def test_not_storage_iterdata(iterdata):
+    assert not is_storage_iterdata(iterdata)
+
+
+def test_single_inputs_are_one_call():
+    assert resolve_iterdata({'x': 1, 'y': 2}) == [{'x': 1, 'y': 2}]
+    assert resolve_iterdata(lambda: 'hello') == ['hello']
+    assert resolve_iterdata('cos://bucket/prefix/') == 'cos://bucket/prefix/'
@@ -0,0 +1,103 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import io
+import os
+import sys
+import hashlib
+import subprocess
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from lithops_airflow_plugin.listing import ListingIndex, stale_objects  # noqa: E402
+
+BUCKET = 'bucket'
+
+
+class S3StandIn:
+    # The part of the boto3 S3 client the index uses, over a dict
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body):
+        body = Body.encode('utf-8') if isinstance(Body, str) else Body
+        self.objects[Key] = body
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            error = Exception('Not Found')
+            error.response = {'Error': {'Code': '404'}}
+            raise error
+        return {'ContentLength': len(self.objects[Key]), 'ETag': self._etag(Key)}
+
+    def list_objects_v2(self, Bucket, Prefix='', StartAfter=None, ContinuationToken=None):
+        keys = sorted(k for k in self.objects if k.startswith(Prefix) and (StartAfter is None or k > StartAfter))
+        return {'Contents': [{'Key': k, 'Size': len(self.objects[k]), 'ETag': self._etag(k)} for k in keys],
+                'IsTruncated': False}
+
+    def _etag(self, key):
+        return '"{}"'.format(hashlib.md5(self.objects[key]).hexdigest())
+
+
+def planned(client, index):
+    return [{'bucket': BUCKET, 'key': e['Key'], 'size': e['Size'], 'etag': e['ETag']} for e in index.objects()]
+
+
+def test_changed_and_deleted_objects_are_stale():
+    client = S3StandIn()
+    for key in ('data/a', 'data/b', 'data/c'):
+        client.put_object(BUCKET, key, b'1234')
+    index = ListingIndex(client, BUCKET, 'data/').refresh()
+
+    client.put_object(BUCKET, 'data/a', b'123456')
+    client.put_object(BUCKET, 'data/b', b'abcd')
+    del client.objects['data/c']
+    assert stale_objects(client, planned(client, index)) == ['data/a', 'data/b', 'data/c']
+    assert stale_objects(client, planned(client, index), limit=2) is None
+
+
+def test_out_of_order_keys_make_the_prefix_unordered():
+    client = S3StandIn()
+    client.put_object(BUCKET, 'data/2020', b'x')
+    client.put_object(BUCKET, 'data/2022', b'x')
+    ListingIndex(client, BUCKET, 'data/').refresh()
+
+    client.put_object(BUCKET, 'data/2021', b'x')
+    index = ListingIndex(client, BUCKET, 'data/').refresh()
+    assert [e['Key'] for e in index.objects()] == ['data/2020', 'data/2022']
+
+    index = ListingIndex(client, BUCKET, 'data/').refresh(full=True)
+    assert index.stats()['out_of_order_objects'] == 1
+
+    client.put_object(BUCKET, 'data/2019', b'x')
+    index = ListingIndex(client, BUCKET, 'data/').refresh()
+    assert index.stats()['full_listings'] == 1
+    assert [e['Key'] for e in index.objects()] == ['data/2019', 'data/2020', 'data/2021', 'data/2022']
+
+
+def test_index_imports_without_airflow_and_lithops():
+    # As in the AWS Batch image of the NDVI example, which installs the plugin with --no-deps
+    code = ("import sys; sys.modules.update(airflow=None, lithops=None);"
+            "from lithops_airflow_plugin.listing import ListingIndex")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    subprocess.check_call([sys.executable, '-c', code], env=env)
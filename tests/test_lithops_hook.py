@@ -0,0 +1,61 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import inspect
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from lithops import FunctionExecutor  # noqa: E402
+
+from lithops_airflow_plugin.hooks.lithops_hook import (  # noqa: E402
+    EXECUTOR_PARAMS,
+    executor_kwargs,
+    resolve_executor_spec,
+)
+
+ALL_PARAMS = {
+    'type': 'localhost',
+    'config': {'lithops': {'backend': 'localhost', 'storage': 'localhost'}},
+    'backend': 'localhost',
+    'storage': 'localhost',
+    'runtime': 'python3',
+    'runtime_memory': 256,
+    'rabbitmq_monitor': False,
+    'workers': 2,
+    'remote_invoker': False,
+    'log_level': 'INFO',
+}
+
+
+def test_every_executor_param_is_covered():
+    assert set(ALL_PARAMS) == set(EXECUTOR_PARAMS) | {'config'}
+
+
+def test_spec_with_every_param_binds_to_installed_executor():
+    kwargs = executor_kwargs(resolve_executor_spec({}, ALL_PARAMS))
+    inspect.signature(FunctionExecutor).bind(**kwargs)
+
+
+def test_executor_built_from_spec_with_every_param():
+    executor = FunctionExecutor(**executor_kwargs(resolve_executor_spec({}, ALL_PARAMS)))
+    try:
+        assert executor.config['lithops']['backend'] == 'localhost'
+        assert executor.config['lithops']['storage'] == 'localhost'
+    finally:
+        executor.clean()
@@ -0,0 +1,66 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import json
+import asyncio
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from lithops.constants import JOBS_PREFIX  # noqa: E402
+from lithops.storage.utils import create_status_key  # noqa: E402
+
+from lithops_airflow_plugin.hooks import lithops_hook  # noqa: E402
+from lithops_airflow_plugin.triggers import lithops_trigger  # noqa: E402
+from lithops_airflow_plugin.triggers.lithops_trigger import LithopsJobTrigger  # noqa: E402
+
+SECRET_CONFIG = {'lithops': {'storage': 'aws_s3'}, 'aws': {'secret_access_key': 'not-in-the-trigger-row'}}
+
+
+def make_trigger():
+    return LithopsJobTrigger(conn_id='lithops_config',
+                             executor_params={'config': {'lithops': {'storage_bucket': 'bucket'}}},
+                             calls=[['exec-1', 'M000', ['00000', '00001']]],
+                             futures_key='lithops.airflow/deferred/key.pickle',
+                             poll_interval=0.01)
+
+
+def test_serialized_trigger_has_no_credentials():
+    with mock.patch.object(lithops_hook.LithopsHook, '_connection_config', return_value=SECRET_CONFIG):
+        _, kwargs = make_trigger().serialize()
+    assert 'not-in-the-trigger-row' not in json.dumps(kwargs)
+    assert kwargs['conn_id'] == 'lithops_config'
+
+
+def test_config_is_resolved_in_the_triggerer():
+    done = {create_status_key(JOBS_PREFIX, 'exec-1', 'M000', call_id) for call_id in ('00000', '00001')}
+    list_keys = mock.AsyncMock(return_value=done)
+
+    async def first_event(trigger):
+        async for event in trigger.run():
+            return event
+
+    with mock.patch.object(lithops_hook.LithopsHook, '_connection_config', return_value=SECRET_CONFIG), \
+            mock.patch.object(lithops_trigger._poller, 'list_keys', list_keys):
+        event = asyncio.run(first_event(make_trigger()))
+
+    assert event.payload['status'] == 'success'
+    config = list_keys.call_args[0][0]
+    assert config['aws']['secret_access_key'] == 'not-in-the-trigger-row'
+    assert config['lithops']['storage_bucket'] == 'bucket'
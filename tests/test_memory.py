@@ -0,0 +1,61 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from multiprocessing import Pool
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from lithops_airflow_plugin.memory import MemoryTuner, load_runs, record_run  # noqa: E402
+from lithops_airflow_plugin.operators.lithops_operator import LithopsCallAsyncOperator  # noqa: E402
+
+
+def run(memory, peak_mb=100, exec_time=1.0, memory_errors=0):
+    return {'memory': memory, 'calls': 10, 'peak_memory': peak_mb * 1024 ** 2, 'exec_time_mean': exec_time,
+            'exec_time_p95': exec_time, 'memory_errors': memory_errors, 'time': 0}
+
+
+def test_tuner_steps_down_one_size_per_run():
+    runs = [run(4096)]
+    chosen = []
+    for _ in range(4):
+        memory, _ = MemoryTuner(runs).choose()
+        chosen.append(memory)
+        runs.append(run(memory))
+    assert chosen == [3072, 2048, 1536, 1024]
+
+
+def test_tuner_without_durations_steps_down_from_the_last_run():
+    runs = [run(4096, exec_time=None)]
+    assert MemoryTuner(runs).choose() == (3072, 'one size below the last run')
+
+
+def record(index):
+    record_run('dag.task', 1024, calls=index)
+
+
+def test_concurrent_records_are_all_kept(tmp_path, monkeypatch):
+    monkeypatch.setenv('LITHOPS_AIRFLOW_STATE_DIR', str(tmp_path))
+    with Pool(8) as pool:
+        pool.map(record, range(16))
+    assert sorted(r['calls'] for r in load_runs('dag.task')) == list(range(16))
+
+
+def test_call_async_passes_its_runtime_memory_to_the_executor():
+    operator = LithopsCallAsyncOperator(task_id='call', func=abs, data={'x': -1}, runtime_memory=2048)
+    assert operator._executor_params['runtime_memory'] == 2048
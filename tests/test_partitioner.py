@@ -0,0 +1,63 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from airflow.exceptions import AirflowException  # noqa: E402
+
+from lithops_airflow_plugin.partitioner import is_self_overlapping  # noqa: E402
+from lithops_airflow_plugin.operators.lithops_operator import LithopsMapReduceOperator  # noqa: E402
+
+
+def count_lines(obj):
+    return obj.data_stream.read().count(b'\n')
+
+
+def total(results):
+    return sum(results)
+
+
+@pytest.mark.parametrize('delimiter, overlapping', [(b'\n', False), (b'\r\n', False), (b'||', True),
+                                                     (b'abab', True), (b'aba', True), (b'abc', False)])
+def test_self_overlapping_delimiters(delimiter, overlapping):
+    assert is_self_overlapping(delimiter) == overlapping
+
+
+def test_overlapping_record_delimiter_is_rejected():
+    with pytest.raises(AirflowException):
+        LithopsMapReduceOperator(task_id='map_reduce', map_function=count_lines, reduce_function=total,
+                                 map_iterdata='cos://bucket/data/', chunk_size='auto', record_delimiter=b'||')
+
+
+def test_map_reduce_records_map_throughput():
+    operator = LithopsMapReduceOperator(task_id='map_reduce', map_function=count_lines, reduce_function=total,
+                                        map_iterdata='cos://bucket/data/', chunk_size='auto')
+    operator._partition_plan = mock.Mock(total_bytes=30 * 1024 ** 2)
+    operator._map_futures = [mock.Mock(stats={'worker_func_exec_time': 5.0}) for _ in range(2)]
+    operator._executor = mock.Mock()
+    operator._executor.wait.side_effect = lambda fs, **kwargs: (fs, [])
+
+    with mock.patch('lithops_airflow_plugin.operators.lithops_operator.LithopsOperator._finish',
+                    return_value=3), \
+            mock.patch('lithops_airflow_plugin.operators.lithops_operator.record_throughput',
+                       side_effect=lambda key, throughput: throughput) as record:
+        assert operator._finish(mock.Mock(), {}) == 3
+    assert record.call_args[0][1] == 3 * 1024 ** 2
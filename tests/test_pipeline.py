@@ -0,0 +1,157 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from lithops_airflow_plugin.pipeline import MapStage, ReduceStage, RepartitionStage  # noqa: E402
+from lithops_airflow_plugin.operators.lithops_operator import LithopsPipelineOperator  # noqa: E402
+
+
+class StorageStandIn:
+    # The part of the Lithops storage client the pipeline uses, over a dict
+
+    bucket = 'bucket'
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, bucket, key, body):
+        self.objects[key] = body
+
+    def get_object(self, bucket, key):
+        return self.objects[key]
+
+    def list_keys(self, bucket, prefix):
+        return sorted(k for k in self.objects if k.startswith(prefix))
+
+    def delete_objects(self, bucket, keys):
+        for key in keys:
+            del self.objects[key]
+
+
+class Future:
+
+    def __init__(self, job_id, call_id, value=None, error=None):
+        self.executor_id = 'e'
+        self.job_id = job_id
+        self.call_id = call_id
+        self.done = False
+        self.error = error is not None
+        self._produce_output = True
+        self._value = value
+        self._error = error
+
+    def result(self):
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class ExecutorStandIn:
+    # Runs every call when it is submitted, and completes one call per wait
+    # in reverse order, so that stages overlap as with a real backend
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.data_cleaner = True
+        self.jobs = 0
+
+    def map(self, map_function, map_iterdata, **kwargs):
+        job_id = 'M{:03d}'.format(self.jobs)
+        self.jobs += 1
+        futures = []
+        for i, item in enumerate(map_iterdata):
+            try:
+                futures.append(Future(job_id, '{:05d}'.format(i), value=map_function(storage=self.storage, **item)))
+            except Exception as e:
+                futures.append(Future(job_id, '{:05d}'.format(i), error=e))
+        return futures
+
+    def wait(self, fs, return_when=None, download_results=False, throw_except=True):
+        if return_when is not None:
+            fs[-1].done = True
+        done = [f for f in fs if f.done or return_when is None]
+        if throw_except:
+            for f in done:
+                f.result()
+        return done, [f for f in fs if f not in done]
+
+    def clean(self, fs, clean_cloudobjects=True):
+        pass
+
+
+def pipeline(stages, items, storage=None):
+    operator = LithopsPipelineOperator(task_id='pipeline', stages=stages, map_iterdata=items)
+    storage = storage if storage is not None else StorageStandIn()
+    operator._hook = mock.Mock()
+    operator._hook.get_storage.return_value = storage
+    operator._executor = ExecutorStandIn(storage)
+    operator._metrics = mock.Mock()
+    futures = operator.execute_callable({'run_id': 'run'})
+    return futures, storage
+
+
+def double(x):
+    return 2 * x
+
+
+def add_one(x):
+    return x + 1
+
+
+def spread(x):
+    return list(range(x))
+
+
+def fail_on_two(x):
+    if x == 2:
+        raise ValueError('two')
+    return x
+
+
+def test_map_stages_pass_outputs_by_reference():
+    futures, storage = pipeline([MapStage(double), MapStage(add_one)], [1, 2, 3])
+    assert [f.result() for f in futures] == [3, 5, 7]
+    assert storage.objects == {}
+
+
+def test_repartition_then_reduce_returns_a_single_value():
+    stages = [MapStage(spread), RepartitionStage(2), MapStage(sum), ReduceStage(sorted)]
+    future, storage = pipeline(stages, [3, 4])
+    # Call i puts its record n in partition (i + n) % 2: [0, 2, 1, 3] and [1, 0, 2]
+    assert future.result() == [3, 6]
+    assert storage.objects == {}
+
+
+def test_repartition_by_key_groups_equal_keys():
+    stages = [MapStage(spread), RepartitionStage(3, key=lambda record: record), MapStage(sorted)]
+    futures, _ = pipeline(stages, [2, 3, 4])
+    partitions = [f.result() for f in futures]
+    assert sorted(r for p in partitions for r in p) == [0, 0, 0, 1, 1, 1, 2, 2, 3]
+    for value in range(4):
+        assert sum(1 for p in partitions if value in p) == 1
+
+
+def test_intermediate_outputs_are_deleted_when_a_call_fails():
+    storage = StorageStandIn()
+    with pytest.raises(ValueError, match='two'):
+        pipeline([MapStage(double), MapStage(fail_on_two), MapStage(add_one)], [1, 2, 3], storage)
+    assert storage.objects == {}
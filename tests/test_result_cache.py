@@ -0,0 +1,59 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import sys
+import subprocess
+from functools import partial
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from lithops_airflow_plugin.result_cache import function_hash  # noqa: E402
+
+
+def make_scaler(factor):
+    def scale(x):
+        return x * factor
+    return scale
+
+
+def power(x, exponent):
+    return x ** exponent
+
+
+def test_captured_values_are_part_of_the_hash():
+    assert function_hash(make_scaler(2)) == function_hash(make_scaler(2))
+    assert function_hash(make_scaler(2)) != function_hash(make_scaler(3))
+    assert function_hash(partial(power, exponent=2)) != function_hash(partial(power, exponent=3))
+    assert function_hash(lambda x: x + 1) != function_hash(lambda x: x + 2)
+
+
+def test_version_salts_the_hash():
+    assert function_hash(power, version='1') != function_hash(power)
+    assert function_hash(power, version='1') != function_hash(power, version='2')
+
+
+def test_hash_is_stable_across_processes():
+    code = ('from {} import make_scaler;'
+            'from lithops_airflow_plugin.result_cache import function_hash;'
+            'print(function_hash(make_scaler(2)))').format(make_scaler.__module__)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    # Every process has its own string hash seed
+    hashes = {subprocess.check_output([sys.executable, '-c', code], env=env).strip() for _ in range(3)}
+    assert len(hashes) == 1
@@ -0,0 +1,125 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from lithops_airflow_plugin.speculation import StragglerPolicy  # noqa: E402
+from lithops_airflow_plugin.operators import lithops_operator  # noqa: E402
+from lithops_airflow_plugin.operators.lithops_operator import LithopsMapOperator  # noqa: E402
+
+
+def test_no_threshold_until_the_quantile_is_done():
+    policy = StragglerPolicy(10, quantile=0.5, percentile=60, multiplier=2)
+    for duration in (1, 2, 3, 4):
+        policy.record_done(duration)
+    assert policy.threshold() is None
+    assert policy.stragglers({4: 100}) == []
+    policy.record_done(5)
+    assert policy.threshold() == 6
+
+
+def test_stragglers_are_the_slowest_within_the_cap():
+    policy = StragglerPolicy(40, quantile=0.5, percentile=100, multiplier=1, max_fraction=0.05)
+    for _ in range(20):
+        policy.record_done(5)
+    assert policy.stragglers({0: 10, 1: 30, 2: 20, 3: 1, 4: 6}) == [1, 2]
+    assert policy.stragglers({0: 10, 4: 6}) == []
+    assert policy.launched == 2
+
+
+def test_at_least_one_duplicate_is_allowed():
+    policy = StragglerPolicy(5, quantile=0.2, max_fraction=0.05)
+    policy.record_done(1)
+    assert policy.stragglers({1: 10, 2: 20}) == [2]
+
+
+class Clock:
+    # Stands in for the time module, sleeping only moves the clock
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class ExecutorStandIn:
+    # Calls end at planned times of the clock, duplicates as given in order
+
+    def __init__(self, clock, duplicates):
+        self.clock = clock
+        self.duplicates = list(duplicates)
+        self.jobs = 0
+
+    def future(self, job_id, call_id, duration, error=False):
+        return SimpleNamespace(executor_id='e', job_id=job_id, call_id='{:05d}'.format(call_id),
+                               end=self.clock.now + duration, error=error, done=False)
+
+    def map(self, map_iterdata, **kwargs):
+        self.jobs += 1
+        return [self.future('S{:03d}'.format(self.jobs), i, *self.duplicates.pop(0))
+                for i, _ in enumerate(map_iterdata)]
+
+    def wait(self, fs, return_when=None, throw_except=True):
+        for f in fs:
+            f.done = f.done or f.end <= self.clock.now
+        return [f for f in fs if f.done], [f for f in fs if not f.done]
+
+
+def speculate(durations, duplicates):
+    """
+    Runs _wait_speculative over calls of the given (duration, error), with
+    one straggler allowed, and returns the futures it keeps.
+    """
+    operator = LithopsMapOperator(task_id='map', map_function=abs, map_iterdata=list(range(len(durations))),
+                                  speculative=True, speculation_quantile=0.9, speculation_multiplier=1.5,
+                                  max_speculative_fraction=0.05)
+    clock = Clock()
+    executor = operator._executor = ExecutorStandIn(clock, duplicates)
+    operator._futures = [executor.future('M000', i, *planned) for i, planned in enumerate(durations)]
+    operator._call_function = (abs, None, [], [])
+    operator._call_inputs = list(range(len(durations)))
+    operator._submit_times = [0.0] * len(durations)
+    with mock.patch.object(lithops_operator, 'time', clock):
+        operator._wait_speculative()
+    return operator._futures
+
+
+def test_first_attempt_to_finish_wins():
+    futures = speculate([(1, False)] * 9 + [(100, False)], duplicates=[(1, False)])
+    assert [f.job_id for f in futures] == ['M000'] * 9 + ['S001']
+    assert not futures[9].error
+
+
+def test_failed_duplicate_does_not_win_over_a_running_call():
+    futures = speculate([(1, False)] * 9 + [(5, False)], duplicates=[(0.5, True)])
+    assert futures[9].job_id == 'M000'
+    assert not futures[9].error
+
+
+def test_failed_attempt_wins_when_all_attempts_failed():
+    futures = speculate([(1, False)] * 9 + [(5, True)], duplicates=[(0.5, True)])
+    assert futures[9].job_id == 'M000'
+    assert futures[9].error
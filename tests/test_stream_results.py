@@ -0,0 +1,148 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import pickle
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from airflow.exceptions import AirflowException  # noqa: E402
+
+from lithops_airflow_plugin.results import iter_manifest, load_manifest  # noqa: E402
+from lithops_airflow_plugin.operators.lithops_operator import LithopsMapOperator  # noqa: E402
+
+
+def square(x):
+    return x * x
+
+
+class StorageStandIn:
+    # The part of the Lithops storage client the result sink uses, over a dict
+
+    bucket = 'bucket'
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, bucket, key, body):
+        self.objects[key] = body
+
+    def get_object(self, bucket, key):
+        return self.objects[key]
+
+
+class ExecutorStandIn:
+    # Completes the calls in waves, one per wait. Like FunctionExecutor, each
+    # wait cleans the jobs with a done call while data_cleaner is on, and the
+    # results of a cleaned job can no longer be downloaded.
+
+    def __init__(self, futures, waves, values):
+        self.futures = futures
+        self.waves = [list(wave) for wave in waves]
+        self.values = values
+        self.data_cleaner = True
+        self.cleaned_jobs = set()
+        self.clean_calls = []
+
+    def wait(self, fs, return_when=None, download_results=False, throw_except=True):
+        try:
+            completing = self.waves.pop(0)
+            for f in self.futures:
+                if f.call_id in completing:
+                    f.done = True
+            done = [f for f in fs if f.done]
+            if throw_except and any(f.error for f in done):
+                raise RuntimeError('call failed')
+            return done, [f for f in fs if not f.done]
+        finally:
+            if self.data_cleaner:
+                self.cleaned_jobs.update(f.job_id for f in self.futures if f.done)
+
+    def get_result(self, fs):
+        for f in fs:
+            if f.job_id in self.cleaned_jobs:
+                raise KeyError('result')
+        return [self.values[f.call_id] for f in fs]
+
+    def clean(self, fs, clean_cloudobjects=True):
+        self.clean_calls.append(sorted({f.job_id for f in fs if f.done}))
+        self.cleaned_jobs.update(f.job_id for f in fs if f.done)
+
+
+def make_future(call_id, error=False):
+    return SimpleNamespace(executor_id='e', job_id='M000', call_id=call_id, done=False, error=error,
+                           _produce_output=True, _return_val=None)
+
+
+def stream(operator, futures, waves, values):
+    operator._futures = futures
+    operator._executor = ExecutorStandIn(futures, waves, values)
+    operator._metrics = mock.Mock()
+    storage = StorageStandIn()
+    hook = mock.Mock()
+    hook.get_storage.return_value = storage
+    manifest = operator._stream_result(hook, {'run_id': 'run', 'task_instance': mock.Mock()})
+    return manifest, storage
+
+
+def test_results_are_streamed_in_batches_as_calls_complete():
+    operator = LithopsMapOperator(task_id='map', map_function=square, map_iterdata=[0, 1, 2, 3, 4],
+                                  stream_results=True, result_batch_size=2)
+    futures = [make_future('{:05d}'.format(i)) for i in range(5)]
+    waves = [['00003', '00001', '00004'], ['00000'], ['00002']]
+    values = {f.call_id: int(f.call_id) ** 2 for f in futures}
+    manifest, storage = stream(operator, futures, waves, values)
+
+    assert manifest['prefix'] == 'lithops.airflow/results/{}/map/run'.format(operator.dag_id)
+    assert manifest['count'] == 5
+    parts = [pickle.loads(storage.objects[key]) for key in manifest['parts']]
+    assert all(len(part) <= 2 for part in parts)
+    # Parts keep the completion order, loading puts the results in call order
+    assert [index for index, _ in iter_manifest(storage, manifest)] == [1, 3, 4, 0, 2]
+    assert load_manifest(storage, manifest) == [0, 1, 4, 9, 16]
+    # The job is cleaned once, after its last result was downloaded
+    assert operator._executor.data_cleaner is True
+    assert operator._executor.clean_calls == [['M000']]
+
+
+def test_prefilled_results_are_added_to_the_manifest():
+    operator = LithopsMapOperator(task_id='map', map_function=square, map_iterdata=[0, 1, 2, 3],
+                                  stream_results=True, result_batch_size=3)
+    # Items 1 and 2 came from the result cache or a checkpoint, 0 and 3 were submitted
+    operator._prefilled = {1: 1, 2: 4}
+    operator._index_map = [0, 3]
+    futures = [make_future('00000'), make_future('00001')]
+    manifest, storage = stream(operator, futures, [['00001'], ['00000']], {'00000': 0, '00001': 9})
+
+    assert manifest['count'] == 4
+    assert load_manifest(storage, manifest) == [0, 1, 4, 9]
+
+
+def test_failed_calls_raise_after_the_rest_are_checkpointed():
+    operator = LithopsMapOperator(task_id='map', map_function=square, map_iterdata=[0, 1, 2],
+                                  stream_results=True, result_batch_size=2)
+    operator._checkpoint = mock.Mock()
+    futures = [make_future('00000'), make_future('00001', error=True), make_future('00002')]
+    with pytest.raises(AirflowException, match='1 calls failed'):
+        stream(operator, futures, [['00000', '00001'], ['00002']], {'00000': 0, '00002': 4})
+
+    saved = [pair for call in operator._checkpoint.save.call_args_list for pair in call[0][0]]
+    assert sorted(saved) == [(0, 0), (2, 4)]
+    assert operator._executor.clean_calls == [['M000']]
@@ -0,0 +1,76 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import pickle
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from airflow.exceptions import AirflowException  # noqa: E402
+
+from lithops_airflow_plugin.operators.lithops_operator import LithopsMapReduceOperator  # noqa: E402
+from lithops_airflow_plugin.tree_reduce import OUTPUT_PREFIX_ENV, make_map_writer, make_tree_reducer  # noqa: E402
+
+
+def add(x):
+    return x + 1
+
+
+def total(results):
+    return sum(results)
+
+
+def test_tree_reduce_can_not_be_deferrable():
+    with pytest.raises(AirflowException, match='deferrable'):
+        LithopsMapReduceOperator(task_id='tree', map_function=add, reduce_function=total,
+                                 map_iterdata=[1, 2, 3], reduce_fan_in=2, deferrable=True)
+
+
+def test_tree_reduce_deletes_intermediate_outputs_on_failure():
+    operator = LithopsMapReduceOperator(task_id='tree', map_function=add, reduce_function=total,
+                                        map_iterdata=[1, 2, 3], reduce_fan_in=2)
+    storage = mock.Mock(bucket='bucket')
+    storage.list_keys.return_value = ['a', 'b']
+    operator._hook = mock.Mock()
+    operator._hook.get_storage.return_value = storage
+    operator._executor = mock.Mock()
+    operator._executor.map.return_value = [mock.Mock(), mock.Mock(), mock.Mock()]
+    operator._executor.wait.side_effect = RuntimeError('map call failed')
+
+    with pytest.raises(RuntimeError):
+        operator._map_tree_reduce({'run_id': 'run'}, add, total, [1, 2, 3], None, 10)
+    storage.delete_objects.assert_called_once_with('bucket', ['a', 'b'])
+
+
+def test_reducer_writes_under_the_prefix_of_its_group():
+    storage = mock.Mock()
+    storage.get_object.side_effect = [pickle.dumps(1), pickle.dumps(2)]
+    reducer = make_tree_reducer(total, 'bucket')
+    key = reducer({'index': 3, 'keys': ['a', 'b'], 'prefix': 'tree/run/level1'}, storage)
+    assert key == 'tree/run/level1/00000003.pickle'
+    storage.put_object.assert_called_once_with('bucket', key, pickle.dumps(3, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def test_map_writer_writes_under_the_prefix_of_the_job():
+    storage = mock.Mock()
+    writer = make_map_writer(add, 'bucket')
+    with mock.patch.dict('os.environ', {OUTPUT_PREFIX_ENV: 'tree/run/level0'}):
+        key = writer(x=1, storage=storage, id=7)
+    assert key == 'tree/run/level0/00000007.pickle'
+    storage.put_object.assert_called_once_with('bucket', key, pickle.dumps(2, protocol=pickle.HIGHEST_PROTOCOL))
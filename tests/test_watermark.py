@@ -0,0 +1,126 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from lithops_airflow_plugin.watermark import Watermark  # noqa: E402
+from lithops_airflow_plugin.operators.lithops_operator import LithopsMapReduceOperator  # noqa: E402
+
+
+class StorageStandIn:
+    # The part of the Lithops storage client the watermark uses, over a dict
+
+    bucket = 'bucket'
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, bucket, key, body):
+        self.objects[key] = body
+
+    def get_object(self, bucket, key):
+        return self.objects[key]
+
+
+def obj(key, last_modified, etag=None, size=10):
+    return {'bucket': 'data', 'key': key, 'size': size, 'etag': etag, 'last_modified': last_modified}
+
+
+def keys(objects):
+    return [o['key'] for o in objects]
+
+
+def run(storage, objects, mode='last_modified', full=False):
+    watermark = Watermark(storage, 'dag', 'task', mode)
+    selected = watermark.select(objects, full=full)
+    watermark.commit()
+    return keys(selected), watermark.stats()
+
+
+def test_last_modified_selects_newer_objects_and_ties_not_seen():
+    storage = StorageStandIn()
+    assert run(storage, [obj('a', 100), obj('b', 200)])[0] == ['a', 'b']
+    # c has the time of the newest object processed, but was not processed yet
+    selected, stats = run(storage, [obj('a', 100), obj('b', 200), obj('c', 200), obj('d', 300)])
+    assert selected == ['c', 'd']
+    assert stats == {'mode': 'last_modified', 'full': False, 'selected': 2, 'skipped': 2}
+    # e ties with d at the newest time, d is not processed again
+    assert run(storage, [obj('b', 200), obj('d', 300), obj('e', 300)])[0] == ['e']
+    assert run(storage, [obj('b', 200), obj('d', 300), obj('e', 300)])[0] == []
+
+
+def test_last_modified_keeps_the_mark_when_objects_are_deleted():
+    storage = StorageStandIn()
+    run(storage, [obj('a', 100), obj('b', 200)])
+    run(storage, [obj('a', 100)])
+    assert run(storage, [obj('a', 100), obj('c', 150), obj('d', 250)])[0] == ['d']
+
+
+def test_etag_selects_new_and_rewritten_objects():
+    storage = StorageStandIn()
+    run(storage, [obj('a', 100, 'x'), obj('b', 100, 'y'), obj('c', 100)], mode='etag')
+    objects = [obj('a', 100, 'x'), obj('b', 100, 'z'), obj('c', 100, size=20), obj('d', 50, 'w')]
+    selected, stats = run(storage, objects, mode='etag')
+    # b was rewritten in the same second, c has no ETag but changed size
+    assert selected == ['b', 'c', 'd']
+    assert stats['skipped'] == 1
+
+
+def test_force_full_selects_everything_and_advances_the_mark():
+    storage = StorageStandIn()
+    run(storage, [obj('a', 100), obj('b', 200)])
+    selected, stats = run(storage, [obj('a', 100), obj('b', 200)], full=True)
+    assert selected == ['a', 'b']
+    assert stats['full'] is True
+    assert run(storage, [obj('a', 100), obj('b', 200)])[0] == []
+
+
+def test_a_watermark_of_another_mode_is_ignored():
+    storage = StorageStandIn()
+    run(storage, [obj('a', 100, 'x')], mode='etag')
+    selected, stats = run(storage, [obj('a', 100, 'x')])
+    assert selected == ['a']
+    assert stats['full'] is True
+
+
+def finish(operator, collect):
+    hook, context = mock.Mock(), {'task_instance': mock.Mock()}
+    operator._metrics = mock.MagicMock()
+    with mock.patch.object(operator, '_collect_result', side_effect=collect):
+        return operator._finish(hook, context)
+
+
+def total(results):
+    return sum(results)
+
+
+def test_watermark_is_committed_only_when_the_run_succeeds():
+    storage = StorageStandIn()
+    operator = LithopsMapReduceOperator(task_id='task', map_function=len, reduce_function=total,
+                                        map_iterdata='cos://data/', incremental='last_modified')
+    operator._watermark = Watermark(storage, 'dag', 'task', 'last_modified')
+    operator._watermark.select([obj('a', 100)])
+    with pytest.raises(RuntimeError):
+        finish(operator, RuntimeError('call failed'))
+    assert storage.objects == {}
+
+    assert finish(operator, lambda hook, context: 3) == 3
+    assert run(storage, [obj('a', 100)])[0] == []
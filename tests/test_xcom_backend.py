@@ -0,0 +1,92 @@
+#
+# Copyright Cloudlab URV 2020
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('airflow')
+pytest.importorskip('lithops')
+
+from lithops_airflow_plugin.xcom_backend import XCOM_PREFIX, LithopsXComBackend  # noqa: E402
+
+
+class LocalStorage:
+    # The part of the Lithops storage client the backend uses, over a dict
+    bucket = 'bucket'
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, bucket, key, body):
+        self.objects[(bucket, key)] = body
+
+    def get_object(self, bucket, key):
+        return self.objects[(bucket, key)]
+
+    def head_object(self, bucket, key):
+        if (bucket, key) not in self.objects:
+            raise KeyError(key)
+        return {'content-length': str(len(self.objects[(bucket, key)]))}
+
+    def delete_object(self, bucket, key):
+        del self.objects[(bucket, key)]
+
+
+@pytest.fixture
+def storage():
+    storage = LocalStorage()
+    with mock.patch.object(LithopsXComBackend, 'storage', storage), \
+            mock.patch('lithops_airflow_plugin.xcom_backend.conf.getint', return_value=1024):
+        yield storage
+
+
+def push(value):
+    return SimpleNamespace(value=LithopsXComBackend.serialize_value(value))
+
+
+def test_small_values_stay_in_the_db(storage):
+    row = push({'a': 1})
+    assert storage.objects == {}
+    assert LithopsXComBackend.deserialize_value(row) == {'a': 1}
+
+
+def test_large_values_are_pulled_as_they_were_pushed(storage):
+    value = [{'key': 'object-{}'.format(i), 'size': i} for i in range(1000)]
+    row = push(value)
+    assert len(storage.objects) == 1
+    assert all(key.startswith(XCOM_PREFIX + '/') for _, key in storage.objects)
+
+    pulled = LithopsXComBackend.deserialize_value(row)
+    assert type(pulled) is list
+    assert pulled == value
+    assert 'bytes' in LithopsXComBackend.orm_deserialize_value(row)
+
+
+@pytest.mark.parametrize('references, deleted', [(1, True), (2, False)])
+def test_purge_deletes_the_last_reference(storage, references, deleted):
+    row = push(list(range(1000)))
+    session = mock.Mock()
+    session.query.return_value.filter.return_value.count.return_value = references
+    LithopsXComBackend.purge(row, session)
+    assert (storage.objects == {}) == deleted
+
+
+def test_purge_ignores_values_in_the_db(storage):
+    session = mock.Mock()
+    LithopsXComBackend.purge(push('small'), session)
+    session.query.assert_not_called()